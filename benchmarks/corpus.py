@@ -0,0 +1,79 @@
+"""Synthetic benchmark inputs generated with ffmpeg's lavfi sources"""
+import itertools
+import subprocess
+from pathlib import Path
+from typing import List, Sequence
+
+LAYOUTS = {
+    1: 'mono',
+    2: 'stereo',
+    6: '5.1',
+    8: '7.1',
+}
+
+
+def generate(
+    directory: Path,
+    durations: Sequence[float],
+    channels: Sequence[int],
+    bitdepths: Sequence[int],
+    sample_rates: Sequence[int],
+    ffmpeg: str = 'ffmpeg'
+) -> List[Path]:
+    """
+    Generates pink noise WAV files for every combination of given params,
+    files already present (from a previous run) are reused
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    files = []
+    for duration, channel_count, bitdepth, sample_rate in itertools.product(
+        durations, channels, bitdepths, sample_rates
+    ):
+        path = directory / ('%s_%sbit_%gk_%gs.wav' % (
+            LAYOUTS[channel_count].replace('.', ''),
+            bitdepth,
+            sample_rate / 1000,
+            duration
+        ))
+        if not path.exists():
+            _generate_file(path, duration, channel_count, bitdepth, sample_rate, ffmpeg)
+        files.append(path)
+
+    return files
+
+
+def _generate_file(
+    path: Path,
+    duration: float,
+    channels: int,
+    bitdepth: int,
+    sample_rate: int,
+    ffmpeg: str
+) -> None:
+    """Writes a WAV file with independent noise in every channel"""
+    sources = ''.join(
+        f'anoisesrc=d={duration}:r={sample_rate}:c=pink:s={channel + 1}:a=0.2[c{channel}];'
+        for channel in range(channels)
+    )
+    inputs = ''.join(f'[c{channel}]' for channel in range(channels))
+    if channels > 1:
+        graph = f'{sources}{inputs}amerge=inputs={channels},' \
+                f'channelmap=channel_layout={LAYOUTS[channels]}'
+    else:
+        graph = f'{sources}{inputs}anull'
+
+    partial = path.with_suffix('.part')
+    subprocess.run(
+        [
+            ffmpeg,
+            '-loglevel', 'error',
+            '-y',
+            '-filter_complex', graph,
+            '-c:a', f'pcm_s{bitdepth}le',
+            '-rf64', 'auto',
+            '-f', 'wav',
+            partial
+        ],
+        check=True
+    )
+    partial.rename(path)
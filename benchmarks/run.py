@@ -0,0 +1,335 @@
+"""
+Measures eat's own overhead (probing, rf64 staging, progress parsing, temp I/O)
+on a synthetic corpus, using stub DEE/qaac binaries, so it runs anywhere ffmpeg does.
+
+    python benchmarks/run.py --durations 10 120 --formats ddp thd,ddp aac
+    python benchmarks/run.py --json new.json --compare old.json
+
+Every stage reports wall time, CPU time (eat and its child processes)
+and bytes written (growth of output and temp directories). Stages can nest,
+"intermediate" includes the ffmpeg process writing it. "overhead" is the
+time not spent in child processes, with CPU time of eat itself.
+Run with the default -j 1 for exact per-stage numbers.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from corpus import LAYOUTS, generate
+
+ROOT = Path(__file__).resolve().parent.parent
+STUBS = Path(__file__).resolve().parent / 'stubs'
+
+FORMATS = ('dd', 'ddp', 'thd', 'aac', 'flac', 'opus', 'rf64')
+
+
+class Stage:
+    """Accumulated measurements of a single stage"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.self_cpu = 0.0  # without child processes
+        self.written = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(
+            calls=self.calls,
+            wall=self.wall,
+            cpu=self.cpu,
+            self_cpu=self.self_cpu,
+            written=self.written
+        )
+
+
+class Recorder:
+    """Records stage measurements of a single eat run"""
+
+    def __init__(self, directories: List[Path]) -> None:
+        self.stages: Dict[str, Stage] = {}
+        self._directories = directories
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        size = _tree_size(self._directories)
+        cpu, self_cpu = _cpu_time(), _cpu_time(children=False)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, Stage())
+                stage.calls += 1
+                stage.wall += wall
+                stage.cpu += _cpu_time() - cpu
+                stage.self_cpu += _cpu_time(children=False) - self_cpu
+                stage.written += max(0, _tree_size(self._directories) - size)
+
+
+def instrument(recorder: Recorder) -> Callable[[], None]:
+    """Wraps eat's stages with recorder measurements, returns a function undoing it"""
+    from eat.handler import Handler
+    from eat.utils import analysis
+    from eat.utils.ffprobe import FFprobe
+    from eat.utils.processor import Processor
+
+    originals: List[Any] = []
+
+    def wrap(owner: Any, attribute: str, stage: str) -> None:
+        original = getattr(owner, attribute)
+        originals.append((owner, attribute, original))
+
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with recorder.measure(stage):
+                return original(*args, **kwargs)
+
+        setattr(owner, attribute, wrapper)
+
+    def wrap_process(attribute: str) -> None:
+        original = getattr(Processor, attribute)
+        originals.append((Processor, attribute, original))
+
+        async def wrapper(self: Processor, *args: Any, **kwargs: Any) -> Any:
+            params = args[0] if args else kwargs.get('params') or kwargs.get('source_params') or ['']
+            name = self._name or Path(params[0]).name
+            if attribute == 'run_pipeline':
+                name = '%s|%s' % (Path(params[0]).name, self._name)
+            with recorder.measure(name):
+                return await original(self, *args, **kwargs)
+
+        setattr(Processor, attribute, wrapper)
+
+    wrap(FFprobe, '__call__', 'probe')
+    wrap(Handler, '_create_intermediates', 'intermediate')
+    wrap(analysis, 'analyze_pcm', 'analysis')
+    wrap_process('run_process')
+    wrap_process('run_pipeline')
+
+    def undo() -> None:
+        for owner, attribute, original in reversed(originals):
+            setattr(owner, attribute, original)
+
+    return undo
+
+
+def run_eat(args: List[str]) -> None:
+    """Runs eat in this process, so that its stages can be measured"""
+    from eat.__main__ import main
+
+    argv, tracebacklimit = sys.argv, getattr(sys, 'tracebacklimit', None)
+    sys.argv = ['eat', *args]
+    try:
+        main()
+    finally:
+        sys.argv = argv
+        if tracebacklimit is None:
+            del sys.tracebacklimit
+        else:
+            sys.tracebacklimit = tracebacklimit
+
+
+def benchmark(
+    inputs: List[Path],
+    formats: List[str],
+    work_dir: Path,
+    jobs: int,
+    analyze: bool
+) -> Dict[str, Any]:
+    """Encodes all inputs to given formats, returns stage measurements"""
+    output_dir = work_dir / 'out' / '_'.join(formats)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    recorder = Recorder([output_dir, work_dir / 'tmp'])
+    undo = instrument(recorder)
+    try:
+        with recorder.measure('total'):
+            run_eat([
+                '-i', *map(str, inputs),
+                '-f', *formats,
+                '-o', str(output_dir),
+                '-j', str(jobs),
+                '-y',
+                *(['--analyze'] if analyze else [])
+            ])
+    finally:
+        undo()
+
+    stages = {name: stage.as_dict() for name, stage in recorder.stages.items()}
+    total = stages.pop('total')
+    process_wall = sum(
+        stage['wall'] for name, stage in stages.items()
+        if name not in ('probe', 'intermediate', 'analysis')
+    )
+    return dict(
+        formats=formats,
+        stages=stages,
+        total=total,
+        overhead=dict(wall=total['wall'] - process_wall, cpu=total['self_cpu']),
+    )
+
+
+def report(run: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+    """Prints stage table of a single run, with wall time change against a previous one"""
+    previous = previous or {}
+    print('\n%s' % ', '.join(run['formats']))
+    print('  %-16s %6s %10s %10s %12s' % ('stage', 'calls', 'wall s', 'cpu s', 'written MiB'))
+    for name, stage in sorted(run['stages'].items()):
+        _print_row(name, stage, previous.get('stages', {}).get(name))
+    _print_row('total', run['total'], previous.get('total'))
+    _print_row('overhead', run['overhead'], previous.get('overhead'))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--work-dir', type=Path, help='keeps corpus between runs (default: temp)')
+    parser.add_argument('--durations', nargs='+', type=float, default=[10], help='seconds')
+    parser.add_argument('--channels', nargs='+', type=int, default=[1, 2, 6, 8], choices=LAYOUTS)
+    parser.add_argument('--bitdepths', nargs='+', type=int, default=[16, 24], choices=(16, 24))
+    parser.add_argument('--sample-rates', nargs='+', type=int, default=[44100, 48000, 96000])
+    parser.add_argument(
+        '--formats',
+        nargs='+',
+        default=[*FORMATS, ','.join(FORMATS)],
+        help='format combinations, comma separated (default: each format, then all at once)'
+    )
+    parser.add_argument(
+        '--speed',
+        type=float,
+        default=0,
+        help='stub encoder speed, realtime multiple (default: 0 = unlimited)'
+    )
+    parser.add_argument('-j', '--jobs', type=int, default=1)
+    parser.add_argument('--analyze', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='show eat log output')
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--ffprobe', default='ffprobe')
+    parser.add_argument('--json', type=Path, help='write results to a file')
+    parser.add_argument('--compare', type=Path, help='--json results to compare wall times with')
+    args = parser.parse_args()
+
+    combinations = [combination.split(',') for combination in args.formats]
+    for formats in combinations:
+        for name in formats:
+            if name not in FORMATS:
+                parser.error('unknown format "%s"' % name)
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix='eat_bench_'))
+    _setup_home(work_dir, args.ffmpeg, args.ffprobe)
+    os.environ['EAT_STUB_SPEED'] = str(args.speed)
+    sys.path.insert(0, str(ROOT))  # benchmark the tree this script is in
+    if not args.verbose:
+        logging.basicConfig(level=logging.WARNING)  # eat doesn't replace existing handlers
+
+    started = time.perf_counter()
+    inputs = generate(
+        work_dir / 'corpus',
+        durations=args.durations,
+        channels=args.channels,
+        bitdepths=args.bitdepths,
+        sample_rates=args.sample_rates,
+        ffmpeg=args.ffmpeg
+    )
+    print('Corpus: %s files in "%s" (%.1f s)' % (
+        len(inputs),
+        work_dir / 'corpus',
+        time.perf_counter() - started
+    ))
+
+    previous: Dict[str, Any] = {}
+    if args.compare:
+        previous = {
+            ','.join(run['formats']): run
+            for run in json.loads(args.compare.read_text())['runs']
+        }
+
+    runs = []
+    for formats in combinations:
+        run = benchmark(inputs, formats, work_dir, args.jobs, args.analyze)
+        runs.append(run)
+        report(run, previous.get(','.join(formats)))
+
+    if args.json:
+        args.json.write_text(json.dumps(dict(
+            inputs=[path.name for path in inputs],
+            speed=args.speed,
+            jobs=args.jobs,
+            runs=runs
+        ), indent=2))
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _setup_home(work_dir: Path, ffmpeg: str, ffprobe: str) -> None:
+    """Points eat at its own config (stub encoders, no probe cache, disk-only scratch)"""
+    home = work_dir / 'home'
+    (home / '.eat').mkdir(parents=True, exist_ok=True)
+    (work_dir / 'tmp').mkdir(exist_ok=True)
+    (home / '.eat' / 'config.toml').write_text('\n'.join((
+        "temp_path = '%s'" % (work_dir / 'tmp'),
+        '[binaries]',
+        "ffmpeg = '%s'" % (shutil.which(ffmpeg) or ffmpeg),
+        "ffprobe = '%s'" % (shutil.which(ffprobe) or ffprobe),
+        "dee = '%s'" % (STUBS / 'dee'),
+        "qaac = '%s'" % (STUBS / 'qaac'),
+        '[cache]',
+        'probe_entries = 0',
+        ''
+    )))
+    os.environ['HOME'] = str(home)  # read when eat.config is imported
+
+
+def _cpu_time(children: bool = True) -> float:
+    """Returns CPU time used by this process and (optionally) its finished children"""
+    usages = [resource.getrusage(resource.RUSAGE_SELF)]
+    if children:
+        usages.append(resource.getrusage(resource.RUSAGE_CHILDREN))
+
+    return sum(usage.ru_utime + usage.ru_stime for usage in usages)
+
+
+def _tree_size(directories: List[Path]) -> int:
+    size = 0
+    for directory in directories:
+        for path in directory.rglob('*'):
+            try:
+                if path.is_file():
+                    size += path.stat().st_size
+            except FileNotFoundError:  # temp file removed while walking
+                pass
+
+    return size
+
+
+def _print_row(name: str, stage: Dict[str, Any], old: Optional[Dict[str, Any]]) -> None:
+    line = '  %-16s %6s %10.3f %10.3f %12s' % (
+        name,
+        stage.get('calls', ''),
+        stage['wall'],
+        stage['cpu'],
+        '%.1f' % (stage['written'] / (1 << 20)) if 'written' in stage else ''
+    )
+    if old and old['wall']:
+        line += '  %+6.1f%%' % ((stage['wall'] - old['wall']) / old['wall'] * 100)
+    print(line)
+
+
+if __name__ == '__main__':
+    main()
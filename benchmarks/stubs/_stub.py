@@ -0,0 +1,79 @@
+"""
+Shared code of stub encoders used by the benchmarks,
+they consume WAV input like the real ones but only write placeholder output
+"""
+import os
+import struct
+import time
+from typing import BinaryIO, Callable, Optional, Tuple
+
+READ_SIZE = 1 << 20
+
+# Realtime multiple the input is consumed at (0 = as fast as it can be read)
+SPEED = float(os.environ.get('EAT_STUB_SPEED', '0'))
+
+
+def read_wav_header(f: BinaryIO) -> Tuple[int, Optional[int]]:
+    """Reads WAV/RF64 header up to the data chunk, returns (byte rate, data size or None)"""
+    riff = f.read(12)
+    if riff[:4] not in (b'RIFF', b'RF64') or riff[8:12] != b'WAVE':
+        raise SystemExit('Input is not a WAV file')
+
+    byte_rate = 0
+    ds64_size: Optional[int] = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise SystemExit('WAV data chunk not found')
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'data':
+            if size == 0xFFFFFFFF:
+                return byte_rate, ds64_size
+            return byte_rate, size or None
+        body = f.read(size + (size & 1))
+        if chunk_id == b'ds64':
+            ds64_size = struct.unpack('<Q', body[8:16])[0]
+        elif chunk_id == b'fmt ':
+            byte_rate = struct.unpack('<I', body[8:12])[0]
+
+
+def consume(
+    f: BinaryIO,
+    byte_rate: int,
+    size: Optional[int],
+    report: Callable[[float, float], None],
+    interval: float = 0.5
+) -> float:
+    """
+    Reads input until EOF (or size), throttled to SPEED,
+    report receives (percent or -1 if size is unknown, seconds of audio read),
+    returns duration of the audio read
+    """
+    start = time.monotonic()
+    last_report = 0.0
+    done = 0
+    while size is None or done < size:
+        chunk = f.read(READ_SIZE if size is None else min(READ_SIZE, size - done))
+        if not chunk:
+            break
+        done += len(chunk)
+        seconds = done / byte_rate if byte_rate else 0.0
+        if SPEED > 0:
+            delay = start + seconds / SPEED - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        now = time.monotonic()
+        if now - last_report >= interval:
+            last_report = now
+            report(done / size * 100 if size else -1, seconds)
+
+    seconds = done / byte_rate if byte_rate else 0.0
+    report(100 if size else -1, seconds)
+    return seconds
+
+
+def write_placeholder(path: str, size: int) -> None:
+    """Writes an output file of given size"""
+    with open(path, 'wb') as f:
+        f.truncate(max(size, 0))
@@ -0,0 +1,6 @@
+import logging
+
+__version__ = '0.4.6'
+
+# Logging is configured by the command line, applications using eat as a library set up their own
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -1,23 +1,72 @@
 import argparse
+import logging
+import re
 import sys
-from multiprocessing import cpu_count
 from pathlib import Path
-from typing import IO, Optional
+from typing import IO, TYPE_CHECKING, List, Optional, Type
 
-import rich
+from eat import __version__
+from eat.encoders import FORMATS
+from eat.utils.scheduler import AUTO, CPU_COUNT
 
-from eat.handler import Handler
+if TYPE_CHECKING:
+    from eat.utils.events import EventStream
 
-__version__ = '0.4.6'
+# Heavy modules (handler, encoders, rich) are imported once they're needed,
+# so that --help/--version and argument errors return right away
+JOBS_HELP = 'number of simultaneous encodes (default: 1, %s if no value is given, ' \
+    '"auto" tunes it by measured throughput and system load)' % CPU_COUNT
+
+
+MARKUP = re.compile(r'\[[a-z#/@][^\[\]]*\]')  # rich tags like [bold] or [/], not usage brackets like [-h]
 
 
 class RichParser(argparse.ArgumentParser):
     def _print_message(self, message: str, file: Optional[IO[str]] = None) -> None:
+        """Only messages with markup are printed by rich, loading it takes longer than the rest of --version"""
+        if not MARKUP.search(message):
+            super()._print_message(message, file)
+            return
+
+        import rich
+
         rich.print(message, file=file)
 
 
-def main() -> None:
-    parser = RichParser()
+def jobs_value(value: str) -> int:
+    """Parses `-j`, "auto" is stored as 0"""
+    if value == 'auto':
+        return AUTO
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError('has to be a positive number or "auto"')
+
+    return int(value)
+
+
+def tracks_value(value: str) -> List[int]:
+    """Parses `--tracks`, "all" is stored as an empty list"""
+    if value == 'all':
+        return []
+    tracks = value.split(',')
+    if not all(track.strip().isdigit() for track in tracks):
+        raise argparse.ArgumentTypeError('has to be "all" or audio track numbers like 0,2,3')
+
+    return list(dict.fromkeys(int(track) for track in tracks))
+
+
+def progress_target(value: str) -> str:
+    """Checks `--progress-to`, it's only opened once encoding starts"""
+    kind, _, address = value.partition(':')
+    if value == '-' or (kind == 'fd' and address.isdigit()) or (kind == 'unix' and address) \
+            or (kind == 'tcp' and address.rpartition(':')[2].isdigit()):
+        return value
+
+    raise argparse.ArgumentTypeError('has to be -, fd:N, unix:PATH or tcp:HOST:PORT')
+
+
+def build_parser(parser_class: Type[RichParser] = RichParser) -> RichParser:
+    """Returns parser of the encoding command line, also used for serve mode profiles and the API"""
+    parser = parser_class()
     parser.add_argument(
         '-v', '--version',
         action='version',
@@ -47,7 +96,7 @@ def main() -> None:
         type=str.lower,
         default=['ddp'],
         dest='encoder',
-        choices=('rf64', 'dd', 'ddp', 'thd', 'opus', 'flac', 'aac'),
+        choices=FORMATS,
         help='output codec'
     )
 
@@ -82,6 +131,85 @@ def main() -> None:
         help='change output bit depth (FLAC only)'
     )
 
+    parser.add_argument(
+        '--analyze',
+        default=False,
+        action='store_true',
+        help='detect padded bit depth and silent channels in PCM (requires numpy)'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        nargs='?',
+        type=jobs_value,
+        default=1,
+        const=CPU_COUNT,
+        help=JOBS_HELP
+    )
+
+    parser.add_argument(
+        '--segments',
+        nargs='?',
+        type=int,
+        default=1,
+        const=CPU_COUNT,
+        help='encode long PCM inputs to FLAC in this many parallel segments '
+             '(default: 1, %s if no value is given)' % CPU_COUNT
+    )
+
+    parser.add_argument(
+        '--tracks',
+        type=tracks_value,
+        help='encode these audio tracks of multi-track inputs ("all" or numbers from 0, e.g. 0,2,3), '
+             'outputs are named after track number and language'
+    )
+
+    parser.add_argument(
+        '--reencode',
+        default=False,
+        action='store_true',
+        help='re-encode inputs already in the requested format instead of copying their audio as it is'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        default=False,
+        action='store_true',
+        help='skip outputs that are up to date, link outputs of identical inputs'
+    )
+
+    parser.add_argument(
+        '--resume',
+        default=False,
+        action='store_true',
+        help='continue the last interrupted batch (other options except -j are ignored)'
+    )
+
+    parser.add_argument(
+        '--cluster-dir',
+        type=Path,
+        dest='cluster_dir',
+        help='share the inputs with other eat processes started with the same folder '
+             '(on any machine, e.g. on NFS), each job is done by one of them'
+    )
+
+    parser.add_argument(
+        '--progress',
+        choices=('bars', 'jsonl'),
+        default='bars',
+        help='show progress bars, or write job events as JSON lines (see --progress-to) for other programs '
+             '(default: bars)'
+    )
+
+    parser.add_argument(
+        '--progress-to',
+        type=progress_target,
+        default='-',
+        metavar='TARGET',
+        help='where JSON lines events go: - (stdout, logs go to stderr), fd:N, unix:PATH or tcp:HOST:PORT '
+             '(default: -)'
+    )
+
     parser.add_argument(
         '-y', '--allow-overwrite',
         default=False,
@@ -96,12 +224,159 @@ def main() -> None:
         help='Print debug statements'
     )
 
-    args = parser.parse_args()
+    return parser
+
+
+def setup_terminal(debug: bool, events: Optional['EventStream'] = None, bars: bool = True) -> None:
+    """
+    Logs and shows progress in the terminal, eat used as a library leaves both to the caller.
+    Warnings and errors also go to the event stream, without bars logs go to stderr (stdout has the events)
+    """
+    from rich.console import Console
+    from rich.logging import RichHandler
+
+    from eat.utils.progress import set_display
+
+    handlers: List[logging.Handler] = [RichHandler(console=Console(stderr=not bars))]
+    if events:
+        from eat.utils.events import EventLogHandler
+
+        handlers.append(EventLogHandler(events))
+
+    logging.basicConfig(
+        format='%(message)s',
+        datefmt='',
+        level=logging.DEBUG if debug else logging.INFO,
+        handlers=handlers
+    )
+    set_display(bars)
+
+
+def serve(argv: List[str]) -> None:
+    """Runs the watch folder daemon"""
+    parser = RichParser(prog='eat serve', description='Encodes files dropped into a watched folder')
+    parser.add_argument(
+        '--watch',
+        required=True,
+        type=Path,
+        help='watched folder, files in subfolders named after a profile use it'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        nargs='?',
+        type=jobs_value,
+        default=1,
+        const=CPU_COUNT,
+        help=JOBS_HELP
+    )
+
+    parser.add_argument(
+        '-d', '--debug',
+        default=False,
+        action='store_true',
+        help='Print debug statements'
+    )
+
+    serve_args = parser.parse_args(argv)
+    if not serve_args.debug:
+        sys.tracebacklimit = 0
+
+    encode_parser = build_parser()
+    args = encode_parser.parse_args([])
+    args.jobs, args.debug = serve_args.jobs, serve_args.debug
+
+    from eat.daemon import Daemon
+    from eat.handler import Handler
+
+    setup_terminal(serve_args.debug)
+    Daemon(Handler(args), encode_parser, serve_args.watch).run()
+
+
+def server(argv: List[str]) -> None:
+    """Runs the HTTP job server"""
+    parser = RichParser(prog='eat server', description='Queues encodes submitted over HTTP')
+    parser.add_argument(
+        '--host',
+        help='address to listen on (default: [server] host from config, or 127.0.0.1)'
+    )
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        help='port to listen on (default: [server] port from config, or 8086)'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        nargs='?',
+        type=jobs_value,
+        default=1,
+        const=CPU_COUNT,
+        help=JOBS_HELP
+    )
+
+    parser.add_argument(
+        '-d', '--debug',
+        default=False,
+        action='store_true',
+        help='Print debug statements'
+    )
+
+    server_args = parser.parse_args(argv)
+    if not server_args.debug:
+        sys.tracebacklimit = 0
+
+    from eat.api import EncodeError, Session
+    from eat.server import Server
+
+    setup_terminal(server_args.debug)
+    try:
+        session = Session(jobs=server_args.jobs)
+    except EncodeError:
+        raise SystemExit  # missing config, logged already
+
+    config = session.config.get('server', {})
+    Server(
+        session,
+        host=server_args.host or config.get('host', '127.0.0.1'),
+        port=server_args.port or config.get('port', 8086),
+        token=config.get('token'),
+        max_queued=config.get('max_queued', 100)
+    ).run()
+
+
+def main() -> None:
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['server']:
+        server(sys.argv[2:])
+        return
+
+    args = build_parser().parse_args()
     if not args.debug:
         sys.tracebacklimit = 0  # set traceback limit for neater errors
 
-    handler = Handler(args)
-    handler.main()
+    from eat.handler import Handler
+
+    events = None
+    if args.progress == 'jsonl':
+        from eat.utils.events import open_stream
+
+        try:
+            events = open_stream(args.progress_to)
+        except OSError as e:
+            raise SystemExit(f'Can\'t open {args.progress_to} for progress events: {e}')
+
+    setup_terminal(args.debug, events, bars=not (events and args.progress_to == '-'))
+    handler = Handler(args, interactive=not events)  # there's nobody to answer prompts
+    handler.events = events
+    try:
+        handler.main()
+    finally:
+        if events:
+            events.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    Any, AsyncIterator, Callable, Dict, List, NamedTuple, NoReturn, Optional, Sequence, Type
+)
+
+from rich.progress import TaskID
+
+from eat.__main__ import RichParser, build_parser
+from eat.daemon import PROFILE_OPTIONS
+from eat.encoders import get_encoder_class
+from eat.encoders._base import OutputSettings
+from eat.handler import Handler
+from eat.job import Job
+from eat.utils.processor import CancelScope
+from eat.utils.progress import batch_progress
+from eat.utils.scheduler import AUTO, max_jobs
+
+
+class EncodeError(RuntimeError):
+    pass
+
+
+class EncodeSpec(NamedTuple):
+    """Input to encode to one or more formats, options are named like config profile keys"""
+    input_path: Path
+    formats: Sequence[str] = ('ddp',)
+    output_dir: Optional[Path] = None  # default: next to the input
+    bitrate: Optional[int] = None
+    mix: Optional[int] = None
+    sample_rate: Optional[int] = None
+    bit_depth: Optional[int] = None
+    segments: Optional[int] = None
+    tracks: Optional[str] = None  # "all" or track numbers like "0,2", outputs are named after their tracks
+    analyze: bool = False
+    reencode: bool = False  # inputs already in a requested format are copied otherwise
+    incremental: bool = False
+    overwrite: bool = False
+
+
+class EncodedOutput(NamedTuple):
+    format: str
+    path: Path  # as written, encoders can change the extension
+    params: Dict[str, Any]  # as encoded: bitrate, channels, sample rate, bit depth (None if they don't apply)
+    timings: Dict[str, float]  # seconds spent on intermediate, encode and the whole job
+
+
+class EncodeResult(NamedTuple):
+    spec: EncodeSpec
+    outputs: List[EncodedOutput]
+    skipped: List[str]  # formats with no new output (up to date, existing file, unsupported layout)
+    duration: float  # seconds since the encode started
+
+
+class ProgressEvent(NamedTuple):
+    spec: EncodeSpec
+    description: str  # e.g. 'Encoding "audio.ec3" with DEE'
+    completed: float
+    total: Optional[float]  # None if unknown
+
+
+ProgressListener = Callable[[ProgressEvent], None]
+Subscriber = Callable[[Optional[ProgressEvent]], None]  # gets None once the encode is done
+
+
+class Session:
+    """
+    Encodes submitted specs on a shared job pool, for using eat from other Python code.
+    Nothing is printed or prompted: logs go to "eat.*" loggers (left for the caller to configure),
+    progress to callbacks, existing outputs are only replaced if a spec allows it
+    """
+
+    def __init__(self, jobs: int = 1) -> None:
+        """Runs up to `jobs` encodes at once, 0 tunes that by measured throughput and system load"""
+        self.logger = logging.getLogger(__name__)
+        self._parser = build_parser(_SpecParser)
+        args = self._parser.parse_args([])
+        args.jobs = jobs if jobs > 0 else AUTO
+        try:
+            self._handler = Handler(args, interactive=False)
+        except SystemExit:
+            raise EncodeError('eat config not found, see ~/.eat/config.toml.example') from None
+
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs(jobs), thread_name_prefix='eat-job')
+        # Submissions wait for their jobs, so they can't take slots of the job pool
+        self._dispatcher = ThreadPoolExecutor(max_workers=max_jobs(jobs), thread_name_prefix='eat')
+        self._stack = ExitStack()
+        self._batch = self._stack.enter_context(batch_progress())
+        self._trackers: 'weakref.WeakKeyDictionary[Future, _Tracker]' = weakref.WeakKeyDictionary()
+        self._scopes: 'weakref.WeakKeyDictionary[Future, CancelScope]' = weakref.WeakKeyDictionary()
+
+    @property
+    def config(self) -> dict:
+        """Loaded config.toml"""
+        return self._handler.config
+
+    def __enter__(self) -> 'Session':
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        self.close(wait=exc_type is None)
+
+    def submit(
+        self,
+        spec: EncodeSpec,
+        on_progress: Optional[ProgressListener] = None
+    ) -> 'Future[EncodeResult]':
+        """
+        Queues an encode, returns its future (failing with EncodeError if the input can't be encoded,
+        CancelledError if it's cancelled while running). Invalid options raise ValueError right away.
+        Progress callbacks are called from eat's threads
+        """
+        handler = self._handler.with_args(self._args(spec))
+        tracker = _Tracker(spec, on_progress)
+        scope = CancelScope()
+        future = self._dispatcher.submit(self._encode, handler, spec, tracker, scope)
+        future.add_done_callback(tracker.close)
+        self._trackers[future] = tracker
+        self._scopes[future] = scope
+        return future
+
+    def cancel(self, future: 'Future[EncodeResult]') -> bool:
+        """Cancels a queued encode or kills processes of a running one, returns False if it's done"""
+        if future.cancel():
+            return True
+        if future.done() or future not in self._scopes:
+            return False
+
+        self._scopes[future].cancel()
+        return True
+
+    def subscribe(self, future: 'Future[EncodeResult]', subscriber: Subscriber) -> None:
+        """
+        Passes progress of a submitted encode to a subscriber (from eat's threads),
+        current state of its tasks first, then updates, then None once it's done
+        """
+        tracker = self._trackers.get(future)
+        if tracker:
+            tracker.subscribe(subscriber)
+        else:
+            subscriber(None)
+
+    def unsubscribe(self, future: 'Future[EncodeResult]', subscriber: Subscriber) -> None:
+        tracker = self._trackers.get(future)
+        if tracker:
+            tracker.unsubscribe(subscriber)
+
+    async def progress(self, future: 'Future[EncodeResult]') -> AsyncIterator[ProgressEvent]:
+        """Yields progress of a submitted encode until it's done, starting with current state of its tasks"""
+        loop = asyncio.get_running_loop()
+        events: 'asyncio.Queue[Optional[ProgressEvent]]' = asyncio.Queue()
+
+        def listener(event: Optional[ProgressEvent]) -> None:
+            try:
+                loop.call_soon_threadsafe(events.put_nowait, event)
+            except RuntimeError:  # loop closed, nobody's listening anymore
+                pass
+
+        self.subscribe(future, listener)
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.unsubscribe(future, listener)
+
+    def close(self, wait: bool = True) -> None:
+        """Stops accepting encodes, unless waiting for them, queued ones are cancelled and running killed"""
+        if not wait:
+            for future in [*self._scopes]:
+                self.cancel(future)
+        self._dispatcher.shutdown(wait=wait)
+        self._executor.shutdown(wait=wait)
+        self._stack.close()
+
+    def _args(self, spec: EncodeSpec) -> argparse.Namespace:
+        """Returns command line args for a spec, validated by the same parser"""
+        if not spec.formats:
+            raise ValueError('No formats given')
+
+        argv = ['-f', *spec.formats]
+        for key, option in PROFILE_OPTIONS.items():
+            if getattr(spec, key) is not None:
+                argv += [option, str(getattr(spec, key))]
+        for key, option in (('analyze', '--analyze'), ('reencode', '--reencode'),
+                            ('incremental', '--incremental'), ('overwrite', '-y')):
+            if getattr(spec, key):
+                argv.append(option)
+
+        args = self._parser.parse_args(argv)
+        args.input = [spec.input_path]
+        args.output_dir = spec.output_dir or spec.input_path.parent
+        args.jobs = self._handler.args.jobs
+        return args
+
+    def _encode(
+        self,
+        handler: Handler,
+        spec: EncodeSpec,
+        tracker: '_Tracker',
+        scope: CancelScope
+    ) -> EncodeResult:
+        started = time.time()
+        try:
+            jobs, failed = handler.run(
+                [spec.input_path], self._executor, self._batch, on_progress=tracker, scope=scope
+            )
+        except SystemExit:  # missing binary, logged already
+            raise EncodeError('Encoder binary not found, check [binaries] in config') from None
+        if failed:
+            raise EncodeError('"%s" couldn\'t be processed, see log for details' % spec.input_path)
+
+        outputs = [
+            self._output(job, handler.args)
+            for finished in jobs for job in (finished, *finished.combined)
+        ]
+        written = {output.format for output in outputs}
+        return EncodeResult(
+            spec=spec,
+            outputs=outputs,
+            skipped=[name for name in spec.formats if name not in written],
+            duration=time.time() - started
+        )
+
+    @staticmethod
+    def _output(job: Job, args: argparse.Namespace) -> EncodedOutput:
+        info = job.file_info
+        settings = job.output_settings or OutputSettings()
+        started, finished = job.stages['started'], job.stages['finished']
+        encode = job.stages.get('encode', started)
+        return EncodedOutput(
+            format=job.encoder_name,
+            path=job.written or job.output_path,
+            params=dict(
+                bitrate=settings.bitrate,
+                channels=settings.channels or info.channels,
+                sample_rate=args.sample_rate or job.resample_rate or info.sample_rate,
+                # Bit depth of lossy outputs is up to the decoder
+                bit_depth=settings.bit_depth if get_encoder_class(job.encoder_name).lossless else None
+            ),
+            timings=dict(
+                intermediate=job.stages.get('prepared', encode) - job.stages.get('intermediate', encode),
+                encode=finished - encode,
+                total=finished - started
+            )
+        )
+
+
+class _SpecParser(RichParser):
+    """Raises on invalid options instead of printing usage and exiting"""
+
+    def error(self, message: str) -> NoReturn:
+        raise ValueError(message)
+
+
+class _Tracker:
+    """Passes progress of an encode to its callback and listeners, keeping latest state of each task"""
+
+    def __init__(self, spec: EncodeSpec, callback: Optional[ProgressListener]) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._spec = spec
+        self._callback = callback
+        self._lock = threading.Lock()
+        self._latest: Dict[TaskID, ProgressEvent] = {}
+        self._listeners: List[Subscriber] = []
+        self._closed = False
+
+    def __call__(self, task_id: TaskID, description: str, completed: float, total: Optional[float]) -> None:
+        event = ProgressEvent(self._spec, description, completed, total)
+        with self._lock:
+            self._latest[task_id] = event
+            listeners = [*self._listeners]
+
+        if self._callback:
+            try:
+                self._callback(event)
+            except Exception:
+                self.logger.exception('Progress callback failed')
+        for listener in listeners:
+            listener(event)
+
+    def subscribe(self, listener: Subscriber) -> None:
+        with self._lock:
+            for event in self._latest.values():
+                listener(event)
+            if self._closed:
+                listener(None)
+            else:
+                self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Subscriber) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def close(self, _: Future) -> None:
+        with self._lock:
+            self._closed = True
+            listeners, self._listeners = self._listeners, []
+
+        for listener in listeners:
+            listener(None)
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from eat.handler import Handler
+from eat.utils.lease import Lease, LeaseDir
+from eat.utils.processor import CancelScope
+from eat.utils.progress import Batch, batch_progress
+from eat.utils.scheduler import max_jobs
+from eat.utils.signals import interrupt_on_sigterm
+
+
+class Cluster:
+    """
+    Encodes inputs together with other eat processes started with the same cluster folder
+    (on any machine that has it, e.g. on NFS), every (input, format) job is done by one of them.
+    Nodes claim jobs with leases, those of nodes that die expire and are taken over,
+    so every node runs until all jobs are finished. Outputs are written under a temporary name
+    and renamed once complete
+    """
+
+    def __init__(self, handler: Handler, path: Path) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._handler = handler.with_args(handler.args)
+        self._handler.interactive = False  # there's nobody to ask on other nodes
+        self._handler.atomic_outputs = True
+        self._jobs = max_jobs(handler.args.jobs)
+
+        config = handler.config.get('cluster', {})
+        self._poll_interval = float(config.get('poll_interval', 5))
+        self._leases = LeaseDir(path, timeout=float(config.get('lease_timeout', 60)))
+        self._stopping = threading.Event()
+        self._scopes: Dict[Future, CancelScope] = {}
+
+    def run(self, inputs: List[Path]) -> None:
+        """Claims and encodes jobs until all of them are finished (by any node) or interrupted"""
+        jobs: Dict[str, Tuple[Path, str]] = {}
+        for input_path in inputs:
+            if not input_path.exists():
+                self.logger.error('"%s" doesn\'t exist on this node!', input_path)
+                continue
+            for encoder_name in self._handler.args.encoder:
+                jobs[self._key(input_path, encoder_name)] = (input_path, encoder_name)
+
+        interrupt_on_sigterm()
+        self.logger.info('Joined cluster as %s, %d jobs', self._leases.node, len(jobs))
+        with self._leases, batch_progress() as batch, \
+                ThreadPoolExecutor(max_workers=self._jobs) as executor, \
+                ThreadPoolExecutor(max_workers=self._jobs) as dispatcher:
+            try:
+                self._dispatch(jobs, executor, dispatcher, batch)
+            except KeyboardInterrupt:
+                # Claimed jobs are released for other nodes, partial outputs removed
+                self._stopping.set()
+                for scope in [*self._scopes.values()]:
+                    scope.cancel()
+                self.logger.info('Stopping, releasing claimed jobs...')
+                raise
+
+        errors = {key: self._leases.failed(key) for key in jobs}
+        failed = [key for key, error in errors.items() if error]
+        for key in failed:
+            self.logger.error('"%s" to %s failed: %s', *jobs[key], errors[key])
+        self.logger.info('All %d jobs are finished, %d failed', len(jobs), len(failed))
+
+    def _dispatch(
+        self,
+        jobs: Dict[str, Tuple[Path, str]],
+        executor: ThreadPoolExecutor,
+        dispatcher: ThreadPoolExecutor,
+        batch: Batch
+    ) -> None:
+        """Claims jobs whenever there's a free slot, formats of an input are claimed together"""
+        running: Dict[Future, Path] = {}
+        waiting = 0
+        while True:
+            self._leases.refresh()
+            pending = {key: job for key, job in jobs.items() if not self._leases.finished(key)}
+            if not pending:
+                return
+
+            # With -j auto, only as many inputs as the tuned limit are claimed, others are left to other nodes
+            tuner = self._handler.tuner
+            slots = min(self._jobs, tuner.limit) if tuner else self._jobs
+            for input_path in dict.fromkeys(input_path for input_path, _ in pending.values()):
+                if len(running) >= slots:
+                    break
+                if input_path in running.values():
+                    continue
+
+                scope = CancelScope()
+                leases = [
+                    lease for lease in (
+                        self._leases.claim(key, dict(input=str(path), format=name), scope.cancel)
+                        for key, (path, name) in pending.items() if path == input_path
+                    ) if lease
+                ]
+                if leases:
+                    future = dispatcher.submit(self._encode, input_path, leases, jobs, executor, batch, scope)
+                    running[future] = input_path
+                    self._scopes[future] = scope
+
+            if not running:
+                if waiting != len(pending):
+                    self.logger.info('Waiting for %d jobs held by other nodes', len(pending))
+                    waiting = len(pending)
+                self._stopping.wait(self._poll_interval)
+                continue
+
+            waiting = 0
+            done, _ = wait(running, timeout=self._poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                del self._scopes[future]
+                future.result()
+
+    def _encode(
+        self,
+        input_path: Path,
+        leases: List[Lease],
+        jobs: Dict[str, Tuple[Path, str]],
+        executor: ThreadPoolExecutor,
+        batch: Batch,
+        scope: CancelScope
+    ) -> None:
+        """Encodes an input to claimed formats, then marks them done or failed"""
+        formats = [jobs[lease.key][1] for lease in leases]
+        error: Optional[str] = None
+        try:
+            _, failed = self._handler.run([input_path], executor, batch, {input_path: formats}, scope=scope)
+        except Exception as e:
+            # Ctrl+C reaches child processes too, their failures aren't the input's fault.
+            # Jobs taken over by another node aren't ours to mark
+            if scope.cancelled or self._stopping.wait(timeout=1):
+                for lease in leases:
+                    self._leases.release(lease)
+                return
+            error = str(e) or type(e).__name__
+            self.logger.error('Encoding "%s" failed: %s', input_path.name, error)
+        else:
+            error = 'not processed' if failed else None
+
+        for lease in leases:
+            self._leases.finish(lease, error)
+
+    def _key(self, input_path: Path, encoder_name: str) -> str:
+        """Returns id of a job, the same on every node (paths have to be the same on all of them)"""
+        output_dir = self._handler.args.output_dir.resolve()
+        job = '\0'.join((str(input_path.resolve()), encoder_name, str(output_dir)))
+        return hashlib.sha1(job.encode()).hexdigest()
@@ -24,6 +24,10 @@ class Config:
             shutil.copy(self._example_config, example_path)
             raise SystemExit
 
+    @property
+    def config_dir(self) -> Path:
+        return self._config_dir
+
     def load(self) -> dict:
         with self._config_path.open(mode='r', encoding='utf-8') as f:
             config = toml.load(f)
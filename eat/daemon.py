@@ -0,0 +1,162 @@
+import argparse
+import fnmatch
+import logging
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from eat.handler import Handler
+from eat.utils.progress import Batch, batch_progress
+from eat.utils.scheduler import max_jobs
+from eat.utils.signals import interrupt_on_sigterm
+from eat.utils.watch import Watcher
+
+PROFILE_OPTIONS = {
+    'bitrate': '-b',
+    'mix': '-m',
+    'sample_rate': '--sample-rate',
+    'bit_depth': '--bit-depth',
+    'segments': '--segments',
+    'tracks': '--tracks',
+}
+
+
+class Daemon:
+    """
+    Encodes files dropped into a watched folder with format profiles from config,
+    one handler per profile is created up front and all of them share a job pool
+    """
+
+    def __init__(self, handler: Handler, parser: argparse.ArgumentParser, watch_dir: Path) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.watch_dir = watch_dir.resolve()
+        self.watch_dir.mkdir(parents=True, exist_ok=True)
+        self._jobs = max_jobs(handler.args.jobs)
+
+        config = handler.config.get('serve', {})
+        self._settle = float(config.get('settle', 5))
+        self._poll_interval = float(config.get('poll_interval', 2))
+        self._done_dir = self.watch_dir / config.get('done_dir', 'done')
+        self._failed_dir = self.watch_dir / config.get('failed_dir', 'failed')
+        output_dir = config.get('output_dir', 'out')
+
+        profiles = handler.config.get('profiles') or {'default': {}}
+        self._patterns: Dict[str, List[str]] = {}
+        self._handlers: Dict[str, Handler] = {}
+        for name, profile in profiles.items():
+            args = parser.parse_args(self._profile_argv(profile, output_dir))
+            args.jobs, args.debug = handler.args.jobs, handler.args.debug
+            self._handlers[name] = handler.with_args(args)
+            self._patterns[name] = profile.get('patterns', [])
+
+        self._stopping = threading.Event()
+        self._pending: Set[Future] = set()
+        self._watcher: Watcher
+
+    def run(self) -> None:
+        """Watches the folder until interrupted, running encodes are let finish"""
+        self._watcher = Watcher(self.watch_dir, [*self._handlers], self._settle, self._poll_interval)
+        interrupt_on_sigterm()
+        self.logger.info(
+            'Watching "%s" (profiles: %s)',
+            self.watch_dir,
+            ', '.join(self._handlers)
+        )
+
+        with batch_progress() as batch, \
+                ThreadPoolExecutor(max_workers=self._jobs) as executor, \
+                ThreadPoolExecutor(max_workers=self._jobs) as dispatcher:
+            try:
+                for file in self._watcher:
+                    future = dispatcher.submit(self._process, file, executor, batch)
+                    future.add_done_callback(self._pending.discard)
+                    self._pending.add(future)
+            except KeyboardInterrupt:
+                self._stopping.set()
+                for future in [*self._pending]:
+                    future.cancel()
+                self.logger.info('Stopping, waiting for running encodes...')
+
+    def _process(self, file: Path, executor: ThreadPoolExecutor, batch: Batch) -> None:
+        """
+        Encodes a single file with its profile, then moves it to done/failed folder.
+        Files that couldn't be moved stay taken, so that they aren't encoded again on every scan
+        """
+        moved = True
+        try:
+            moved = self._encode(file, executor, batch)
+        finally:
+            if moved:
+                self._watcher.release(file)
+
+    def _encode(self, file: Path, executor: ThreadPoolExecutor, batch: Batch) -> bool:
+        """Returns False if the file was processed, but couldn't be moved out of the watched folder"""
+        name = self._route(file)
+        if not name:
+            self.logger.error('No profile matches "%s"', file.name)
+            return self._move(file, self._failed_dir)
+
+        self.logger.info('Picked up "%s" (profile: %s)', file.name, name)
+        try:
+            _, failed = self._handlers[name].run([file], executor, batch)
+        except (Exception, SystemExit) as e:  # e.g. a missing binary exits
+            # Ctrl+C reaches child processes too, their failures aren't the file's fault.
+            # The main thread may notice the interrupt only after we do
+            if self._stopping.wait(timeout=1):
+                self.logger.info('"%s" interrupted, left in place', file.name)
+                return True
+            self.logger.error('Encoding "%s" failed: %s', file.name, str(e) or type(e).__name__)
+            return self._move(file, self._failed_dir)
+
+        return self._move(file, self._failed_dir if failed else self._done_dir)
+
+    def _route(self, file: Path) -> Optional[str]:
+        """Returns profile of a file: subfolder named after it, matching pattern, or default"""
+        relative = file.relative_to(self.watch_dir)
+        if len(relative.parts) > 1:
+            return relative.parts[0]
+
+        for name, patterns in self._patterns.items():
+            if any(fnmatch.fnmatch(file.name.lower(), pattern.lower()) for pattern in patterns):
+                return name
+
+        return 'default' if 'default' in self._handlers else None
+
+    def _move(self, file: Path, directory: Path) -> bool:
+        """Moves a processed file, keeping its profile subfolder and never replacing anything"""
+        target = directory / file.relative_to(self.watch_dir)
+        if target.exists():
+            target = target.with_name('%s.%d%s' % (target.stem, time.time(), target.suffix))
+
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(file), str(target))
+        except OSError as e:
+            self.logger.error(
+                'Couldn\'t move "%s" to "%s": %s, it won\'t be picked up again until eat restarts', file, target, e
+            )
+            return False
+
+        return True
+
+    def _profile_argv(self, profile: dict, output_dir: str) -> List[str]:
+        """Converts a config profile to encoding command line arguments"""
+        argv = [
+            '-f', *profile.get('formats', ['ddp']),
+            '-o', str(self.watch_dir / Path(profile.get('output_dir', output_dir)).expanduser()),
+            '-y'
+        ]
+        for key, option in PROFILE_OPTIONS.items():
+            if profile.get(key) is not None:
+                argv += [option, str(profile[key])]
+        if profile.get('analyze'):
+            argv.append('--analyze')
+        if profile.get('incremental'):
+            argv.append('--incremental')
+        if profile.get('reencode'):
+            argv.append('--reencode')
+
+        return argv
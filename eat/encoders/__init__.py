@@ -0,0 +1,18 @@
+import importlib
+from functools import lru_cache
+from typing import TYPE_CHECKING, Type
+
+if TYPE_CHECKING:
+    from eat.encoders._base import BaseEncoder
+
+FORMATS = ('rf64', 'dd', 'ddp', 'thd', 'opus', 'flac', 'aac')
+COPY = 'copy'  # stream copy of inputs already in the requested format, not selectable
+
+
+@lru_cache(maxsize=None)
+def get_encoder_class(name: str) -> Type['BaseEncoder']:
+    """Returns encoder class of a format, its module is imported on first use"""
+    if name not in FORMATS and name != COPY:
+        raise ValueError('Unknown format "%s"' % name)
+
+    return importlib.import_module('eat.encoders.%s' % name).Encoder  # type: ignore[no-any-return]
@@ -1,33 +1,48 @@
 import logging
 import sys
 from pathlib import Path
-from typing import Any, List, Literal, Optional, Union
-
-import xmltodict
+from typing import Any, Dict, List, Literal, NamedTuple, Optional, Union
 
+from eat.utils.analysis import PcmAnalysis
 from eat.utils.processor import Processor
 
 
+class OutputSettings(NamedTuple):
+    """Settings an encoder was configured with, None where the input's are kept or they don't apply"""
+    bitrate: Optional[int] = None  # kbps, None for lossless and quality-based (qaac) encodes
+    channels: Optional[int] = None
+    bit_depth: Optional[int] = None  # of lossless outputs
+
+
 class BaseEncoder:
     extension: str
     binary_name: str
     supported_inputs: List[str] = ['pcm']
     supported_sample_rates: Optional[List[int]] = None  # None = all
+    supports_stdin: bool = False  # can encode a WAV stream piped from ffmpeg
+    copy_from: Dict[str, str] = {}  # input codec: ffmpeg muxer, streams already in this format are copied
+    lossless: bool = False  # bitrate doesn't apply
     _input_file: Path
     _output_file: Path
     _bitrate: str = '0'  # can't parse int to subprocess, use 0 for lossless
     _temp_dir: Path
     _to_remove: List[Path] = []
+    output_settings = OutputSettings()  # set once configured, options can be changed by the encoder
 
     def __init__(self, path: Path) -> None:
         self._path = path
-        self._processor = Processor()
+        self._processor = Processor(name=self.binary_name)
+        self._to_remove = []  # per instance, encoders can run concurrently
         self.logger = logging.getLogger(sys.modules[self.__module__].__name__)
 
     def __call__(self, *args: Any, **kwargs: Any) -> None:
         self._configure(*args, **kwargs)
         self._encode()
 
+    def configure(self, *args: Any, **kwargs: Any) -> None:
+        """Configures encoding params without starting an encode (e.g. for piping)"""
+        self._configure(*args, **kwargs)
+
     # Each encoder takes different params, BaseEncoder lists all possible ones
     def _configure(
         self,
@@ -43,6 +58,11 @@ class BaseEncoder:
         remix: bool = False,
         surround_ex: bool = False,
         filter_complex: Optional[str] = None,
+        source: Optional['BaseEncoder'] = None,
+        analysis: Optional[PcmAnalysis] = None,
+        segments: int = 1,
+        track: Optional[int] = None,
+        muxer: Optional[str] = None,
     ) -> None:
         """Configures encoding params"""
         raise NotImplementedError
@@ -1,21 +1,87 @@
 import os
 import re
-import subprocess
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Optional, TextIO, cast
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import xmltodict
-from rich.progress import Progress
+from rich.progress import Progress, TaskID
 
 from eat.encoders._base import BaseEncoder
+from eat.utils.progress import shared_progress
 from eat.utils.tempfile import get_temp_file
 
 
+SLOT = re.compile('\x00([0-9]+)\x00')  # element value placeholder in templates
+
+
+class XmlTemplate:
+    """
+    DEE job config, parsed and serialized once,
+    jobs only fill in values of elements (addressed by path, e.g. "output/ec3/file_name").
+    Renamed elements keep their original path
+    """
+
+    def __init__(self, path: Path, renames: Tuple[Tuple[str, str], ...] = ()) -> None:
+        import xmltodict
+
+        self.defaults: Dict[str, str] = {}
+        self._keys: List[str] = []
+        self._renames = dict(renames)
+        config = xmltodict.parse(path.read_text(), dict_constructor=dict)
+        root, = config
+        skeleton = {root: self._slots(config[root], '')}
+        self._parts = SLOT.split(xmltodict.unparse(skeleton, pretty=True, indent=' ' * 4))
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """Returns config XML with given values, other elements keep their defaults"""
+        unknown = set(values) - set(self.defaults)
+        if unknown:
+            raise KeyError('Unknown DEE config elements: %s' % ', '.join(sorted(unknown)))
+
+        out = []
+        for index, part in enumerate(self._parts):
+            if index % 2:
+                key = self._keys[int(part)]
+                out.append(_escape(str(values.get(key, self.defaults[key]))))
+            else:
+                out.append(part)
+
+        return ''.join(out)
+
+    def _slots(self, node: Union[dict, list, str, None], path: str) -> Any:
+        """Replaces element values with numbered placeholders, attributes are kept"""
+        if isinstance(node, dict):
+            return {
+                self._renames.get(path + key, key):
+                    value if key.startswith('@') else self._slots(value, f'{path}{key}/')
+                for key, value in node.items()
+            }
+        if isinstance(node, list):
+            return [self._slots(item, f'{path}{index}/') for index, item in enumerate(node)]
+
+        key = path.rstrip('/')
+        self.defaults[key] = node or ''
+        self._keys.append(key)
+        return '\x00%d\x00' % (len(self._keys) - 1)
+
+
+def _escape(text: str) -> str:
+    """Escapes element text the same way as xmltodict (saxutils pulls in urllib)"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+@lru_cache(maxsize=None)
+def load_template(path: Path, renames: Tuple[Tuple[str, str], ...] = ()) -> XmlTemplate:
+    return XmlTemplate(path, renames)
+
+
 class DeeEncoder(BaseEncoder):
     """Dolby Encoding Engine encoder base class"""
     extension: str
     binary_name: str = 'dee'
-    _config: dict
+    _template: XmlTemplate
+    _renames: Tuple[Tuple[str, str], ...] = ()  # (path, new tag) of config elements
+    _config: Dict[str, Any]  # element values, by path
     _temp_dir: Path
     _filename: str  # display only
 
@@ -24,56 +90,51 @@ class DeeEncoder(BaseEncoder):
         self._config_dir = Path(__file__).resolve().parent.parent / 'data' / 'xml'
 
     def _load_xml(self, config_path: Path) -> None:
-        """Loads config xml into an editable dict"""
-        self._config = xmltodict.parse(
-            config_path.read_text(),
-            dict_constructor=dict
-        )
+        """Loads config template, values are set in self._config"""
+        self._template = load_template(config_path, self._renames)
+        self._config = {}
 
     def _encode(self) -> None:
         """Starts an encoding process"""
         file = get_temp_file(suffix='.xml', directory=self._temp_dir)
         with file.open(mode='w', encoding='utf-8') as f:
-            f.write(self._export_xml(self._config))
-
-        self._processor.call_process_output(
-            params=[
-                self._path,
-                '--xml', str(file),
-                '--verbose', 'info',
-                '--progress-interval', '500',  # update progress every 500 ms (minimum allowed)
-                '--diagnostics-interval', "%01d" % 9e9,  # 0/-1 don't work to shut it up
-            ],
-            output_handler=self._rich_handler
-        )
-        file.unlink()
+            f.write(self._export_xml())
 
-    def _rich_handler(self, process: subprocess.Popen) -> None:
-        """Handles Rich progress bar"""
-        with Progress() as pb:
+        with shared_progress() as pb:
             task = pb.add_task(self._get_task_name(), total=100)
-
-            with cast(TextIO, process.stdout) as stdout:
-                for line in iter(stdout.readline, ''):
-                    self.logger.debug(line.split(']', 1)[-1].strip())
-                    if 'error' in line.lower():
-                        self.logger.error(line.rstrip().split(': ', 1)[1])
-
-                    progress = re.search(
-                        r'Overall progress: ([0-9]+\.[0-9])',
-                        line
-                    )
-                    if progress:
-                        pb.update(task_id=task, completed=float(progress[1]))
+            self._processor.call_process_output(
+                params=[
+                    self._path,
+                    '--xml', str(file),
+                    '--verbose', 'info',
+                    '--progress-interval', '500',  # update progress every 500 ms (minimum allowed)
+                    '--diagnostics-interval', "%01d" % 9e9,  # 0/-1 don't work to shut it up
+                ],
+                stdout_handler=partial(self._rich_handler, pb, task)
+            )
 
             # Manually update to 100% in case last progress update was outdated
             pb.update(task_id=task, completed=100)
 
+        file.unlink()
+
+    def _rich_handler(self, pb: Progress, task: TaskID, line: str) -> None:
+        """Handles Rich progress bar"""
+        self.logger.debug(line.split(']', 1)[-1].strip())
+        if 'error' in line.lower():
+            self.logger.error(line.rstrip().split(': ', 1)[-1])
+
+        progress = re.search(
+            r'Overall progress: ([0-9]+\.[0-9])',
+            line
+        )
+        if progress:
+            pb.update(task_id=task, completed=float(progress[1]))
+
     def _get_task_name(self) -> str:
         """Returns task name for Rich progress bar"""
         return f'Encoding "{self._filename}" with DEE'
 
-    @staticmethod
-    def _export_xml(xml_data: dict) -> str:
-        """Exports config dict to a DEE-readable XML file"""
-        return cast(str, xmltodict.unparse(xml_data, pretty=True, indent=' ' * 4))
+    def _export_xml(self) -> str:
+        """Exports config to a DEE-readable XML file"""
+        return self._template.render(self._config)
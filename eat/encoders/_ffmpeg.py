@@ -1,10 +1,23 @@
-import subprocess
+import re
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, List, Optional, TextIO, cast
+from typing import Iterator, List, Optional, Tuple, Union
 
-from rich.progress import Progress
+from rich.progress import Progress, TaskID
 
 from eat.encoders._base import BaseEncoder
+from eat.utils.processor import LineHandler, Processor
+from eat.utils.progress import is_displayed, shared_progress
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_version(path: Path) -> Optional[Tuple[int, int]]:
+    """Returns (major, minor) version of an ffmpeg binary, None for builds without one (e.g. from git)"""
+    lines: List[str] = []
+    Processor().call_process_output(params=[path, '-version'], stdout_handler=lines.append)
+    match = re.match(r'ffmpeg version n?(\d+)\.(\d+)', lines[0] if lines else '')
+    return (int(match[1]), int(match[2])) if match else None
 
 
 class FFmpegEncoder(BaseEncoder):
@@ -17,33 +30,79 @@ class FFmpegEncoder(BaseEncoder):
     _extra_params: List[str] = []
     _duration: Optional[int]  # microseconds
     _filter_complex: List[str] = []
+    _track: Optional[int] = None  # audio track of the input, ffmpeg's default choice if None
 
     def __init__(self, path: Path) -> None:
         super().__init__(path)
+        self._filter_complex = []
 
     def _encode(self) -> None:
         """Starts an encoding process"""
-        self._processor.call_process_output(
-            params=[
-                self._path,
-                '-loglevel', 'panic',
-                '-stats',
-                '-y',
-                '-progress', 'pipe:1',
-                '-drc_scale', '0',
-                '-i', self._input_file,
-                '-c:a', self._codec,
-                *self._extra_params,
-                *self._filter_complex_params(),
-                '-b:a', f'{self._bitrate}k',
-                self._output_file
-            ],
-            output_handler=self._rich_handler
-        )
-
-    def _filter_complex_params(self) -> List[str]:
+        self.encode_with([])
+
+    def encode_with(self, others: List['FFmpegEncoder']) -> None:
+        """
+        Starts a single encoding process writing this and other encoders' outputs,
+        all encoders have to be configured with the same input
+        """
+        params = [*self._input_params(), *self._output_params()]
+        for encoder in others:
+            params.extend(encoder._output_params())
+            self._codec_name += f', {encoder._codec_name}'
+
+        if not self._duration or self._duration < 0:
+            self.logger.info(f'Converting "{self._input_file.name}"" to {self._codec_name}')
+            self._processor.call_process_output(
+                params=params,
+                stdout_handler=lambda _: None,  # -progress output, unused without duration
+                stderr_handler=self._simple_handler
+            )
+            return
+
+        with shared_progress() as pb:
+            task = pb.add_task(
+                f'Converting "{self._input_file.name}" to {self._codec_name}',
+                total=self._duration
+            )
+            self._processor.call_process_output(
+                params=params,
+                stdout_handler=self._progress_handler(pb, task)
+            )
+
+            # Manually update to 100% in case last progress update was outdated
+            pb.update(task_id=task, completed=self._duration)
+
+    def _input_params(self) -> List[Union[str, Path]]:
+        return [
+            self._path,
+            '-loglevel', 'panic',
+            '-stats',
+            '-y',
+            '-progress', 'pipe:1',
+            '-drc_scale', '0',
+            '-i', self._input_file,
+        ]
+
+    def _output_params(self) -> List[Union[str, Path]]:
+        """Returns codec, filter and output params, each output keeps its own"""
+        return [
+            *self._map_params(),
+            '-c:a', self._codec,
+            *self._extra_params,
+            *self._filter_params(),
+            '-b:a', f'{self._bitrate}k',
+            self._output_file
+        ]
+
+    def _map_params(self) -> List[str]:
+        if self._track is not None:
+            return ['-map', f'0:a:{self._track}']
+
+        return []
+
+    def _filter_params(self) -> List[str]:
         if self._filter_complex:
-            return ['-filter_complex', ','.join(self._filter_complex)]
+            return ['-filter:a', ','.join(self._filter_complex)]
 
         return []
 
@@ -66,40 +125,34 @@ class FFmpegEncoder(BaseEncoder):
 
         return ':'.join(resample_params)
 
-    def _rich_handler(self, process: subprocess.Popen) -> None:
-        """Handles Rich progress bar"""
-        if not self._duration or self._duration < 0:
-            return self._simple_handler(process)
-
-        with Progress() as pb:
-            task = pb.add_task(
-                f'Converting "{self._input_file.name}" to {self._codec_name}',
-                total=self._duration
-            )
-
-            with cast(TextIO, process.stdout) as stdout:
-                for line in iter(stdout.readline, ''):
-                    if '=' not in line:
-                        continue
-                    key, val = line.split('=')
-                    if key == 'out_time_us':
-                        pb.update(task_id=task, completed=int(val))
+    def _progress_handler(self, pb: Progress, task: TaskID) -> LineHandler:
+        """Returns a handler updating Rich progress bar from `-progress` output lines"""
+        def handler(line: str) -> None:
+            if 'error' in line.lower():
+                self.logger.error(line.rstrip())
+            key, _, val = line.rstrip().partition('=')
+            if key == 'out_time_us' and val.isdigit():
+                pb.update(task_id=task, completed=int(val))
+
+        return handler
+
+    @contextmanager
+    def pipe_progress(self, description: str) -> Iterator[LineHandler]:
+        """
+        Shows Rich progress bar for a decoding process piped into another encoder,
+        yields handler for its stderr (progress is written there, as stdout is used for audio)
+        """
+        total = self._duration if self._duration and self._duration > 0 else None
+        with shared_progress() as pb:
+            task = pb.add_task(description, total=total)
+            yield self._progress_handler(pb, task)
 
             # Manually update to 100% in case last progress update was outdated
-            pb.update(task_id=task, completed=self._duration)
-
-        with cast(TextIO, process.stderr) as stderr:
-            for line in iter(stderr.readline, ''):
-                self.logger.debug(line.strip())
-                if 'error' in line.lower():
-                    self.logger.error(line.rstrip())
+            pb.update(task_id=task, total=total or 1, completed=total or 1)
 
-    def _simple_handler(self, process: subprocess.Popen) -> None:
+    def _simple_handler(self, line: str) -> None:
         """Handles simple (native ffmpeg) progress output"""
-        self.logger.info(f'Converting "{self._input_file.name}"" to {self._codec_name}')
-        with cast(TextIO, process.stderr) as stderr:
-            for line in iter(stderr.readline, ''):
-                if 'error' in line.lower():
-                    self.logger.error(line.rstrip())
-                else:
-                    print(line.rstrip(), end='\r')
+        if 'error' in line.lower():
+            self.logger.error(line.rstrip())
+        elif is_displayed():
+            print(line.rstrip(), end='\r')
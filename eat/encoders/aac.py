@@ -1,11 +1,13 @@
 import re
-import subprocess
+from functools import partial
 from pathlib import Path
-from typing import Any, Optional, TextIO, cast
+from typing import Any, Optional
 
-from rich.progress import Progress
+from rich.progress import Progress, TaskID
 
 from eat.encoders._base import BaseEncoder
+from eat.encoders.rf64 import Encoder as RF64Encoder
+from eat.utils.progress import shared_progress
 
 
 class Encoder(BaseEncoder):
@@ -13,6 +15,8 @@ class Encoder(BaseEncoder):
     extension = '.m4a'
     binary_name: str = 'qaac'
     supported_inputs: list = ['pcm', 'rf64', 'alac', 'mp3', 'aac']
+    supports_stdin = True
+    copy_from = {'aac': 'ipod'}
 
     def __init__(self, path: Path) -> None:
         super().__init__(path)
@@ -23,25 +27,53 @@ class Encoder(BaseEncoder):
         input_path: Path,
         output_path: Path,
         bitrate: Optional[int] = None,
+        source: Optional[RF64Encoder] = None,
         **_: Any
     ) -> None:
         self._input_file = input_path
+        self._source = source
         self._output_file = output_path
         self._filename = output_path.name
         self._quality = self._clamp_quality_level(bitrate or 127)
 
     def _encode(self) -> None:
-        self._processor.call_process_output(
-            params=[
-                self._path,
-                '-V', self._quality,
-                '--no-delay',
-                self._input_file,
-                '-o',
-                self._output_file
-            ],
-            output_handler=self._rich_handler
-        )
+        if self._source:
+            return self._encode_pipe(self._source)
+
+        with shared_progress() as pb:
+            task = pb.add_task(f'Encoding "{self._filename}" with qaac', total=100)
+            self._processor.call_process_output(
+                params=[
+                    self._path,
+                    '-V', self._quality,
+                    '--no-delay',
+                    self._input_file,
+                    '-o',
+                    self._output_file
+                ],
+                stderr_handler=partial(self._rich_handler, pb, task)
+            )
+
+            # Manually update to 100% in case last progress update was outdated
+            pb.update(task_id=task, completed=100)
+
+    def _encode_pipe(self, source: RF64Encoder) -> None:
+        """Encodes WAV stream decoded by source encoder"""
+        with source.pipe_progress(f'Encoding "{self._filename}" with qaac') as source_handler:
+            self._processor.call_pipeline(
+                source_params=source.pipe_params(),
+                source_name=source.binary_name,
+                params=[
+                    self._path,
+                    '-V', self._quality,
+                    '--no-delay',
+                    '--ignorelength',  # streamed WAV has no valid length
+                    '-',
+                    '-o',
+                    self._output_file
+                ],
+                source_handler=source_handler
+            )
 
     def _clamp_quality_level(self, user_level: int) -> str:
         """Clamps quality level to usable values"""
@@ -56,24 +88,12 @@ class Encoder(BaseEncoder):
 
         return str(quality_level)
 
-    def _rich_handler(self, process: subprocess.Popen) -> None:
+    def _rich_handler(self, pb: Progress, task: TaskID, line: str) -> None:
         """Handles Rich progress bar"""
-        with Progress() as pb:
-            task = pb.add_task(f'Encoding "{self._filename}" with qaac', total=100)
-
-            with cast(TextIO, process.stderr) as stderr:
-                for line in iter(stderr.readline, ''):
-                    self.logger.debug(line.strip())
-                    if 'Overall bitrate' in line:
-                        pb.update(task_id=task, completed=100)
-                        break
-
-                    if 'error' in line.lower():
-                        self.logger.error(line.rstrip().split(': ', 1)[1])
+        self.logger.debug(line.strip())
+        if 'error' in line.lower():
+            self.logger.error(line.rstrip().split(': ', 1)[-1])
 
-                    progress = re.search(r'\[([0-9]+\.[0-9]+)%\]', line)
-                    if progress:
-                        pb.update(task_id=task, completed=float(progress[1]))
-
-            # Manually update to 100% in case last progress update was outdated
-            pb.update(task_id=task, completed=100)
+        progress = re.search(r'\[([0-9]+\.[0-9]+)%\]', line)
+        if progress:
+            pb.update(task_id=task, completed=float(progress[1]))
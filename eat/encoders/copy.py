@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+from eat.encoders._base import OutputSettings
+from eat.encoders._ffmpeg import FFmpegEncoder
+
+
+class Encoder(FFmpegEncoder):
+    """Copies input stream as it is into the output of the requested format"""
+    extension = ''  # that of the requested format
+    _codec = 'copy'
+    _muxer: str
+
+    def _configure(
+        self,
+        *,
+        input_path: Path,
+        output_path: Path,
+        duration: Optional[int],
+        muxer: str,
+        channels: int,
+        bitdepth: Optional[int],
+        track: Optional[int] = None,
+        **_: Any
+    ) -> None:
+        """Configures encoding params"""
+        self._input_file = input_path
+        self._output_file = output_path
+        self._duration = duration
+        self._muxer = muxer
+        self._codec_name = f'{output_path.suffix[1:].upper()} (stream copy)'
+        self._track = track or 0  # the one that was probed, rather than ffmpeg's choice
+        # Streams are copied only if no setting would change them
+        self.output_settings = OutputSettings(channels=channels, bit_depth=bitdepth)
+
+    def _output_params(self) -> List[Union[str, Path]]:
+        return [
+            *self._map_params(),
+            '-c:a', self._codec,
+            '-f', self._muxer,  # older ffmpeg doesn't guess all of them (e.g. eac3) by extension
+            self._output_file
+        ]
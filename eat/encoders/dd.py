@@ -12,20 +12,18 @@ class Encoder(DDPEncoder):
     """Dolby Digital (AC-3) encoder class"""
     extension: str = '.ac3'
     supported_sample_rates = [48000]
+    copy_from = {'ac3': 'ac3'}
     _allowed_bitrates = ALLOWED_BITRATES
     _minimal_bitrates = {6: 224}
+    _renames = (('output/ec3', 'ac3'),)
 
     def _configure(self, *args, **kwargs) -> None:  # type: ignore[no-untyped-def]
         super()._configure(*args, **kwargs)
-        config = self._config['job_config']
-        config['filter']['audio']['pcm_to_ddp']['encoder_mode'] = 'dd'
+        self._config['filter/audio/pcm_to_ddp/encoder_mode'] = 'dd'
 
         if kwargs['channels'] > 6:
-            config['filter']['audio']['pcm_to_ddp']['downmix_config'] = '5.1'
-
-        config['output']['ac3'] = config['output']['ec3']
-        del config['output']['ec3']
-        self._config['job_config'] = config
+            self._config['filter/audio/pcm_to_ddp/downmix_config'] = '5.1'
+            self.output_settings = self.output_settings._replace(channels=6)
 
     @staticmethod
     def _get_default_bitrate(channels: int) -> int:
@@ -1,7 +1,9 @@
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Optional, cast
 
+from eat.encoders._base import OutputSettings
 from eat.encoders._dee import DeeEncoder
+from eat.utils.analysis import PcmAnalysis
 
 ALLOWED_BITRATES = [
     # Standard profile
@@ -17,6 +19,7 @@ class Encoder(DeeEncoder):
     extension: str = '.ec3'
     extension_bd: str = '.eb3'
     supported_sample_rates = [48000]
+    copy_from = {'eac3': 'eac3'}
     _allowed_bitrates = ALLOWED_BITRATES
     _minimal_bitrates = {6: 192, 8: 384}
 
@@ -29,50 +32,59 @@ class Encoder(DeeEncoder):
         channels: int,
         temp_dir: Path,
         remix: bool = False,
+        analysis: Optional[PcmAnalysis] = None,
         **_: Any
     ) -> None:
         self._load_xml(self._config_dir / 'ddp.xml')
 
-        config = self._config['job_config']
+        config = self._config
         self._temp_dir = temp_dir
 
+        # Silent back surrounds (Lrs/Rrs, last in DEE order) only waste bitrate
+        silent_backs = bool(analysis) and channels == 8 and not remix \
+            and {6, 7} <= set(cast(PcmAnalysis, analysis).silent_channels)
+        if silent_backs:
+            self.logger.warning('Back surround channels are silent, encoding as 5.1')
+            channels = 6
+
         # Configure encoder
         bitrate = self._clamp_bitrate(
             bitrate=bitrate or self._get_default_bitrate(channels),
             channels=channels
         )
 
-        mix = self._get_mix(channels)
+        mix = '5.1' if silent_backs else self._get_mix(channels)
         if remix:
             self.logger.warning('Remixing audio to %s', mix)
 
         # Upmix to 7.1 requires different encoder mode and extension
         if mix == '7.1':
-            config['filter']['audio']['pcm_to_ddp']['encoder_mode'] = 'ddp71'
+            config['filter/audio/pcm_to_ddp/encoder_mode'] = 'ddp71'
             mix = 'off'
         else:
-            config['filter']['audio']['pcm_to_ddp']['encoder_mode'] = 'ddp'
+            config['filter/audio/pcm_to_ddp/encoder_mode'] = 'ddp'
 
         # Bitrates above 1024k are only supported with Blu-ray profile
         if bitrate > 1024:
-            config['filter']['audio']['pcm_to_ddp']['encoder_mode'] = 'bluray'
+            config['filter/audio/pcm_to_ddp/encoder_mode'] = 'bluray'
             output_path = output_path.with_suffix(self.extension_bd)
 
         # Set bitrate/channel configuration
-        config['filter']['audio']['pcm_to_ddp']['data_rate'] = bitrate
-        config['filter']['audio']['pcm_to_ddp']['downmix_config'] = mix
+        config['filter/audio/pcm_to_ddp/data_rate'] = bitrate
+        config['filter/audio/pcm_to_ddp/downmix_config'] = mix
 
         # Configure input paths
-        config['input']['audio']['wav']['file_name'] = '"%s"' % input_path.name
-        config['input']['audio']['wav']['storage']['local']['path'] = '"%s"' % input_path.resolve().parent
+        config['input/audio/wav/file_name'] = '"%s"' % input_path.name
+        config['input/audio/wav/storage/local/path'] = '"%s"' % input_path.resolve().parent
         # Configure output paths
-        config['output']['ec3']['file_name'] = '"%s"' % output_path.name
-        config['output']['ec3']['storage']['local']['path'] = '"%s"' % output_path.resolve().parent
+        config['output/ec3/file_name'] = '"%s"' % output_path.name
+        config['output/ec3/storage/local/path'] = '"%s"' % output_path.resolve().parent
         # Configure temp file location
-        config['misc']['temp_dir']['path'] = '"%s"' % temp_dir
+        config['misc/temp_dir/path'] = '"%s"' % temp_dir
 
-        self._config['job_config'] = config
         self._filename = output_path.name
+        self._output_file = output_path
+        self.output_settings = OutputSettings(bitrate=bitrate, channels=channels)
 
     def _clamp_bitrate(self, bitrate: int, channels: int = 0) -> int:
         """Clamps bitrate to the nearest allowed value"""
@@ -1,15 +1,30 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, List, Optional, Union
 
-from eat.encoders._ffmpeg import FFmpegEncoder
+from eat.encoders._base import OutputSettings
+from eat.encoders._ffmpeg import FFmpegEncoder, ffmpeg_version
+from eat.utils.analysis import PcmAnalysis
+from eat.utils.flac import BLOCK_LCM, join_segments, pcm_md5
+from eat.utils.header import PcmData, read_pcm_data
+from eat.utils.processor import LineHandler
+from eat.utils.progress import shared_progress
+
+MIN_SEGMENT = 60  # seconds, shorter inputs aren't worth splitting
+MIN_FFMPEG = (5, 1)  # segments are read with -ch_layout
 
 
 class Encoder(FFmpegEncoder):
     extension = '.flac'
+    copy_from = {'flac': 'flac'}
+    lossless = True
     _codec_name = 'FLAC'
     _codec = 'flac'
     _extra_params = ['-fflags', '+bitexact']
     _bitrate = '0'  # bitrate irrelevant for a lossless codec
+    _segments = 1
 
     def _configure(
         self,
@@ -20,13 +35,29 @@ class Encoder(FFmpegEncoder):
         bitdepth: Optional[int],
         sample_rate: Optional[int],
         resample_fmt: Optional[int],
+        temp_dir: Path,
         filter_complex: Optional[str] = None,
+        analysis: Optional[PcmAnalysis] = None,
+        segments: int = 1,
+        track: Optional[int] = None,
         **_: Any
     ) -> None:
         """Configures encoding params"""
         self._input_file = input_path
         self._output_file = output_path
+        self._track = track
         self._duration = duration
+        self._temp_dir = temp_dir
+        self._segments = segments
+
+        # Drop padding bits, this is lossless as long as they're all zero
+        if analysis and analysis.is_padded() and not resample_fmt:
+            target = 16 if analysis.effective_bitdepth <= 16 else 24
+            if target < analysis.bitdepth:
+                self.logger.info('Only %s of %s bits used, encoding as %s bit',
+                                 analysis.effective_bitdepth, analysis.bitdepth, target)
+                resample_fmt = target
+        self.output_settings = OutputSettings(bit_depth=resample_fmt or bitdepth)
         if filter_complex:
             self.logger.debug('Running filter_complex: "%s"', filter_complex)
             self._filter_complex.append(filter_complex)
@@ -37,3 +68,114 @@ class Encoder(FFmpegEncoder):
                 sample_rate=sample_rate,
                 sample_format=32 if resample_fmt == 24 else resample_fmt
             ))
+
+    def encode_with(self, others: List[FFmpegEncoder]) -> None:
+        data = self._segment_source() if self._segments > 1 and not others else None
+        if not data:
+            super().encode_with(others)
+            return
+
+        frames = data.size // data.block_align
+        count = min(self._segments, frames // (MIN_SEGMENT * data.sample_rate))
+        if count < 2:
+            super().encode_with(others)
+            return
+
+        version = ffmpeg_version(self._path)
+        if version and version < MIN_FFMPEG:
+            self.logger.warning(
+                'Segmented FLAC needs ffmpeg %d.%d or newer, encoding in a single process', *MIN_FFMPEG
+            )
+            super().encode_with(others)
+            return
+
+        self._encode_segments(data, count)
+
+    def _segment_source(self) -> Optional[PcmData]:
+        """Returns input samples, if they can be split without decoding (16/24 bit PCM, no filters)"""
+        if self._filter_complex:
+            return None
+
+        data = read_pcm_data(self._input_file)
+        if not data or data.codec not in ('pcm_s16le', 'pcm_s24le'):
+            return None
+
+        size = min(data.size, self._input_file.stat().st_size - data.offset)
+        data.size = size - size % data.block_align
+        return data
+
+    def _encode_segments(self, data: PcmData, count: int) -> None:
+        """
+        Encodes consecutive parts of the input in parallel and joins them into a single stream,
+        decoding to the same samples as a single encode. Segments are a multiple
+        of every standard block size long, so only the last frame of the stream is shorter
+        """
+        frames = data.size // data.block_align
+        length = math.ceil(frames / count / BLOCK_LCM) * BLOCK_LCM
+        starts = range(0, frames, length)
+        segments = [self._temp_dir / f'segment_{index}.flac' for index in range(len(starts))]
+        self._to_remove.extend(segments)
+
+        duration = frames * 1000000 // data.sample_rate
+        # MD5 of the whole input is computed while segments encode. The hasher isn't waited for
+        # on failure, hashing a large input would hold up cancelling by minutes
+        hasher = ThreadPoolExecutor(max_workers=1)
+        cancelled = threading.Event()
+        try:
+            with shared_progress() as pb:
+                task = pb.add_task(
+                    f'Converting "{self._input_file.name}" to {self._codec_name} '
+                    f'({len(segments)} segments)',
+                    total=duration
+                )
+                progress = [0] * len(segments)
+
+                def handler(index: int) -> LineHandler:
+                    def update(line: str) -> None:
+                        key, _, val = line.rstrip().partition('=')
+                        if key == 'out_time_us' and val.isdigit():
+                            progress[index] = int(val)
+                            pb.update(task_id=task, completed=sum(progress))
+
+                    return update
+
+                md5 = hasher.submit(pcm_md5, self._input_file, data, cancelled)
+                self._processor.call_processes(
+                    params=[
+                        self._segment_params(data, start, min(length, frames - start), segment)
+                        for start, segment in zip(starts, segments)
+                    ],
+                    stdout_handlers=[handler(index) for index in range(len(segments))]
+                )
+                join_segments(segments, self._output_file, md5.result())
+                pb.update(task_id=task, completed=duration)
+        except BaseException:
+            cancelled.set()
+            raise
+        finally:
+            hasher.shutdown(wait=False)
+
+    def _segment_params(
+        self,
+        data: PcmData,
+        start: int,
+        frames: int,
+        output_path: Path
+    ) -> List[Union[str, Path]]:
+        """Returns params encoding `frames` samples from `start` of raw input data"""
+        layout = f'0x{data.channel_mask:x}' if data.channel_mask else f'{data.channels}c'
+        return [
+            self._path,
+            '-loglevel', 'panic',
+            '-y',
+            '-progress', 'pipe:1',
+            '-f', f's{data.bits}le',
+            '-ar', str(data.sample_rate),
+            '-ch_layout', layout,
+            '-skip_initial_bytes', str(data.offset + start * data.block_align),
+            '-i', self._input_file,
+            '-filter:a', f'atrim=end_sample={frames}',
+            '-c:a', self._codec,
+            *self._extra_params,
+            output_path
+        ]
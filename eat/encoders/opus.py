@@ -1,11 +1,13 @@
 from pathlib import Path
 from typing import Any, Optional
 
+from eat.encoders._base import OutputSettings
 from eat.encoders._ffmpeg import FFmpegEncoder
 
 
 class Encoder(FFmpegEncoder):
     extension = '.opus'
+    copy_from = {'opus': 'opus'}
     _codec = 'libopus'
     _codec_name = 'Opus'
 
@@ -18,11 +20,14 @@ class Encoder(FFmpegEncoder):
         bitrate: int,
         duration: Optional[int],
         filter_complex: Optional[str] = None,
+        track: Optional[int] = None,
         **_: Any
     ) -> None:
         self._input_file = input_path
         self._output_file = output_path
+        self._track = track
         self._bitrate = str(bitrate or self._get_default_bitrate(channels))
+        self.output_settings = OutputSettings(bitrate=int(self._bitrate))
         self._duration = duration
 
         if filter_complex:
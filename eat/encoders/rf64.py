@@ -1,6 +1,7 @@
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, List, Optional, Union
 
+from eat.encoders._base import OutputSettings
 from eat.encoders._ffmpeg import FFmpegEncoder
 
 
@@ -19,14 +20,16 @@ class Encoder(FFmpegEncoder):
         bitdepth: Optional[int],
         sample_rate: Optional[int],
         filter_complex: Optional[str] = None,
+        track: Optional[int] = None,
         **_: Any
     ) -> None:
         """Configures encoding params"""
         self._input_file = input_path
         self._output_file = output_path
+        self._track = track
         self._codec = 'pcm_s%sle' % bitdepth or '16'
+        self.output_settings = OutputSettings(bit_depth=bitdepth)
         self._duration = duration
-        sample_rate = 48000
         if filter_complex:
             self.logger.debug('Running filter_complex: "%s"', filter_complex)
             self._filter_complex.append(filter_complex)
@@ -34,3 +37,19 @@ class Encoder(FFmpegEncoder):
         if sample_rate:
             self.logger.info('Resampling to %s Hz', sample_rate)
             self._filter_complex.append(self._resample_params(sample_rate))
+
+    def pipe_params(self) -> List[Union[str, Path]]:
+        """Returns params decoding configured input to a WAV stream on stdout"""
+        return [
+            self._path,
+            '-loglevel', 'error',
+            '-nostats',
+            '-progress', 'pipe:2',
+            '-drc_scale', '0',
+            '-i', self._input_file,
+            *self._map_params(),
+            '-c:a', self._codec,
+            *self._filter_params(),
+            '-f', 'wav',
+            'pipe:1'
+        ]
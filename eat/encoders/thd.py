@@ -1,6 +1,7 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
+from eat.encoders._base import OutputSettings
 from eat.encoders._dee import DeeEncoder
 
 
@@ -8,6 +9,8 @@ class Encoder(DeeEncoder):
     """Dolby TrueHD encoder class"""
     extension: str = '.thd'
     supported_sample_rates = [48000, 96000]
+    copy_from = {'truehd': 'truehd'}
+    lossless = True
 
     def _configure(
         self,
@@ -15,25 +18,27 @@ class Encoder(DeeEncoder):
         input_path: Path,
         output_path: Path,
         temp_dir: Path,
+        bitdepth: Optional[int] = None,
         **_: Any
     ) -> None:
         self._load_xml(self._config_dir / 'thd.xml')
 
-        config = self._config['job_config']
+        config = self._config
         self._temp_dir = temp_dir
 
         # Configure input paths
-        config['input']['audio']['wav']['storage']['local']['path'] = '"%s"' % input_path.resolve().parent
-        config['input']['audio']['wav']['file_name'] = '"%s"' % input_path.name
+        config['input/audio/wav/storage/local/path'] = '"%s"' % input_path.resolve().parent
+        config['input/audio/wav/file_name'] = '"%s"' % input_path.name
         # Configure output paths
-        config['output']['mlp']['file_name'] = '"%s"' % output_path.name
-        config['output']['mlp']['storage']['local']['path'] = '"%s"' % output_path.resolve().parent
+        config['output/mlp/file_name'] = '"%s"' % output_path.name
+        config['output/mlp/storage/local/path'] = '"%s"' % output_path.resolve().parent
 
         # Configure temp file location
-        config['misc']['temp_dir']['path'] = '"%s"' % temp_dir
+        config['misc/temp_dir/path'] = '"%s"' % temp_dir
 
-        self._config['job_config'] = config
         self._filename = output_path.name
+        self._output_file = output_path
+        self.output_settings = OutputSettings(bit_depth=bitdepth)
 
         # Remove log and config files
         self._to_remove.extend((
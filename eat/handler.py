@@ -1,106 +1,534 @@
 import argparse
-import importlib
+import copy
+import glob
+import json
 import logging
+import os
 import platform
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from functools import partial
 from pathlib import Path
 from shutil import which
-from typing import List, Optional
+from typing import (
+    Any, Callable, ContextManager, Dict, List, Optional, Set, Tuple, Type, TypeVar, cast
+)
 
-from rich.logging import RichHandler
 from rich.prompt import Confirm
 
+from eat import __version__
 from eat.config import Config
+from eat.encoders import COPY, get_encoder_class
 from eat.encoders._base import BaseEncoder
 from eat.encoders._dee import DeeEncoder
 from eat.encoders._ffmpeg import FFmpegEncoder
-from eat.utils.ffprobe import FFprobe
-from eat.utils.processor import ProcessingError
-from eat.utils.tempfile import get_temp_file
+from eat.job import Job
+from eat.utils import analysis
+from eat.utils.cache import ProbeCache
+from eat.utils.events import EventStream, JobEvents
+from eat.utils.ffprobe import AudioInfo, FFprobe
+from eat.utils.intermediate import Demux, Intermediate
+from eat.utils.jobqueue import JobQueue, remove
+from eat.utils.manifest import Manifest
+from eat.utils.pcm import reorder_pcm, rewrap_pcm
+from eat.utils.pipeline import Lookahead, Pipeline
+from eat.utils.processor import CancelScope, ProcessingError, cancel_scope, set_process_limit
+from eat.utils.progress import (
+    Batch, ProgressCallback, batch_progress, forward_progress, report_progress, shared_progress
+)
+from eat.utils.scheduler import AUTO, ConcurrencyTuner, max_jobs
+from eat.utils.scratch import Scratch, estimate_pcm_size
+
+# DEE swaps those channels, so to insure correct output we swap them beforehand
+DEE_71_FILTER = 'pan=7.1|c0=c0|c1=c1|c2=c2|c3=c3|c4=c6|c5=c7|c6=c4|c7=c5'
+DEE_71_ORDER = (0, 1, 2, 3, 6, 7, 4, 5)
+
+T = TypeVar('T')
+QueueKey = Tuple[Path, str, Optional[int]]
+Output = Tuple[str, Path, Optional[AudioInfo]]  # format, output path, selected track
 
 
 class Handler:
-    def __init__(self, args: argparse.Namespace) -> None:
+    def __init__(self, args: argparse.Namespace, interactive: bool = True) -> None:
         self.args = args
-        logging.basicConfig(
-            format='%(message)s',
-            datefmt='',
-            level=logging.DEBUG if args.debug else logging.INFO,
-            handlers=[RichHandler()]
-        )
+        self.interactive = interactive  # existing outputs are skipped instead of asking
+        self.atomic_outputs = False  # outputs are written under a temp name, renamed once complete
         self.logger = logging.getLogger(__name__)
-        self.config = Config().load()
-        self.probe = FFprobe(self.config['binaries']['ffprobe'])
-        self._to_remove: List[Path] = []
+        config = Config()
+        self.config = config.load()
+        self.probe = FFprobe(
+            self.config['binaries']['ffprobe'],
+            cache=ProbeCache(
+                config.config_dir / 'probe_cache.sqlite',
+                max_entries=self.config.get('cache', {}).get('probe_entries', 10000)
+            )
+        )
+        self.scratch = Scratch(
+            disk_path=self.config['temp_path'],
+            ram_path=self.config.get('scratch', {}).get('ram_path'),
+            ram_usage=self.config.get('scratch', {}).get('ram_usage', 0.5)
+        )
+        self._encoders: Dict[str, Tuple[Type[BaseEncoder], Path]] = {}
+        # With `-j auto`, job threads of all runs share a tuned limit of simultaneous encodes
+        self.tuner = ConcurrencyTuner() if args.jobs == AUTO else None
+        self._reserved_outputs: Set[Path] = set()
+        self._outputs_lock = threading.RLock()
+
+        self._config_dir = config.config_dir
+        self.events: Optional[EventStream] = None  # job events for other programs (--progress jsonl)
+
+        # Incremental mode, outputs are recorded with (input, content fingerprint, settings)
+        self.manifest: Optional[Manifest] = None
+        self._fingerprints: Dict[Path, Tuple[Path, str, str]] = {}
+        self._duplicates: Dict[Tuple[str, str], List[Tuple[Path, Path]]] = {}
+
+        # Batch jobs are recorded, so that an interrupted batch can be resumed
+        self.queue = JobQueue(config.config_dir / 'jobs.sqlite')
+        self.queue.recover()
+        self._batch_id: Optional[int] = None
+        self._queued: Dict[QueueKey, int] = {}  # (resolved input, format, track): job id
+
+        self._apply_args()
+
+        for binary_name, limit in self.config.get('concurrency', {}).items():
+            set_process_limit(binary_name, limit)
 
     def main(self) -> None:
-        """Processes given input files"""
-        if not self.args.input:
+        """Processes given input files, or what's left of an interrupted batch"""
+        if self.args.cluster_dir:
+            from eat.cluster import Cluster
+
+            Cluster(self, self.args.cluster_dir).run(self.args.input)
+            return
+
+        formats: Dict[Path, List[str]] = {}
+        if self.args.resume:
+            formats = self._resume()
+            if not formats:
+                return
+        elif not self.args.input:
             self.logger.error('No files provided to process')
             return
+        else:
+            self._batch_id = self.queue.create_batch(self._batch_args())
 
-        self.args.output_dir.mkdir(exist_ok=True)
+        # Processes run on a shared event loop, job threads only wait on them
+        with batch_progress() as batch, \
+                ThreadPoolExecutor(max_workers=max_jobs(self.args.jobs)) as executor:
+            self.run([*formats] or self.args.input, executor, batch, formats)
 
-        for input_path in self.args.input:
-            if not input_path.exists():
-                self.logger.error('"%s" doesn\'t exist!', input_path)
-                continue
+    def run(
+        self,
+        inputs: List[Path],
+        executor: ThreadPoolExecutor,
+        batch: Batch,
+        formats: Optional[Dict[Path, List[str]]] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        scope: Optional[CancelScope] = None
+    ) -> Tuple[List[Job], List[Path]]:
+        """
+        Encodes inputs to all formats (or given ones per input) on a given executor,
+        once all of their jobs are done returns them along with inputs that couldn't be processed
+        (missing, unrecognized, unsupported). Progress of the jobs can be forwarded to a callback,
+        cancelling the scope kills their processes
+        """
+        self.args.output_dir.mkdir(parents=True, exist_ok=True)
 
-            self.logger.info('Processing "%s"...', input_path)
-            for encoder in self.args.encoder:
-                if len(self.args.encoder) > 1:
-                    self.logger.info('Encoding "%s" to %s...', input_path.name, encoder)
-                self._encode_format(input_path, encoder)
-                self._clean_temp_files()
+        # Output checks may prompt the user, so they're done before any job starts
+        outputs: Dict[Path, List[Output]] = {}
+        failed: List[Path] = []
+        with self._outputs_lock:
+            reserved = set(self._reserved_outputs)
+            for input_path in inputs:
+                if not input_path.exists():
+                    self.logger.error('"%s" doesn\'t exist!', input_path)
+                    failed.append(input_path)
+                    continue
 
-    def _encode_format(self, input_path: Path, encoder_name: str) -> None:
-        rf64e = self._get_encoder('rf64')
-        encoder = self._get_encoder(encoder_name)
-        output_path = self.args.output_dir / input_path.with_suffix(encoder.extension).name
+                # Selected tracks are probed right away, outputs are named after them
+                tracks = [None] if self.args.tracks is None else self._select_tracks(input_path)
+                if not tracks:
+                    failed.append(input_path)
+                    continue
 
-        # Check if output path exists
-        if output_path.exists() \
-                and not self.args.allow_overwrite \
-                and not Confirm.ask(prompt=f'{output_path} exists. Overwrite?'):
-            self.logger.error('"%s" exists, skipping', output_path)
-            return
+                for track in tracks:
+                    for encoder_name in (formats or {}).get(input_path, self.args.encoder):
+                        key = self._queue_key(input_path, encoder_name, track)
+                        if self.args.resume and key not in self._queued:
+                            continue  # done before the batch was interrupted
+                        output_path = self._get_output_path(input_path, encoder_name, track)
+                        self._queue_job(key, output_path)
+                        if output_path:
+                            outputs.setdefault(input_path, []).append((encoder_name, output_path, track))
+            reserved = self._reserved_outputs - reserved
 
-        if input_path == output_path:
-            self.logger.error('Cannot convert "%s" to "%s"', input_path, output_path)
+        # Jobs go through stages on their own threads: probe, intermediate (prepared ahead of encodes,
+        # as far as lookahead and free scratch space allow), encode (on the given executor), clean up
+        config = self.config.get('pipeline', {})
+        pipeline = Pipeline(
+            probe_jobs=max_jobs(self.args.jobs),
+            prepare_jobs=int(config.get('prepare_jobs', 1)),
+            lookahead=int(config.get('lookahead', 2))
+        )
+        plans: Dict[Future, Path] = {
+            pipeline.probe.submit(
+                self._call, on_progress, scope, self._plan_input, input_path, formats
+            ): input_path
+            for input_path, formats in outputs.items()
+        }
+        futures: List[Future] = [*plans]
+        jobs_done: List[Future] = []
+        try:
+            # The whole batch is planned first, so that jobs can be ordered by their length
+            planned: List[Job] = []
+            for plan, input_path in plans.items():
+                jobs = plan.result()
+                if not jobs:
+                    failed.append(input_path)
+                    keys = [self._queue_key(input_path, name, track) for name, _, track in outputs[input_path]]
+                    self.queue.finish(
+                        [self._queued[key] for key in keys if key in self._queued],
+                        error='not processed'
+                    )
+                planned.extend(jobs)
+
+            batch.add(len(planned))
+            if self.events:
+                self.events.emit('planned', jobs=len(planned), failed=[str(path) for path in failed])
+            for job in self._schedule(planned):
+                job.events = self._job_events(job)
+                if job.intermediate and pipeline.lookahead:
+                    job.prepared = pipeline.prepare.submit(
+                        self._call, on_progress, scope, self._prepare, job, pipeline.lookahead
+                    )
+                    futures.append(job.prepared)
+                future = executor.submit(self._call, on_progress, scope, self._run_job, job, pipeline)
+                future.add_done_callback(lambda _: batch.done())
+                future.add_done_callback(partial(self._discard, job))
+                futures.append(future)
+                jobs_done.append(future)
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            pipeline.abort()
+            raise
+        finally:
+            pipeline.shutdown()
+            self._release_outputs(reserved)
+
+        return [future.result() for future in jobs_done], failed
+
+    def _schedule(self, jobs: List[Job]) -> List[Job]:
+        """
+        Returns jobs in the order they should run: longest first, so that the batch doesn't end
+        with one long encode while other slots are idle (ties, and jobs of unknown length, keep their order)
+        """
+        if self.config.get('scheduling', {}).get('order', 'longest') != 'longest':
+            return jobs
+
+        return sorted(jobs, key=lambda job: -job.file_info.duration)
+
+    @staticmethod
+    def _call(
+        on_progress: Optional[ProgressCallback],
+        scope: Optional[CancelScope],
+        fn: Callable[..., T],
+        *args: Any
+    ) -> T:
+        """Calls a function on an executor thread, with progress and processes of the run"""
+        with report_progress(on_progress), cancel_scope(scope):
+            return fn(*args)
+
+    def with_args(self, args: argparse.Namespace) -> 'Handler':
+        """Returns a handler with different args, sharing config, caches and scratch space with this one"""
+        handler = copy.copy(self)
+        handler.args = args
+        handler._apply_args()
+        return handler
+
+    def _apply_args(self) -> None:
+        if self.args.analyze and not analysis.is_available():
+            self.logger.warning('numpy is not installed, PCM analysis disabled')
+            self.args.analyze = False
+
+        if not self.args.incremental:
+            self.manifest = None
+        elif not self.manifest:
+            self.manifest = Manifest(self._config_dir / 'manifest.sqlite')
+
+    def _batch_args(self) -> Dict[str, Any]:
+        """Returns args needed to resume a batch"""
+        return dict(
+            encoder=self.args.encoder,
+            output_dir=str(self.args.output_dir.resolve()),
+            bitrate=self.args.bitrate,
+            channels=self.args.channels,
+            sample_rate=self.args.sample_rate,
+            bit_depth=self.args.bit_depth,
+            analyze=self.args.analyze,
+            incremental=self.args.incremental,
+            segments=self.args.segments,
+            tracks=self.args.tracks,
+            reencode=self.args.reencode
+        )
+
+    def _resume(self) -> Dict[Path, List[str]]:
+        """Restores the latest interrupted batch, returns formats left per input"""
+        queued = self.queue.resumable()
+        if not queued:
+            self.logger.error('No interrupted batch to resume')
+            return {}
+
+        for name, value in queued.args.items():
+            setattr(self.args, name, Path(value) if name == 'output_dir' else value)
+        self.args.allow_overwrite = True  # outputs were confirmed when the batch was started
+        self._apply_args()
+
+        self.queue.take_over(queued.id)
+        self._batch_id = queued.id
+        formats: Dict[Path, List[str]] = {}
+        for job in queued.jobs:
+            self._queued[job.input_path, job.encoder_name, job.track] = job.id
+            names = formats.setdefault(job.input_path, [])
+            if job.encoder_name not in names:  # queued once per track
+                names.append(job.encoder_name)
+
+        self.logger.info(
+            'Resuming batch started %s, %d of its jobs left',
+            time.strftime('%Y-%m-%d %H:%M', time.localtime(queued.created)),
+            len(queued.jobs)
+        )
+        return formats
+
+    @staticmethod
+    def _queue_key(input_path: Path, encoder_name: str, track: Optional[AudioInfo]) -> QueueKey:
+        return input_path.resolve(), encoder_name, track.track if track else None
+
+    def _queue_job(self, key: QueueKey, output_path: Optional[Path]) -> None:
+        """Records a batch job, resumed ones that turned out to be up to date are finished"""
+        if self._batch_id is None:
             return
 
-        # Run ffprobe for file info
+        if output_path is None:
+            if key in self._queued:
+                self.queue.finish([self._queued.pop(key)])
+        elif key not in self._queued:
+            input_path, encoder_name, track = key
+            self._queued[key] = self.queue.add(self._batch_id, input_path, encoder_name, output_path, track)
+
+    def _select_tracks(self, input_path: Path) -> List[AudioInfo]:
+        """Probes audio tracks of an input, returns those selected with --tracks"""
         try:
-            file_info = self.probe(input_path)
+            tracks = self.probe.tracks(input_path)
         except ProcessingError:
             self.logger.error('ffprobe failed to recognize "%s", skipping', input_path)
-            return
+            return []
 
+        if not self.args.tracks:  # all of them
+            return tracks
+
+        for missing in sorted(set(self.args.tracks) - {track.track for track in tracks}):
+            self.logger.error('"%s" has no audio track %d (it has %d)', input_path.name, missing, len(tracks))
+        return [track for track in tracks if track.track in self.args.tracks]
+
+    def _release_outputs(self, reserved: Set[Path]) -> None:
+        """Allows outputs reserved by a finished run to be written again (by a later one)"""
+        with self._outputs_lock:
+            self._reserved_outputs.difference_update(reserved)
+            for output_path in [path for path in self._fingerprints if path.resolve() in reserved]:
+                _, content, settings = self._fingerprints.pop(output_path)
+                self._duplicates.pop((content, settings), None)
+
+    def _get_output_path(
+        self,
+        input_path: Path,
+        encoder_name: str,
+        track: Optional[AudioInfo] = None
+    ) -> Optional[Path]:
+        """Returns output path for a given job, or None if it should be skipped"""
+        extension = get_encoder_class(encoder_name).extension
+        output_path: Path = self.args.output_dir / input_path.with_suffix(extension).name
+        if track:  # e.g. "movie.2.eng.ec3"
+            name = '.'.join(filter(None, (input_path.stem, str(track.track), track.language)))
+            output_path = self.args.output_dir / f'{name}{extension}'
+
+        if input_path == output_path:
+            self.logger.error('Cannot convert "%s" to "%s"', input_path, output_path)
+            return None
+
+        # Jobs run concurrently, so two of them can't share an output
+        if output_path.resolve() in self._reserved_outputs:
+            self.logger.error('"%s" would be written by multiple jobs, skipping', output_path)
+            return None
+
+        # Check if output path exists (outputs recorded in incremental mode are ours to replace),
+        # before an identical output could be linked over it
+        if output_path.exists() \
+                and not self.args.allow_overwrite \
+                and not (self.manifest and self.manifest.knows(output_path)) \
+                and not (self.interactive
+                         and Confirm.ask(prompt=f'{output_path} exists. Overwrite?')):
+            self.logger.error('"%s" exists, skipping', output_path)
+            return None
+
+        if self.manifest and self._reuse_output(input_path, encoder_name, output_path, track):
+            self._reserved_outputs.add(output_path.resolve())
+            return None
+
+        self._reserved_outputs.add(output_path.resolve())
+        return output_path
+
+    def _reuse_output(
+        self,
+        input_path: Path,
+        encoder_name: str,
+        output_path: Path,
+        track: Optional[AudioInfo] = None
+    ) -> bool:
+        """
+        Checks whether output can be skipped in incremental mode,
+        either because it's up to date, or an identical input was encoded already (output is linked)
+        """
+        manifest = cast(Manifest, self.manifest)
+        content = manifest.fingerprint(input_path)
+        settings = self._settings(encoder_name, track.track if track else None)
+
+        if manifest.current(output_path, content, settings):
+            self.logger.info('Skipping "%s", up to date', output_path)
+            return True
+
+        existing = manifest.find(content, settings)
+        if existing:
+            written = self._link_output(existing, output_path)
+            manifest.put(output_path, written, input_path, content, settings)
+            return True
+
+        # Identical input already queued in this run, link once it's encoded
+        if (content, settings) in self._duplicates:
+            self._duplicates[content, settings].append((input_path, output_path))
+            return True
+
+        self._duplicates[content, settings] = []
+        self._fingerprints[output_path] = (input_path, content, settings)
+        return False
+
+    def _settings(self, encoder_name: str, track: Optional[int] = None) -> str:
+        """Returns everything affecting an output besides the input itself"""
+        settings = dict(
+            encoder=encoder_name,
+            bitrate=self.args.bitrate,
+            mix=self.args.channels,
+            sample_rate=self.args.sample_rate,
+            bit_depth=self.args.bit_depth,
+            analyze=self.args.analyze,
+            version=__version__
+        )
+        if track is not None:  # outputs of the default track keep their settings from before --tracks
+            settings['track'] = track
+        if self.args.reencode:
+            settings['reencode'] = True
+        return json.dumps(settings, sort_keys=True)
+
+    def _record_outputs(self, job: Job) -> None:
+        """Records outputs of a finished job in the manifest, links outputs of identical inputs"""
+        manifest = cast(Manifest, self.manifest)
+        for finished in (job, *job.combined):
+            written = finished.written or finished.output_path
+            if finished.output_path not in self._fingerprints or not written.exists():
+                continue
+
+            input_path, content, settings = self._fingerprints[finished.output_path]
+            manifest.put(finished.output_path, written, input_path, content, settings)
+            for duplicate_input, duplicate_output in self._duplicates.get((content, settings), []):
+                duplicate_written = self._link_output(written, duplicate_output)
+                manifest.put(duplicate_output, duplicate_written, duplicate_input, content, settings)
+
+    def _link_output(self, source: Path, output_path: Path) -> Path:
+        """Links (or copies, if linking isn't possible) an identical output, returns its path"""
+        target = output_path.with_suffix(source.suffix)
+        if target.resolve() == source.resolve():
+            return target
+        if target.exists():
+            target.unlink()
+
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+        self.logger.info('Linked "%s" to identical output "%s"', target, source)
+        return target
+
+    def _plan_input(self, input_path: Path, formats: List[Output]) -> List[Job]:
+        """
+        Probes an input and plans all of its formats together, so that every distinct intermediate
+        is only created once. Intermediates of selected tracks are all written by one pass over the input
+        """
+        self.logger.info('Processing "%s"...', input_path)
+        tracks: Dict[Optional[AudioInfo], List[Tuple[str, Path]]] = {}
+        for encoder_name, output_path, track in formats:
+            tracks.setdefault(track, []).append((encoder_name, output_path))
+
+        jobs: List[Job] = []
+        ffmpeg_jobs: List[Job] = []
+        intermediates: Dict[Tuple[Optional[int], bool, Optional[int]], Intermediate] = {}
+        demux = Demux() if self.args.tracks is not None else None
+        for track, track_formats in tracks.items():
+            # Run ffprobe for file info, selected tracks were probed already
+            try:
+                file_info = track or self.probe(input_path)
+            except ProcessingError:
+                self.logger.error('ffprobe failed to recognize "%s", skipping', input_path)
+                return []
+
+            if not self._check_input(input_path, file_info):
+                continue
+
+            # PCM inputs can be scanned directly (they have one track), others only once they're decoded
+            input_analysis = analysis.analyze_pcm(input_path) \
+                if self.args.analyze and file_info.track == 0 else None
+
+            for encoder_name, output_path in track_formats:
+                job = self._plan_job(
+                    input_path, encoder_name, output_path, file_info, track, intermediates, demux
+                )
+                if not job:
+                    continue
+
+                job.analysis = input_analysis
+                job.queue_id = self._queued.get(self._queue_key(input_path, encoder_name, track))
+                # Segmented FLAC runs its own processes, so it isn't combined with other outputs
+                if job.copy or (isinstance(self._get_encoder(encoder_name), FFmpegEncoder)
+                                and not (encoder_name == 'flac' and self.args.segments > 1)):
+                    ffmpeg_jobs.append(job)
+                else:
+                    jobs.append(job)
+
+        # ffmpeg-based outputs (of all tracks) are all written by one process reading the input once
+        if ffmpeg_jobs:
+            ffmpeg_jobs[0].combined = ffmpeg_jobs[1:]
+            jobs.insert(0, ffmpeg_jobs[0])
+
+        return jobs
+
+    def _check_input(self, input_path: Path, file_info: AudioInfo) -> bool:
+        """Checks whether an input (track) can be encoded, warns about lossy ones"""
         # Check for broken files
         if file_info.channels == 0:
             self.logger.error('Zero channels detected, file likely broken, skipping')
-            return
+            return False
 
         # Prevent crashing on 2.0 -> 5.1/7.1 downmix
         if self.args.channels \
                 and file_info.channels <= 2 and self.args.channels > 2:
             self.logger.error('Upmixing from mono/stereo not supported')
-            return
-
-        # Prevent crashing with wrong channel layouts for DEE
-        if isinstance(encoder, DeeEncoder) \
-                and file_info.channels not in (1, 2, 6, 8):
-            self.logger.error('Only supported channel configurations '
-                              'for DEE are 1.0, 2.0, 5.1, 7.1')
-            return
-
-        # Warn against mono/stereo DD/P
-        if (file_info.channels <= 2
-                or (self.args.channels and self.args.channels <= 2)) \
-                and self.args.encoder in ('ddp', 'dd'):
-            self.logger.warning(
-                'Using DD/P for mono and stereo is not recommended,\n'
-                'consider using qaac or opus'
-            )
+            return False
 
         # Warn against bad transcodes
         if file_info.codec in ('aac', 'opus', 'ac3', 'eac3') \
@@ -111,6 +539,22 @@ class Handler:
                 input_path.name
             )
 
+        return True
+
+    def _plan_job(
+        self,
+        input_path: Path,
+        encoder_name: str,
+        output_path: Path,
+        file_info: AudioInfo,
+        track: Optional[AudioInfo],
+        intermediates: Dict[Tuple[Optional[int], bool, Optional[int]], Intermediate],
+        demux: Optional[Demux]
+    ) -> Optional[Job]:
+        """Returns job encoding an input (track) to a format, None if the format doesn't support it"""
+        encoder = self._get_encoder(encoder_name)
+        track_index = track.track if track else None
+
         # Set correct sample rate
         resample_rate: Optional[int] = None
         if encoder.supported_sample_rates \
@@ -120,60 +564,463 @@ class Handler:
                 key=lambda val: abs(file_info.sample_rate - val)
             )
 
-        # Convert all formats to rf64 before passing them to encoders
-        if (not file_info.codec.startswith('pcm_')
-                and file_info.codec not in encoder.supported_inputs
-                and not isinstance(encoder, FFmpegEncoder)) \
-                or (file_info.channels == 8 and isinstance(encoder, DeeEncoder)) \
-                or (file_info.codec.startswith('pcm_') and file_info.container != 'wav'):
-            temp_path = get_temp_file(
-                suffix=rf64e.extension,
-                directory=self.config['temp_path']
+        # Streams already in the requested format (with nothing to change) are copied, not re-encoded
+        muxer = self._copy_muxer(file_info, encoder, resample_rate)
+        if muxer:
+            self.logger.info(
+                'Track %d of "%s" is %s already, copying it', file_info.track, input_path.name, file_info.codec
+            )
+            return Job(
+                input_path=input_path,
+                encoder_name=encoder_name,
+                output_path=output_path,
+                file_info=file_info,
+                track=track_index,
+                copy=muxer
             )
-            self._to_remove.append(temp_path)
 
-            # DEE swaps those channels, so to insure correct output we swap them beforehand
-            filter_complex = None
-            if file_info.channels == 8 and isinstance(encoder, DeeEncoder):
-                self.logger.info('Swapping Ls/Rs with Lrs/Rrs for DEE')
-                filter_complex = 'pan=7.1|c0=c0|c1=c1|c2=c2|c3=c3|c4=c6|c5=c7|c6=c4|c7=c5'
+        # Prevent crashing with wrong channel layouts for DEE
+        if isinstance(encoder, DeeEncoder) \
+                and file_info.channels not in (1, 2, 6, 8):
+            self.logger.error('Only supported channel configurations '
+                              'for DEE are 1.0, 2.0, 5.1, 7.1')
+            return None
 
-            rf64e(
-                input_path=input_path,
-                output_path=temp_path,
+        # Warn against mono/stereo DD/P
+        if (file_info.channels <= 2
+                or (self.args.channels and self.args.channels <= 2)) \
+                and encoder_name in ('ddp', 'dd'):
+            self.logger.warning(
+                'Using DD/P for mono and stereo is not recommended,\n'
+                'consider using qaac or opus'
+            )
+
+        # Encoders reading stdin get input decoded on the fly (unless tracks are demuxed in one pass),
+        # others taking the same intermediate share a single file
+        intermediate = None
+        stream = False
+        if self._needs_conversion(file_info, encoder, resample_rate) and encoder.supports_stdin and not demux:
+            stream = True
+        elif self._needs_conversion(file_info, encoder, resample_rate):
+            swap = self._needs_channel_swap(file_info, encoder)
+            key = (track_index, swap, resample_rate)
+            if key not in intermediates:
+                intermediates[key] = Intermediate(
+                    suffix=get_encoder_class('rf64').extension,
+                    scratch=self.scratch,
+                    size=estimate_pcm_size(
+                        duration=file_info.duration,
+                        sample_rate=resample_rate or file_info.sample_rate,
+                        channels=file_info.channels,
+                        bitdepth=file_info.bitdepth
+                    ),
+                    file_info=file_info,
+                    resample_rate=resample_rate,
+                    swap=swap,
+                    track=track_index,
+                    demux=demux
+                )
+            intermediate = intermediates[key]
+            intermediate.add_consumer()
+
+        return Job(
+            input_path=input_path,
+            encoder_name=encoder_name,
+            output_path=output_path,
+            file_info=file_info,
+            resample_rate=resample_rate,
+            intermediate=intermediate,
+            stream=stream,
+            track=track_index
+        )
+
+    def _copy_muxer(
+        self,
+        file_info: AudioInfo,
+        encoder: BaseEncoder,
+        resample_rate: Optional[int]
+    ) -> Optional[str]:
+        """Returns ffmpeg muxer for copying input stream as it is, None if it has to be encoded"""
+        muxer = encoder.copy_from.get(file_info.codec)
+        if not muxer or self.args.reencode or resample_rate:
+            return None
+
+        # Any setting that changes the stream needs an encode
+        if self.args.sample_rate not in (None, file_info.sample_rate) \
+                or self.args.bit_depth not in (None, file_info.bitdepth) \
+                or self.args.channels not in (None, file_info.channels) \
+                or (self.args.bitrate is not None and not encoder.lossless):
+            return None
+
+        return muxer
+
+    @staticmethod
+    def _needs_conversion(
+        file_info: AudioInfo,
+        encoder: BaseEncoder,
+        resample_rate: Optional[int] = None
+    ) -> bool:
+        """Checks whether input has to be decoded to wav before passing it to encoder"""
+        if isinstance(encoder, FFmpegEncoder):  # ffmpeg can read anything directly
+            return False
+
+        return (not file_info.codec.startswith('pcm_')
+                and file_info.codec not in encoder.supported_inputs) \
+            or file_info.track > 0 \
+            or Handler._needs_channel_swap(file_info, encoder) \
+            or (file_info.codec.startswith('pcm_') and file_info.container != 'wav') \
+            or resample_rate is not None
+
+    @staticmethod
+    def _needs_channel_swap(file_info: AudioInfo, encoder: BaseEncoder) -> bool:
+        return file_info.channels == 8 and isinstance(encoder, DeeEncoder)
+
+    def _prepare(self, job: Job, lookahead: Lookahead) -> bool:
+        """
+        Builds intermediate of a job ahead of its encode, returns False if it doesn't fit
+        into scratch space right now. A prepared job holds a lookahead slot until its encode starts
+        """
+        lookahead.acquire()
+        try:
+            with self._reporting(job):
+                self._start(job)
+                self._stage(job, 'intermediate')
+                prepared = cast(Intermediate, job.intermediate).prepare(partial(self._create_intermediates, job))
+        except BaseException:
+            lookahead.release()
+            raise
+
+        if prepared:
+            self._timestamp(job, 'prepared')
+        else:
+            lookahead.release()
+        return prepared
+
+    @staticmethod
+    def _discard(job: Job, future: 'Future[Job]') -> None:
+        """Releases intermediate of a job cancelled before it started, once its preparation is done"""
+        intermediate = job.intermediate
+        if not future.cancelled() or not intermediate:
+            return
+        if job.prepared:
+            job.prepared.add_done_callback(lambda _: intermediate.release())
+        else:
+            intermediate.release()
+
+    def _run_job(self, job: Job, pipeline: Pipeline) -> Job:
+        """Runs a single (input, format) job in its own temp directory, once its intermediate is prepared"""
+        if len(self.args.encoder) > 1:
+            self.logger.info(
+                'Encoding "%s" to %s...',
+                job.input_path.name,
+                ', '.join(dict.fromkeys(j.encoder_name for j in (job, *job.combined)))
+            )
+
+        queue_ids = self._queue_ids(job)
+        temp_dir = self.scratch.job_dir()
+        to_remove: List[Path] = []
+        temp_outputs: List[Tuple[Job, Path]] = []
+        try:
+            if job.prepared and job.prepared.result() and pipeline.lookahead:
+                pipeline.lookahead.release()  # the next job can be prepared
+            with self._reporting(job):
+                self._start(job)
+            self.queue.own(queue_ids, temp_dir)
+            temp_outputs = self._use_temp_outputs(job) if self.atomic_outputs else []
+            with self._reporting(job), self._encode_slot(job):
+                self._encode_format(job, temp_dir, to_remove)
+            self._rename_outputs(temp_outputs)
+            if self.manifest:
+                self._record_outputs(job)
+        except BaseException as e:
+            self.queue.finish(queue_ids, error=str(e) or type(e).__name__)
+            if job.events:
+                job.events.failed(str(e) or type(e).__name__, isinstance(e, (CancelledError, KeyboardInterrupt)))
+            for unfinished, _ in temp_outputs:
+                remove(unfinished.written or unfinished.output_path)
+            if isinstance(e, CancelledError) and 'encode' in job.stages and not self.atomic_outputs:
+                for cancelled in (job, *job.combined):  # partial outputs are of no use
+                    remove(cancelled.written or cancelled.output_path)
+            raise
+        else:
+            self.queue.finish(queue_ids)
+            if job.events:
+                job.events.done(outputs=self._event_outputs(job, sizes=True))
+        finally:
+            self._timestamp(job, 'finished')
+            try:
+                pipeline.clean_up.submit(self._clean_up, job, temp_dir, to_remove)
+            except RuntimeError:  # the run was aborted, its stages are shut down
+                self._clean_up(job, temp_dir, to_remove)
+
+        return job
+
+    def _job_events(self, job: Job) -> Optional[JobEvents]:
+        """Returns events of a job, if they're written (--progress jsonl)"""
+        if not self.events:
+            return None
+
+        return self.events.job(
+            input=str(job.input_path),
+            duration=job.file_info.duration / 1000000 if job.file_info.duration > 0 else None,
+            outputs=self._event_outputs(job)
+        )
+
+    @staticmethod
+    def _event_outputs(job: Job, sizes: bool = False) -> List[Dict[str, Any]]:
+        """Returns outputs of a job (and jobs combined with it) for its events, with their sizes once written"""
+        outputs = []
+        for j in (job, *job.combined):
+            path = j.written or j.output_path
+            output = dict(format=j.encoder_name, track=j.track, copy=bool(j.copy), path=str(path))
+            if sizes:
+                output['size'] = path.stat().st_size if path.exists() else None
+            outputs.append(output)
+
+        return outputs
+
+    @staticmethod
+    def _reporting(job: Job) -> ContextManager[Any]:
+        """Forwards progress of processes started by this thread (and its log records) to the job's events"""
+        if not job.events:
+            return nullcontext()
+
+        stack = ExitStack()
+        stack.enter_context(job.events)
+        stack.enter_context(forward_progress(job.events.progress))
+        return stack
+
+    def _encode_slot(self, job: Job) -> ContextManager[None]:
+        """Waits for the tuner to allow another encode, if concurrency is tuned"""
+        if not self.tuner:
+            return nullcontext()
+
+        formats = ','.join(self._encoder_name(j) for j in (job, *job.combined))
+        return self.tuner.slot(formats, job.file_info.duration / 1000000)
+
+    def _start(self, job: Job) -> None:
+        """Records start of a job, by its first stage"""
+        if 'started' not in job.stages:
+            self.queue.start(self._queue_ids(job))
+            self._timestamp(job, 'started')
+            if job.events:
+                job.events.start()
+
+    def _clean_up(self, job: Job, temp_dir: Path, to_remove: List[Path]) -> None:
+        """Removes temp files of a finished job, its intermediate once no other job needs it"""
+        if job.intermediate:
+            job.intermediate.release()
+        self._clean_temp_files(to_remove)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _use_temp_outputs(job: Job) -> List[Tuple[Job, Path]]:
+        """
+        Points outputs of a job to hidden temp names next to them, returns the jobs with final names.
+        Leftovers of earlier attempts (by a node that died) are removed
+        """
+        token = uuid.uuid4().hex[:8]
+        temp_outputs = []
+        for j in (job, *job.combined):
+            stem, suffix = j.output_path.stem, j.output_path.suffix
+            pattern = f'.{glob.escape(stem)}.{"[0-9a-f]" * 8}.part{glob.escape(suffix)}*'
+            for leftover in j.output_path.parent.glob(pattern):
+                remove(leftover)
+            temp_outputs.append((j, j.output_path))
+            # Extension is kept, ffmpeg picks the container by it
+            j.output_path = j.output_path.with_name(f'.{stem}.{token}.part{suffix}')
+
+        return temp_outputs
+
+    @staticmethod
+    def _rename_outputs(temp_outputs: List[Tuple[Job, Path]]) -> None:
+        """Moves complete outputs to their final names, replacing existing files atomically"""
+        while temp_outputs:
+            j, output_path = temp_outputs[0]
+            written = j.written or j.output_path
+            final = output_path.with_suffix(written.suffix)
+            os.replace(written, final)
+            j.output_path, j.written = output_path, final
+            temp_outputs.pop(0)
+
+    @staticmethod
+    def _queue_ids(job: Job) -> List[int]:
+        """Returns queue ids of a job and jobs combined with it"""
+        return [j.queue_id for j in (job, *job.combined) if j.queue_id is not None]
+
+    def _stage(self, job: Job, name: str) -> None:
+        """Records start of a job stage"""
+        self._timestamp(job, name)
+        self.queue.stage(self._queue_ids(job), name)
+        if job.events:
+            job.events.stage(name)
+
+    @staticmethod
+    def _timestamp(job: Job, name: str) -> None:
+        now = time.time()
+        for j in (job, *job.combined):
+            j.stages[name] = now
+
+    @staticmethod
+    def _encoder_name(job: Job) -> str:
+        """Returns name of the encoder running a job, stream copies have their own"""
+        return COPY if job.copy else job.encoder_name
+
+    def _encode_format(self, job: Job, temp_dir: Path, to_remove: List[Path]) -> None:
+        encoder = self._get_encoder(self._encoder_name(job))
+        file_info = job.file_info
+        input_path = job.input_path
+        resample_rate = job.resample_rate
+
+        source = None
+        if job.intermediate:
+            if 'prepared' not in job.stages:
+                self._stage(job, 'intermediate')
+            input_path = job.intermediate.acquire(partial(self._create_intermediates, job))
+            resample_rate = None  # avoid resampling twice
+        elif job.stream:
+            source = self._get_encoder('rf64')
+            source.configure(
+                input_path=job.input_path,
+                output_path=Path('-'),
                 bitdepth=file_info.bitdepth,
                 duration=file_info.duration,
                 sample_rate=resample_rate,
-                filter_complex=filter_complex
+                track=job.track
             )
-            input_path = temp_path
-            resample_rate = None  # avoid resampling twice
+            resample_rate = None
+
+        self._stage(job, 'encode')
+        if not job.combined:
+            encoder.configure(**self._encoder_params(job, input_path, resample_rate, temp_dir, source))
+            self._own_output(job, encoder)
+            encoder._encode()
+            to_remove.extend(encoder._to_remove)
+            return
+
+        encoders: List[FFmpegEncoder] = []
+        for combined_job in (job, *job.combined):
+            combined_encoder = cast(FFmpegEncoder, self._get_encoder(self._encoder_name(combined_job)))
+            combined_encoder.configure(**self._encoder_params(
+                combined_job, combined_job.input_path, combined_job.resample_rate, temp_dir
+            ))
+            encoders.append(combined_encoder)
+            self._own_output(combined_job, combined_encoder)
+
+        encoders[0].encode_with(encoders[1:])
 
-        encoder(
+    def _own_output(self, job: Job, encoder: BaseEncoder) -> None:
+        """
+        Records the file an encoder is about to write (and settings it was configured with),
+        as a partial output to remove if eat gets killed.
+        That's only known once it's configured (e.g. DEE writes .eb3 for Blu-ray bitrates),
+        and outputs that are only planned, not being written yet, are left alone
+        """
+        job.written = encoder._output_file
+        job.output_settings = encoder.output_settings
+        # Don't write through a hard link to another output, it's only unlinked now that it's being replaced
+        if job.written.exists() and job.written.stat().st_nlink > 1:
+            job.written.unlink()
+        if job.queue_id is not None:
+            self.queue.own([job.queue_id], job.written)
+
+    def _encoder_params(
+        self,
+        job: Job,
+        input_path: Path,
+        resample_rate: Optional[int],
+        temp_dir: Path,
+        source: Optional[BaseEncoder] = None
+    ) -> Dict[str, Any]:
+        """Returns encoder params for a given job"""
+        return dict(
             input_path=input_path,
-            output_path=output_path,
-            bitdepth=file_info.bitdepth,
+            output_path=job.output_path,
+            bitdepth=job.file_info.bitdepth,
             sample_rate=self.args.sample_rate or resample_rate,
             resample_fmt=self.args.bit_depth,
-            duration=file_info.duration,
+            duration=job.file_info.duration,
             bitrate=self.args.bitrate,
-            channels=self.args.channels or file_info.channels,
+            channels=self.args.channels or job.file_info.channels,
             remix=bool(self.args.channels),
-            temp_dir=self.config['temp_path']
+            temp_dir=temp_dir,
+            source=source,
+            analysis=job.intermediate.analysis if job.intermediate else job.analysis,
+            segments=self.args.segments,
+            track=job.track,
+            muxer=job.copy
         )
-        self._to_remove.extend(encoder._to_remove)
 
-    def _clean_temp_files(self) -> None:
-        for file in self._to_remove:
+    def _create_intermediates(self, job: Job, targets: List[Tuple[Intermediate, Path]]) -> None:
+        """Converts job input to rf64 intermediates (of its job, or of every track of a demux at once)"""
+        for _, output_path in targets:
+            self.queue.own(self._queue_ids(job), output_path)
+        if any(intermediate.swap for intermediate, _ in targets):
+            self.logger.info('Swapping Ls/Rs with Lrs/Rrs for DEE')
+
+        # PCM that needs no resampling only has to be rewrapped (or reordered), not re-encoded
+        intermediate, output_path = targets[0]
+        if len(targets) > 1 or not intermediate.file_info.codec.startswith('pcm_') \
+                or intermediate.resample_rate \
+                or not self._copy_intermediate(job, output_path, intermediate.swap):
+            encoders: List[FFmpegEncoder] = []
+            for intermediate, output_path in targets:
+                encoder = cast(FFmpegEncoder, self._get_encoder('rf64'))
+                encoder.configure(
+                    input_path=job.input_path,
+                    output_path=output_path,
+                    bitdepth=intermediate.file_info.bitdepth,
+                    duration=intermediate.file_info.duration,
+                    sample_rate=intermediate.resample_rate,
+                    filter_complex=DEE_71_FILTER if intermediate.swap else None,
+                    track=intermediate.track
+                )
+                encoders.append(encoder)
+            encoders[0].encode_with(encoders[1:])
+
+        if self.args.analyze:
+            for intermediate, output_path in targets:
+                intermediate.analysis = analysis.analyze_pcm(output_path)
+
+    @staticmethod
+    def _copy_intermediate(job: Job, output_path: Path, swap: bool) -> bool:
+        """Creates intermediate by copying PCM samples directly, returns False if input isn't supported"""
+        action = 'Reordering channels of' if swap else 'Rewrapping'
+        with shared_progress() as pb:
+            task = pb.add_task(f'{action} "{job.input_path.name}"', total=None)
+
+            def progress(done: int, total: int) -> None:
+                pb.update(task_id=task, completed=done, total=total)
+
+            if swap:
+                copied = reorder_pcm(job.input_path, output_path, DEE_71_ORDER, progress=progress)
+            else:
+                copied = rewrap_pcm(job.input_path, output_path, progress=progress)
+            if not copied:
+                pb.remove_task(task)
+
+        return copied
+
+    @staticmethod
+    def _clean_temp_files(to_remove: List[Path]) -> None:
+        for file in to_remove:
             if file.exists():
                 file.unlink()
-            self._to_remove.remove(file)
+        to_remove.clear()
 
     def _get_encoder(self, encoder: str) -> BaseEncoder:
         """Returns initialized encoder class for a given encoder name"""
-        module = importlib.import_module('eat.encoders.%s' % encoder)
+        if encoder not in self._encoders:
+            self._encoders[encoder] = self._resolve_encoder(encoder)
+
+        encoder_class, encoder_path = self._encoders[encoder]
+        return encoder_class(encoder_path)
+
+    def _resolve_encoder(self, encoder: str) -> Tuple[Type[BaseEncoder], Path]:
+        """Returns encoder class and its binary path, only looked up once per format"""
+        encoder_class = get_encoder_class(encoder)
         encoder_path = self.config['binaries'].get(
-            module.Encoder.binary_name, which(module.Encoder.binary_name)
+            encoder_class.binary_name, which(encoder_class.binary_name)
         )
         if platform.system() == 'Linux' \
                 and encoder == 'thd' and not encoder_path.endswith('.exe'):
@@ -181,7 +1028,7 @@ class Handler:
                                 'TrueHD encoding will not work')
 
         if not encoder_path:
-            self.logger.error('Path for %s not found!', module.Encoder.binary_name)
+            self.logger.error('Path for %s not found!', encoder_class.binary_name)
             raise SystemExit
 
-        return module.Encoder(Path(encoder_path))  # type: ignore[no-any-return]
+        return encoder_class, Path(encoder_path)
@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from eat.encoders._base import OutputSettings
+from eat.utils.analysis import PcmAnalysis
+from eat.utils.events import JobEvents
+from eat.utils.ffprobe import AudioInfo
+from eat.utils.intermediate import Intermediate
+
+
+class Job:
+    """Single (input, format) encoding job"""
+
+    def __init__(
+        self,
+        input_path: Path,
+        encoder_name: str,
+        output_path: Path,
+        file_info: AudioInfo,
+        resample_rate: Optional[int] = None,
+        intermediate: Optional[Intermediate] = None,
+        stream: bool = False,
+        track: Optional[int] = None,
+        copy: Optional[str] = None
+    ) -> None:
+        self.input_path = input_path
+        self.encoder_name = encoder_name
+        self.output_path = output_path
+        self.file_info = file_info
+        self.resample_rate = resample_rate
+        self.intermediate = intermediate
+        self.stream = stream  # input is decoded and piped into encoder
+        self.track = track  # audio track of the input (with --tracks), None = ffmpeg's default
+        self.copy = copy  # ffmpeg muxer, if the input stream is copied as it is
+        self.combined: List[Job] = []  # jobs encoded by the same ffmpeg process
+        self.analysis: Optional[PcmAnalysis] = None  # of input, if it's PCM
+        self.written: Optional[Path] = None  # actual output, encoders can change its extension
+        self.output_settings: Optional[OutputSettings] = None  # as configured by its encoder
+        self.queue_id: Optional[int] = None  # in the persistent job queue
+        self.stages: Dict[str, float] = {}  # start times of job stages
+        self.events: Optional[JobEvents] = None  # with --progress jsonl
+        self.prepared: Optional['Future[bool]'] = None  # intermediate built ahead of the encode, if it fit
@@ -0,0 +1,309 @@
+import hmac
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, cast
+from urllib.parse import urlsplit
+
+from eat import __version__
+from eat.api import EncodeResult, EncodeSpec, ProgressEvent, Session
+from eat.utils.signals import interrupt_on_sigterm
+
+KEEP_FINISHED = 200  # finished jobs listed, older ones are forgotten
+KEEPALIVE = 15  # seconds between comments keeping idle event streams open
+BOOL_OPTIONS = ('analyze', 'reencode', 'incremental', 'overwrite')
+
+
+class ServerJob:
+    """Encode submitted over HTTP"""
+
+    future: 'Future[EncodeResult]'  # set once submitted, progress can arrive before that
+
+    id: int  # assigned once the spec is accepted
+
+    def __init__(self, spec: EncodeSpec) -> None:
+        self.spec = spec
+        self.submitted = time.time()
+        self.finished: Optional[float] = None
+        self.cancel_requested = False
+        self.tasks: Dict[str, Tuple[float, Optional[float]]] = {}  # description: completed, total
+
+    @property
+    def state(self) -> str:
+        if self.future.cancelled():
+            return 'cancelled'
+        if not self.future.done():
+            if self.cancel_requested:
+                return 'cancelling'
+            return 'running' if self.future.running() else 'queued'
+        if self.future.exception() is None:
+            return 'done'
+
+        return 'cancelled' if isinstance(self.future.exception(), CancelledError) else 'failed'
+
+    def update(self, event: ProgressEvent) -> None:
+        self.tasks[event.description] = (event.completed, event.total)
+
+    def finish(self) -> None:
+        """Records when the job finished, the first time it's seen done"""
+        if self.finished is None:
+            self.finished = time.time()
+
+    def to_json(self) -> Dict[str, Any]:
+        # Event streams end as soon as the session is done with the job, before done callbacks of the server
+        if self.future.done():
+            self.finish()
+        data: Dict[str, Any] = dict(
+            id=self.id,
+            state=self.state,
+            input=str(self.spec.input_path),
+            formats=[*self.spec.formats],
+            submitted=self.submitted,
+            finished=self.finished,
+            tasks=[
+                dict(description=description, completed=completed, total=total)
+                for description, (completed, total) in [*self.tasks.items()]
+            ]
+        )
+        if self.state == 'done':
+            result = self.future.result()
+            data['outputs'] = [
+                dict(format=output.format, path=str(output.path), params=output.params,
+                     timings=output.timings)
+                for output in result.outputs
+            ]
+            data['skipped'] = result.skipped
+        elif self.state == 'failed':
+            error = cast(BaseException, self.future.exception())
+            data['error'] = str(error) or type(error).__name__
+
+        return data
+
+
+class Server:
+    """
+    HTTP API queueing encodes on a local session, jobs run with its concurrency.
+    Paths in requests are paths on this machine
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        host: str = '127.0.0.1',
+        port: int = 8086,
+        token: Optional[str] = None,
+        max_queued: int = 100
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.session = session
+        self.token = token
+        self._address = (host, port)
+        self._max_queued = max_queued
+        self._jobs: Dict[int, ServerJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        """Serves requests until interrupted, queued jobs are cancelled and running ones let finish"""
+        httpd = _HTTPServer(self._address, _RequestHandler)
+        httpd.app = self
+        interrupt_on_sigterm()
+        self.logger.info('Listening on http://%s:%s', *httpd.server_address[:2])
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info('Stopping, waiting for running encodes...')
+        finally:
+            httpd.server_close()
+            for job in self.jobs():
+                job.future.cancel()
+            self.session.close()
+
+    def submit(self, request: Any) -> ServerJob:
+        """Queues a job from request JSON, raises ValueError if it's invalid"""
+        spec = _parse_spec(request)
+        with self._lock:
+            if sum(not job.future.done() for job in self._jobs.values()) >= self._max_queued:
+                raise OverflowError('Too many queued jobs')
+
+            job = ServerJob(spec)
+            job.future = self.session.submit(spec, on_progress=job.update)
+            job.id = next(self._ids)
+            self._jobs[job.id] = job
+            self._prune()
+
+        job.future.add_done_callback(lambda _: self._finished(job))
+        self.logger.info('Queued job %d: "%s" to %s', job.id, spec.input_path, ', '.join(spec.formats))
+        return job
+
+    def cancel(self, job: ServerJob) -> bool:
+        """Cancels a job, returns False if it's finished already"""
+        job.cancel_requested = True
+        return self.session.cancel(job.future)
+
+    def jobs(self) -> List[ServerJob]:
+        with self._lock:
+            return [*self._jobs.values()]
+
+    def get(self, job_id: int) -> Optional[ServerJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _finished(self, job: ServerJob) -> None:
+        job.finish()
+        self.logger.info('Job %d %s', job.id, job.state)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.future.done()]
+        for job_id in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[job_id]
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    app: Server
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /jobs, POST /jobs, GET /jobs/<id>, DELETE /jobs/<id> (cancel),
+    GET /jobs/<id>/events (server-sent progress events, ending with the final state)
+    """
+    server_version = f'eat/{__version__}'
+
+    def do_GET(self) -> None:
+        self._handle('GET')
+
+    def do_POST(self) -> None:
+        self._handle('POST')
+
+    def do_DELETE(self) -> None:
+        self._handle('DELETE')
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.getLogger(__name__).debug('%s %s', self.address_string(), format % args)
+
+    def _handle(self, method: str) -> None:
+        app = cast(_HTTPServer, self.server).app
+        if app.token and not hmac.compare_digest(
+            self.headers.get('Authorization', '').encode(), f'Bearer {app.token}'.encode()
+        ):
+            self._send(401, dict(error='Missing or wrong token'))
+            return
+
+        parts = [part for part in urlsplit(self.path).path.split('/') if part]
+        if parts == ['jobs']:
+            if method == 'GET':
+                self._send(200, dict(jobs=[job.to_json() for job in app.jobs()]))
+            elif method == 'POST':
+                self._submit(app)
+            else:
+                self._send(405, dict(error='Method not allowed'))
+            return
+
+        job = app.get(int(parts[1])) if len(parts) in (2, 3) and parts[0] == 'jobs' \
+            and parts[1].isdigit() else None
+        if not job or (len(parts) == 3 and parts[2] != 'events'):
+            self._send(404, dict(error='Not found'))
+        elif len(parts) == 3 and parts[2] == 'events' and method == 'GET':
+            self._stream_events(app, job)
+        elif len(parts) == 2 and method == 'GET':
+            self._send(200, job.to_json())
+        elif len(parts) == 2 and method == 'DELETE':
+            if app.cancel(job):
+                self._send(202, job.to_json())
+            else:
+                self._send(409, dict(error='Job is finished already', job=job.to_json()))
+        else:
+            self._send(405, dict(error='Method not allowed'))
+
+    def _submit(self, app: Server) -> None:
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = app.submit(json.loads(self.rfile.read(length) or b'null'))
+        except (ValueError, TypeError) as e:  # JSON errors are ValueErrors too
+            self._send(400, dict(error=str(e)))
+        except OverflowError as e:
+            self._send(503, dict(error=str(e)))
+        else:
+            self._send(201, job.to_json())
+
+    def _stream_events(self, app: Server, job: ServerJob) -> None:
+        """Streams progress events until the job is done, then its final state"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        events: 'queue.Queue[Optional[ProgressEvent]]' = queue.Queue()
+        app.session.subscribe(job.future, events.put)
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    self._write(': keepalive\n\n')
+                    continue
+                if event is None:
+                    break
+                self._write_event('progress', dict(
+                    description=event.description,
+                    completed=event.completed,
+                    total=event.total
+                ))
+            self._write_event(job.state, job.to_json())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            app.session.unsubscribe(job.future, events.put)
+
+    def _write_event(self, name: str, data: Dict[str, Any]) -> None:
+        self._write(f'event: {name}\ndata: {json.dumps(data)}\n\n')
+
+    def _write(self, text: str) -> None:
+        self.wfile.write(text.encode())
+        self.wfile.flush()
+
+    def _send(self, status: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _parse_spec(request: Any) -> EncodeSpec:
+    """Returns spec of a job request, options are named like EncodeSpec fields ("input" is the input path)"""
+    if not isinstance(request, dict) or not isinstance(request.get('input'), str):
+        raise ValueError('Request has to be a JSON object with an "input" path')
+
+    options: Dict[str, Any] = dict(input_path=Path(request['input']))
+    for key, value in request.items():
+        if key == 'input':
+            continue
+        if key not in EncodeSpec._fields or key == 'input_path':
+            raise ValueError(f'Unknown option "{key}"')
+        if key == 'formats':
+            value = [value] if isinstance(value, str) else value
+            if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+                raise ValueError('"formats" has to be a list of format names')
+        elif key == 'output_dir':
+            value = Path(value)
+        elif key == 'tracks':
+            if not isinstance(value, str):
+                raise ValueError('"tracks" has to be "all" or track numbers like "0,2"')
+        elif key in BOOL_OPTIONS and not isinstance(value, bool):
+            raise ValueError(f'"{key}" has to be true or false')
+        elif key not in BOOL_OPTIONS and value is not None \
+                and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ValueError(f'"{key}" has to be a number')
+        options[key] = value
+
+    return EncodeSpec(**options)
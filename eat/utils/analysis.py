@@ -0,0 +1,111 @@
+import importlib.util
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+from eat.utils.header import read_pcm_data
+
+if TYPE_CHECKING:
+    import numpy
+
+CHUNK_FRAMES = 1 << 18  # frames scanned per vectorized step
+
+logger = logging.getLogger(__name__)
+
+
+class PcmAnalysis:
+    """PCM sample statistics, peaks and DC offsets are relative to full scale"""
+
+    def __init__(
+        self,
+        bitdepth: int,
+        effective_bitdepth: int,
+        peaks: List[float],
+        dc_offsets: List[float]
+    ) -> None:
+        self.bitdepth = bitdepth
+        self.effective_bitdepth = effective_bitdepth  # 0 for digital silence
+        self.peaks = peaks
+        self.dc_offsets = dc_offsets
+
+    @property
+    def silent_channels(self) -> List[int]:
+        """Returns indexes of channels containing only digital silence"""
+        return [channel for channel, peak in enumerate(self.peaks) if peak == 0]
+
+    def is_padded(self) -> bool:
+        """Checks whether samples use fewer bits than their container"""
+        return 0 < self.effective_bitdepth < self.bitdepth
+
+
+def is_available() -> bool:
+    """Checks whether numpy is installed (optional, see `pip install eat[analysis]`) without importing it"""
+    return importlib.util.find_spec('numpy') is not None
+
+
+def analyze_pcm(file: Path) -> Optional[PcmAnalysis]:
+    """
+    Scans PCM samples of a WAV/RF64/W64 file through a memory map,
+    returns None if format isn't supported or numpy isn't installed
+    """
+    data = read_pcm_data(file)
+    if not is_available() or not data or not data.codec or not data.block_align:
+        return None
+
+    import numpy
+
+    is_float = data.codec.startswith('pcm_f')
+    channels = data.channels
+    size = min(data.size, file.stat().st_size - data.offset)
+    size -= size % data.block_align
+    if size <= 0:
+        return None
+
+    samples = numpy.memmap(file, dtype=numpy.uint8, mode='r', offset=data.offset, shape=(size,))
+    chunk_size = CHUNK_FRAMES * data.block_align
+
+    bits_used = 0
+    peaks = numpy.zeros(channels, dtype=numpy.float64)
+    sums = numpy.zeros(channels, dtype=numpy.float64)
+    for start in range(0, size, chunk_size):
+        chunk = _decode(samples[start:start + chunk_size], data.bits, is_float).reshape(-1, channels)
+        if not is_float:
+            bits_used |= int(numpy.bitwise_or.reduce(chunk, axis=None))
+        peaks = numpy.maximum(peaks, numpy.abs(chunk).max(axis=0))
+        sums += chunk.sum(axis=0, dtype=numpy.float64)
+
+    full_scale = 1.0 if is_float else float(1 << (data.bits - 1))
+    frames = size // data.block_align
+
+    effective_bitdepth = data.bits
+    if not is_float:
+        trailing_zeros = (bits_used & -bits_used).bit_length() - 1 if bits_used else data.bits
+        effective_bitdepth = data.bits - trailing_zeros
+
+    analysis = PcmAnalysis(
+        bitdepth=data.bits,
+        effective_bitdepth=effective_bitdepth,
+        peaks=[float(peak) / full_scale for peak in peaks],
+        dc_offsets=[float(total) / frames / full_scale for total in sums]
+    )
+    logger.debug(
+        'Analysis of "%s": %s/%s bits used, silent channels: %s',
+        file.name, analysis.effective_bitdepth, analysis.bitdepth, analysis.silent_channels
+    )
+    return analysis
+
+
+def _decode(chunk: 'numpy.ndarray', bits: int, is_float: bool) -> 'numpy.ndarray':
+    """Returns little endian samples as a numeric array (int64 or float64)"""
+    import numpy
+
+    if is_float:
+        return numpy.frombuffer(chunk, dtype=f'<f{bits // 8}').astype(numpy.float64)
+    if bits == 8:  # unsigned
+        return chunk.astype(numpy.int64) - 128
+    if bits == 24:
+        triplets = chunk.reshape(-1, 3).astype(numpy.int32)
+        values = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        return ((values << 8) >> 8).astype(numpy.int64)  # sign extend
+
+    return numpy.frombuffer(chunk, dtype=f'<i{bits // 8}').astype(numpy.int64)
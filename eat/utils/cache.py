@@ -0,0 +1,95 @@
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS probe (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    data BLOB NOT NULL
+)
+'''
+
+
+class ProbeCache:
+    """
+    Persistent cache of ffprobe results,
+    entries are keyed by file path, size, mtime and inode
+    and stored as compressed json in an sqlite database
+    """
+
+    def __init__(self, path: Path, max_entries: int = 10000) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._path = path
+        self._max_entries = max_entries
+        try:
+            with self._connect() as db:
+                db.execute('PRAGMA journal_mode=WAL')  # readers don't block each other
+                db.execute(SCHEMA)
+        except sqlite3.Error as e:
+            self.logger.debug('Probe cache disabled: %s', e)
+            self._max_entries = 0
+
+    def get(self, file: Path) -> Optional[dict]:
+        """Returns cached ffprobe log for a file, if it hasn't changed since"""
+        if not self._max_entries:
+            return None
+
+        path, stat = str(file.resolve()), file.stat()
+        try:
+            with self._connect() as db:
+                row = db.execute(
+                    'SELECT data FROM probe WHERE path = ? AND size = ? AND mtime = ? AND inode = ?',
+                    (path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+                ).fetchone()
+                if row:
+                    db.execute('UPDATE probe SET last_used = ? WHERE path = ?', (time.time(), path))
+        except sqlite3.Error as e:
+            self.logger.debug('Probe cache read failed: %s', e)
+            return None
+
+        if not row:
+            return None
+
+        self.logger.debug('Using cached probe results for "%s"', file)
+        return json.loads(zlib.decompress(row[0]))  # type: ignore[no-any-return]
+
+    def put(self, file: Path, log: dict) -> None:
+        """Stores ffprobe log for a file, evicting least recently used entries"""
+        if not self._max_entries:
+            return
+
+        stat = file.stat()
+        data = zlib.compress(json.dumps(log, separators=(',', ':')).encode('utf-8'))
+        try:
+            with self._connect() as db:
+                db.execute(
+                    'INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?, ?)',
+                    (str(file.resolve()), stat.st_size, stat.st_mtime_ns,
+                     stat.st_ino, time.time(), data)
+                )
+                db.execute(
+                    'DELETE FROM probe WHERE path NOT IN '
+                    '(SELECT path FROM probe ORDER BY last_used DESC LIMIT ?)',
+                    (self._max_entries,)
+                )
+        except sqlite3.Error as e:
+            self.logger.debug('Probe cache write failed: %s', e)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Connections can't be shared between threads, and opening one is cheap
+        db = sqlite3.connect(self._path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
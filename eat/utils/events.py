@@ -0,0 +1,150 @@
+import itertools
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from typing import IO, Any, Dict, Optional, Tuple
+
+PROGRESS_INTERVAL = 1.0  # seconds between progress events of a task
+
+_local = threading.local()
+
+
+class EventStream:
+    """
+    Writes events as JSON lines for programs following a run, every line is an object
+    with `event` and `time` keys. A reader that goes away doesn't stop the encodes
+    """
+
+    def __init__(self, file: IO[bytes], interval: float = PROGRESS_INTERVAL, close: bool = True) -> None:
+        self.interval = interval
+        self._file = file
+        self._close = close  # stdout is left open
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._broken = False
+
+    def emit(self, event: str, **fields: Any) -> None:
+        line = json.dumps(dict(event=event, time=round(time.time(), 3), **fields), default=str)
+        with self._lock:
+            if self._broken:
+                return
+            try:
+                self._file.write(line.encode() + b'\n')
+                self._file.flush()
+            except (OSError, ValueError):
+                self._broken = True
+
+    def job(self, **fields: Any) -> 'JobEvents':
+        """Returns events of a new job, identified by a number unique in this stream"""
+        return JobEvents(self, next(self._ids), fields)
+
+    def close(self) -> None:
+        with self._lock:
+            self._broken = True
+            if self._close:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+
+
+class JobEvents:
+    """
+    Events of a single job: start, stages, progress of its tasks (at most one event per interval each,
+    along with the real-time factor) and its end
+    """
+
+    def __init__(self, stream: EventStream, job_id: int, fields: Dict[str, Any]) -> None:
+        self.id = job_id
+        self._stream = stream
+        self._fields = fields
+        self._duration = float(fields.get('duration') or 0)  # seconds of audio
+        self._stage: Optional[str] = None
+        self._started = time.monotonic()
+        self._tasks: Dict[Any, Tuple[float, float, float]] = {}  # task id: (started, last event, last percent)
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._stream.emit('job_start', job=self.id, **self._fields)
+
+    def stage(self, name: str) -> None:
+        self._stage = name
+        self._stream.emit('stage', job=self.id, stage=name)
+
+    def progress(self, task_id: Any, description: str, completed: float, total: Optional[float]) -> None:
+        """Progress callback of the job's tasks, fed by the same process output parsers as the bars"""
+        now = time.monotonic()
+        started, last, last_percent = self._tasks.get(task_id) or (now, 0.0, -1.0)
+        percent = min(100.0, round(100 * completed / total, 1)) if total else -1.0
+        if percent == last_percent or (now - last < self._stream.interval and percent < 100):
+            self._tasks[task_id] = (started, last, last_percent)
+            return
+
+        self._tasks[task_id] = (started, now, percent)
+        elapsed = now - started
+        speed = round(percent / 100 * self._duration / elapsed, 2) \
+            if percent >= 0 and self._duration and elapsed > 0 else None
+        self._stream.emit(
+            'progress',
+            job=self.id,
+            stage=self._stage,
+            task=description,
+            percent=percent if percent >= 0 else None,
+            speed=speed
+        )
+
+    def done(self, **fields: Any) -> None:
+        self._stream.emit('job_done', job=self.id, elapsed=round(time.monotonic() - self._started, 3), **fields)
+
+    def failed(self, error: str, cancelled: bool = False) -> None:
+        self._stream.emit('job_failed', job=self.id, error=error, cancelled=cancelled)
+
+    def __enter__(self) -> 'JobEvents':
+        """Attributes log events of this thread to the job"""
+        self._previous = getattr(_local, 'job', None)
+        _local.job = self
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        _local.job = self._previous
+
+
+class EventLogHandler(logging.Handler):
+    """Forwards log records (warnings and errors by default) as `log` events"""
+
+    def __init__(self, stream: EventStream, level: int = logging.WARNING) -> None:
+        super().__init__(level)
+        self._stream = stream
+
+    def emit(self, record: logging.LogRecord) -> None:
+        job: Optional[JobEvents] = getattr(_local, 'job', None)
+        self._stream.emit(
+            'log',
+            level=record.levelname.lower(),
+            message=record.getMessage(),
+            job=job.id if job else None
+        )
+
+
+def open_stream(target: str) -> EventStream:
+    """Opens event stream to `-` (stdout), `fd:N`, `unix:PATH` or `tcp:HOST:PORT`, raises OSError"""
+    kind, _, address = target.partition(':')
+    if target == '-':
+        return EventStream(sys.stdout.buffer, close=False)
+    if kind == 'fd':
+        return EventStream(os.fdopen(int(address), 'wb'))
+    if kind == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    elif kind == 'tcp':
+        host, _, port = address.rpartition(':')
+        sock = socket.create_connection((host.strip('[]'), int(port)))
+    else:
+        raise ValueError('Unknown event target "%s"' % target)
+
+    with sock:
+        return EventStream(sock.makefile('wb'))
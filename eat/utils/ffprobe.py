@@ -1,10 +1,13 @@
 import json
-import subprocess
 from pathlib import Path
-from typing import Optional, TextIO, cast
+from typing import List, Optional, cast
 
+from eat.utils.cache import ProbeCache
+from eat.utils.header import read_header
 from eat.utils.processor import ProcessingError, Processor
 
+ALL_TRACKS = 'eat_all_tracks'  # marks logs listing every audio stream, not only the first one
+
 
 class AudioInfo:
     """Utility class parsing ffprobe results into an easier to read form"""
@@ -14,12 +17,14 @@ class AudioInfo:
     channels: int
     profile: str = ''  # mainly for DTS
     duration: float  # microseconds
+    track: int = 0  # index among audio streams of the input
+    language: str = ''  # from stream tags, empty if unknown
 
-    def __init__(self, log: dict) -> None:
+    def __init__(self, log: dict, track: int = 0) -> None:
         if not log['streams']:
             raise ProcessingError('No streams found')
 
-        stream = log['streams'][0]
+        stream = log['streams'][track]
         self.codec = stream['codec_name']
         self.container = log['format']['format_name']
         self.sample_rate = int(stream['sample_rate'])
@@ -28,34 +33,60 @@ class AudioInfo:
         )
         self.channels = stream.get('channels', 0)
         self.profile = stream.get('profile', '')
-        # convert seconds to microseconds for ffmpeg compatibility
-        self.duration = float(stream.get('duration', -1)) * 1000000
+        # convert seconds to microseconds for ffmpeg compatibility,
+        # streams of some containers (e.g. Matroska) only have the container's duration
+        self.duration = float(stream.get('duration') or log['format'].get('duration', -1)) * 1000000
+        self.track = track
+        tags = {key.lower(): value for key, value in stream.get('tags', {}).items()}
+        language = ''.join(char for char in str(tags.get('language', '')) if char.isalnum())
+        self.language = '' if language == 'und' else language
 
 
 class FFprobe:
     """ffprobe reading utility class"""
 
-    def __init__(self, path: Path) -> None:
+    def __init__(self, path: Path, cache: Optional[ProbeCache] = None) -> None:
         self._path: Path = path
+        self._cache = cache
         self._processor: Processor = Processor()
-        self._log: Optional[dict] = None
 
     def __call__(self, file: Path) -> AudioInfo:
+        """Returns info of the first audio track of a file"""
+        return AudioInfo(self._probe(file, all_tracks=False))
+
+    def tracks(self, file: Path) -> List[AudioInfo]:
+        """Returns info of every audio track of a file"""
+        log = self._probe(file, all_tracks=True)
+        return [AudioInfo(log, track) for track in range(len(log['streams']))]
+
+    def _probe(self, file: Path, all_tracks: bool) -> dict:
+        # Common PCM/FLAC inputs can be read directly, without starting ffprobe
+        log = read_header(file)
+        if log is None and self._cache:
+            log = self._cache.get(file)
+            # Entries cached before all tracks were probed only have the first one
+            if log and all_tracks and not log.get(ALL_TRACKS):
+                log = None
+        if log:
+            return log
+
+        lines: List[str] = []
         self._processor.call_process_output(
             params=[
                 self._path,
                 '-v', 'quiet',
-                '-select_streams', 'a:0',
+                '-select_streams', 'a',
                 '-print_format', 'json',
                 '-show_format',
                 '-show_streams',
                 file
             ],
-            output_handler=self._reader
+            stdout_handler=lines.append
         )
-        return AudioInfo(cast(dict, self._log))
+        log = cast(dict, json.loads('\n'.join(lines)))
+        AudioInfo(log)  # only cache logs that parse correctly
+        log[ALL_TRACKS] = True
+        if self._cache:
+            self._cache.put(file, log)
 
-    def _reader(self, process: subprocess.Popen) -> None:
-        process.wait()
-        with cast(TextIO, process.stdout) as stdout:
-            self._log = json.loads(stdout.read())
+        return log
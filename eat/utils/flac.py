@@ -0,0 +1,347 @@
+import hashlib
+import mmap
+import struct
+import threading
+from concurrent.futures import CancelledError
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from eat.utils.header import PcmData
+from eat.utils.processor import ProcessingError
+
+STREAMINFO = 0
+SEEKTABLE = 3
+LAST_BLOCK = 0x80
+FIXED_SYNC = b'\xff\xf8'  # fixed block size frames, numbered instead of addressed by sample
+CRC16_POLY = 0x8005
+CRC8_POLY = 0x07
+READ_SIZE = 1 << 24
+
+# Least common multiple of standard FLAC block sizes (192 * 3 * 2^n and 256 * 2^n),
+# segments of a multiple of it end on a frame boundary whatever block size is used
+BLOCK_LCM = 294912
+
+
+def _crc_table(poly: int, width: int) -> List[int]:
+    top, mask = 1 << (width - 1), (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly if crc & top else crc << 1) & mask
+        table.append(crc)
+
+    return table
+
+
+CRC8_TABLE = _crc_table(CRC8_POLY, 8)
+CRC16_TABLE = _crc_table(CRC16_POLY, 16)
+
+
+class StreamInfo:
+    """FLAC STREAMINFO block fields"""
+
+    def __init__(self, data: bytes) -> None:
+        self.min_blocksize, self.max_blocksize = struct.unpack('>HH', data[:4])
+        self.min_framesize = int.from_bytes(data[4:7], 'big')
+        self.max_framesize = int.from_bytes(data[7:10], 'big')
+        packed = int.from_bytes(data[10:18], 'big')
+        self.sample_rate = packed >> 44
+        self.channels = (packed >> 41 & 0x7) + 1
+        self.bits = (packed >> 36 & 0x1F) + 1
+        self.samples = packed & 0xFFFFFFFFF
+        self.md5 = data[18:34]
+
+    def pack(self) -> bytes:
+        packed = self.sample_rate << 44 | (self.channels - 1) << 41 \
+            | (self.bits - 1) << 36 | self.samples
+        return struct.pack('>HH', self.min_blocksize, self.max_blocksize) \
+            + self.min_framesize.to_bytes(3, 'big') + self.max_framesize.to_bytes(3, 'big') \
+            + packed.to_bytes(8, 'big') + self.md5
+
+
+def pcm_md5(file: Path, data: PcmData, cancelled: Optional[threading.Event] = None) -> bytes:
+    """
+    Returns MD5 of PCM samples as stored in FLAC STREAMINFO
+    (same as WAV data for 16/24 bit integer PCM), raises CancelledError once `cancelled` is set
+    """
+    digest = hashlib.md5()
+    with file.open(mode='rb') as f:
+        f.seek(data.offset)
+        remaining = data.size
+        while remaining:
+            if cancelled and cancelled.is_set():
+                raise CancelledError
+            chunk = f.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+
+    return digest.digest()
+
+
+def join_segments(segments: List[Path], output_path: Path, md5: bytes) -> None:
+    """
+    Joins FLAC files encoded from consecutive parts of the same input into a single stream.
+    Frames are renumbered (their CRCs patched, the payload isn't touched),
+    STREAMINFO gets totals of all segments and MD5 of the whole input
+    """
+    infos = []
+    for segment in segments:
+        with segment.open(mode='rb') as f:
+            info, _, _ = _read_metadata(f)
+        infos.append(info)
+
+    first = infos[0]
+    blocksize = first.max_blocksize
+    for index, info in enumerate(infos):
+        if (info.sample_rate, info.channels, info.bits, info.max_blocksize) \
+                != (first.sample_rate, first.channels, first.bits, blocksize) \
+                or (index < len(infos) - 1 and info.samples % blocksize):
+            raise ProcessingError('FLAC segment "%s" doesn\'t match the others' % segments[index])
+
+    joined = StreamInfo(first.pack())
+    joined.samples = sum(info.samples for info in infos)
+    joined.md5 = md5
+
+    with output_path.open(mode='wb') as out:
+        with segments[0].open(mode='rb') as f:
+            _, blocks, _ = _read_metadata(f)
+        out.write(_metadata(joined, blocks))
+
+        frame_number = 0
+        sizes = set()
+        for segment in segments:
+            with segment.open(mode='rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                _, _, start = _read_metadata(f)
+                for begin, end, header_size in _frames(data, start):
+                    sizes.add(_write_frame(out, data, begin, end, header_size, frame_number))
+                    frame_number += 1
+
+        # Frame sizes are only known now, STREAMINFO always directly follows the magic
+        joined.min_framesize, joined.max_framesize = min(sizes), max(sizes)
+        out.seek(8)
+        out.write(joined.pack())
+
+
+def _read_metadata(f: BinaryIO) -> Tuple[StreamInfo, List[Tuple[int, bytes]], int]:
+    """Returns STREAMINFO, other metadata blocks and offset of the first frame"""
+    if f.read(4) != b'fLaC':
+        raise ProcessingError('"%s" is not a FLAC file' % f.name)
+
+    info: Optional[StreamInfo] = None
+    blocks = []
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            raise ProcessingError('"%s" has truncated metadata' % f.name)
+        block_type = header[0] & 0x7F
+        data = f.read(int.from_bytes(header[1:], 'big'))
+        if block_type == STREAMINFO:
+            info = StreamInfo(data)
+        else:
+            blocks.append((block_type, data))
+        if header[0] & LAST_BLOCK:
+            break
+
+    if not info:
+        raise ProcessingError('"%s" has no STREAMINFO' % f.name)
+
+    return info, blocks, f.tell()
+
+
+def _metadata(info: StreamInfo, blocks: List[Tuple[int, bytes]]) -> bytes:
+    """Returns metadata of a joined stream, seek tables are dropped as their offsets don't apply"""
+    blocks = [(STREAMINFO, info.pack()), *(b for b in blocks if b[0] != SEEKTABLE)]
+    out = b'fLaC'
+    for index, (block_type, data) in enumerate(blocks):
+        last = LAST_BLOCK if index == len(blocks) - 1 else 0
+        out += bytes([block_type | last]) + len(data).to_bytes(3, 'big') + data
+
+    return out
+
+
+def _frames(data: mmap.mmap, start: int) -> List[Tuple[int, int, int]]:
+    """
+    Returns (start, end, header size) of every frame in a fixed block size stream.
+    Frame boundaries are found by sync codes followed by a valid header
+    with the next frame number and the same stream parameters
+    """
+    header = _parse_header(data, start)
+    if not header or header[1] != 0:
+        raise ProcessingError('Unexpected data at the start of FLAC frames')
+
+    frames = []
+    params = _stream_params(data, start)
+    position, number = start, 0
+    while True:
+        next_header = None
+        candidate = data.find(FIXED_SYNC, position + header[0])
+        while candidate >= 0:
+            next_header = _parse_header(data, candidate)
+            if next_header and next_header[1] == number + 1 \
+                    and _stream_params(data, candidate) == params:
+                break
+            candidate = data.find(FIXED_SYNC, candidate + 1)
+
+        if candidate < 0 or not next_header:
+            frames.append((position, len(data), header[0]))
+            return frames
+
+        frames.append((position, candidate, header[0]))
+        position, number, header = candidate, number + 1, next_header
+
+
+def _stream_params(data: mmap.mmap, position: int) -> Tuple[int, int]:
+    """Returns sample rate and sample size codes of a frame (block size and channel coding can vary)"""
+    return data[position + 2] & 0xF, data[position + 3] & 0xE
+
+
+def _parse_header(data: mmap.mmap, position: int) -> Optional[Tuple[int, int]]:
+    """Returns (size, frame number) of a frame header at a given position, if there's a valid one"""
+    header = data[position:position + 16]
+    if len(header) < 6 or header[:2] != FIXED_SYNC or header[3] & 1:
+        return None
+
+    blocksize_code, rate_code = header[2] >> 4, header[2] & 0xF
+    if blocksize_code == 0 or rate_code == 0xF:
+        return None
+
+    decoded = _decode_number(header[4:])
+    if not decoded:
+        return None
+    number, size = decoded[0], 4 + decoded[1]
+    size += {6: 1, 7: 2}.get(blocksize_code, 0) + {12: 1, 13: 2, 14: 2}.get(rate_code, 0)
+    if size >= len(header) or _crc8(header[:size]) != header[size]:
+        return None
+
+    return size + 1, number
+
+
+def _write_frame(
+    out: BinaryIO,
+    data: mmap.mmap,
+    begin: int,
+    end: int,
+    header_size: int,
+    number: int
+) -> int:
+    """Writes a frame with a new number, returns its size"""
+    old_header = data[begin:begin + header_size]
+    decoded = _decode_number(old_header[4:])
+    assert decoded
+    if decoded[0] == number:
+        out.write(data[begin:end])
+        return end - begin
+
+    fields = old_header[4 + decoded[1]:-1]  # block size and sample rate, if not coded
+    header = old_header[:4] + _encode_number(number) + fields
+    header += bytes([_crc8(header)])
+
+    # CRC-16 is linear, so the change in header is carried over without reading the payload:
+    # crc(header + payload) = crc(header) * x^(8 * len(payload)) + crc(payload)
+    payload = end - 2 - begin - header_size
+    old_crc = int.from_bytes(data[end - 2:end], 'big')
+    crc = old_crc ^ _crc16_shift(_crc16(old_header) ^ _crc16(header), payload)
+
+    out.write(header)
+    out.write(data[begin + header_size:end - 2])
+    out.write(crc.to_bytes(2, 'big'))
+    return len(header) + payload + 2
+
+
+def _decode_number(data: bytes) -> Optional[Tuple[int, int]]:
+    """Decodes UTF-8 like coded frame number, returns (number, coded size)"""
+    first = data[0]
+    if first < 0x80:
+        return first, 1
+
+    size = 8 - (first ^ 0xFF).bit_length()  # leading ones
+    if size < 2 or size > 7 or len(data) < size:
+        return None
+
+    number = first & (0x7F >> size)
+    for byte in data[1:size]:
+        if byte & 0xC0 != 0x80:
+            return None
+        number = number << 6 | byte & 0x3F
+
+    return number, size
+
+
+def _encode_number(number: int) -> bytes:
+    if number < 0x80:
+        return bytes([number])
+
+    size = 2
+    while number >= 1 << (5 * size + 1):
+        size += 1
+    tail: List[int] = []
+    for _ in range(size - 1):
+        tail.insert(0, 0x80 | number & 0x3F)
+        number >>= 6
+
+    return bytes([(0xFF00 >> size) & 0xFF | number, *tail])
+
+
+def _crc8(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+
+    return crc
+
+
+def _crc16(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = (crc << 8 & 0xFFFF) ^ CRC16_TABLE[crc >> 8 ^ byte]
+
+    return crc
+
+
+def _mulmod(a: int, b: int) -> int:
+    """Multiplies polynomials over GF(2) modulo the CRC-16 polynomial"""
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        b >>= 1
+        a <<= 1
+        if a & 0x10000:
+            a ^= 0x10000 | CRC16_POLY
+
+    return result
+
+
+# x^(8 * 2^i) modulo CRC-16 polynomial, with lookup tables multiplying by it
+_powers: List[int] = [1 << 8]
+_power_tables: Dict[int, Tuple[List[int], List[int]]] = {}
+
+
+def _crc16_shift(crc: int, size: int) -> int:
+    """Returns CRC register after feeding `size` zero bytes, i.e. crc * x^(8 * size)"""
+    index = 0
+    while size:
+        if size & 1:
+            crc = _power_multiplier(index)(crc)
+        size >>= 1
+        index += 1
+
+    return crc
+
+
+def _power_multiplier(index: int) -> Callable[[int], int]:
+    while len(_powers) <= index:
+        _powers.append(_mulmod(_powers[-1], _powers[-1]))
+    if index not in _power_tables:
+        power = _powers[index]
+        _power_tables[index] = (
+            [_mulmod(byte, power) for byte in range(256)],
+            [_mulmod(byte << 8, power) for byte in range(256)],
+        )
+
+    low, high = _power_tables[index]
+    return lambda crc: low[crc & 0xFF] ^ high[crc >> 8]
@@ -0,0 +1,249 @@
+import struct
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+# Wave64 chunk GUIDs
+W64_RIFF = b'riff\x2e\x91\xcf\x11\xa5\xd6\x28\xdb\x04\xc1\x00\x00'
+W64_WAVE = b'wave\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a'
+W64_FMT = b'fmt \xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a'
+W64_DATA = b'data\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a'
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Header size sanity limit, files with more metadata than that are left to ffprobe
+MAX_CHUNKS = 64
+
+
+class PcmData:
+    """Location and format of PCM samples inside a WAV/RF64/W64 file"""
+
+    def __init__(self, fmt: bytes, offset: int, size: int) -> None:
+        tag, self.channels, self.sample_rate, _, self.block_align, self.bits = \
+            struct.unpack('<HHIIHH', fmt[:16])
+        self.channel_mask = 0
+        if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            self.channel_mask = struct.unpack('<I', fmt[20:24])[0]
+            tag = struct.unpack('<H', fmt[24:26])[0]  # first two bytes of SubFormat GUID
+        self.codec = _pcm_codec(tag, self.bits)
+        self.offset = offset
+        self.size = size
+
+
+def read_header(file: Path) -> Optional[dict]:
+    """
+    Reads WAV/RF64/W64/FLAC headers into an ffprobe-like log,
+    returns None for anything else so that caller can fall back to ffprobe
+    """
+    try:
+        with file.open(mode='rb') as f:
+            magic = f.read(16)
+            if magic[:4] in (b'RIFF', b'RF64'):
+                return _pcm_log(_read_wav(f, is_rf64=magic[:4] == b'RF64'), 'wav')
+            if magic == W64_RIFF:
+                return _pcm_log(_read_w64(f), 'w64')
+            if magic[:4] in (b'fLaC', b'ID3\x03', b'ID3\x04'):
+                return _read_flac(f)
+    except (OSError, struct.error, ValueError):
+        pass
+
+    return None
+
+
+def read_pcm_data(file: Path) -> Optional[PcmData]:
+    """Returns PCM data location for WAV/RF64/W64 files, None for anything else"""
+    try:
+        with file.open(mode='rb') as f:
+            magic = f.read(16)
+            if magic[:4] in (b'RIFF', b'RF64'):
+                data = _read_wav(f, is_rf64=magic[:4] == b'RF64')
+            elif magic == W64_RIFF:
+                data = _read_w64(f)
+            else:
+                return None
+    except (OSError, struct.error, ValueError):
+        return None
+
+    return data if data and data.codec else None
+
+
+def _read_wav(f: BinaryIO, is_rf64: bool) -> Optional[PcmData]:
+    f.seek(8)
+    if f.read(4) != b'WAVE':
+        return None
+
+    fmt: Optional[bytes] = None
+    data_offset = 0
+    data_size: Optional[int] = None
+    ds64_size: Optional[int] = None
+    for _ in range(MAX_CHUNKS):
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'ds64':
+            ds64_size = struct.unpack('<8xQ', f.read(16))[0]
+            size -= 16
+        elif chunk_id == b'fmt ':
+            fmt = f.read(size)
+            size = 0
+        elif chunk_id == b'data':
+            data_offset = f.tell()
+            data_size = size
+            if is_rf64 and size == 0xFFFFFFFF:
+                data_size = ds64_size
+            elif size in (0, 0xFFFFFFFF):  # streamed output, size not written
+                data_size = _remaining(f)
+            if fmt or data_size is None:
+                break
+            size = data_size
+        f.seek(size + (size & 1), 1)  # chunks are word aligned
+
+    if fmt is None or data_size is None:
+        return None
+
+    return PcmData(fmt, data_offset, data_size)
+
+
+def _read_w64(f: BinaryIO) -> Optional[PcmData]:
+    f.seek(24)
+    if f.read(16) != W64_WAVE:
+        return None
+
+    fmt: Optional[bytes] = None
+    data_offset = 0
+    data_size: Optional[int] = None
+    for _ in range(MAX_CHUNKS):
+        header = f.read(24)
+        if len(header) < 24:
+            break
+        guid, size = struct.unpack('<16sQ', header)
+        size -= 24  # size includes chunk header
+        if guid == W64_FMT:
+            fmt = f.read(size)
+            size = 0
+        elif guid == W64_DATA:
+            data_offset = f.tell()
+            data_size = size
+            if fmt:
+                break
+        f.seek(size + (-size % 8), 1)  # chunks are 8 byte aligned
+
+    if fmt is None or data_size is None:
+        return None
+
+    return PcmData(fmt, data_offset, data_size)
+
+
+def _read_flac(f: BinaryIO) -> Optional[dict]:
+    f.seek(0)
+    if f.read(3) == b'ID3':
+        # Skip ID3v2 tag, size is a 28 bit syncsafe integer
+        f.seek(6)
+        size = 0
+        for byte in f.read(4):
+            size = (size << 7) | (byte & 0x7F)
+        f.seek(10 + size)
+    else:
+        f.seek(0)
+
+    if f.read(4) != b'fLaC':
+        return None
+
+    block_header, info = f.read(4), f.read(34)
+    if len(block_header) < 4 or block_header[0] & 0x7F != 0 or len(info) < 34:  # STREAMINFO is always first
+        return None
+
+    # 20 bits sample rate, 3 bits channels - 1, 5 bits bps - 1, 36 bits total samples
+    packed = int.from_bytes(info[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x07) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    if not sample_rate or not total_samples:  # unknown length, let ffprobe estimate
+        return None
+
+    return _log(
+        codec='flac',
+        container='flac',
+        sample_rate=sample_rate,
+        channels=channels,
+        bits_per_sample=0,
+        bits_per_raw_sample=bits,
+        duration=total_samples / sample_rate
+    )
+
+
+def _pcm_log(data: Optional[PcmData], container: str) -> Optional[dict]:
+    """Returns log for a PCM data chunk"""
+    if not data or not data.codec or not data.channels \
+            or not data.sample_rate or not data.block_align:
+        return None
+
+    return _log(
+        codec=data.codec,
+        container=container,
+        sample_rate=data.sample_rate,
+        channels=data.channels,
+        bits_per_sample=data.bits,
+        bits_per_raw_sample=0,
+        duration=data.size // data.block_align / data.sample_rate
+    )
+
+
+def _pcm_codec(tag: int, bits: int) -> Optional[str]:
+    """Returns ffmpeg codec name for a given WAVE format tag"""
+    if tag == WAVE_FORMAT_PCM:
+        return {
+            8: 'pcm_u8',
+            16: 'pcm_s16le',
+            24: 'pcm_s24le',
+            32: 'pcm_s32le',
+        }.get(bits)
+    if tag == WAVE_FORMAT_IEEE_FLOAT:
+        return {
+            32: 'pcm_f32le',
+            64: 'pcm_f64le',
+        }.get(bits)
+
+    return None
+
+
+def _log(
+    codec: str,
+    container: str,
+    sample_rate: int,
+    channels: int,
+    bits_per_sample: int,
+    bits_per_raw_sample: int,
+    duration: float
+) -> dict:
+    """Returns a minimal ffprobe json log"""
+    stream = {
+        'index': 0,
+        'codec_name': codec,
+        'codec_type': 'audio',
+        'sample_rate': str(sample_rate),
+        'channels': channels,
+        'bits_per_sample': bits_per_sample,
+        'duration': '%.6f' % duration,
+    }
+    if bits_per_raw_sample:
+        stream['bits_per_raw_sample'] = str(bits_per_raw_sample)
+
+    return {
+        'streams': [stream],
+        'format': {
+            'format_name': container,
+            'duration': '%.6f' % duration,
+        }
+    }
+
+
+def _remaining(f: BinaryIO) -> int:
+    """Returns number of bytes between current position and end of file"""
+    position = f.tell()
+    end = f.seek(0, 2)
+    f.seek(position)
+    return end - position
@@ -0,0 +1,147 @@
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, cast
+
+from eat.utils.analysis import PcmAnalysis
+from eat.utils.ffprobe import AudioInfo
+from eat.utils.scratch import Reservation, Scratch
+from eat.utils.tempfile import get_temp_file
+
+Build = Callable[[List[Tuple['Intermediate', Path]]], None]  # writes intermediates to given paths
+
+
+class Demux:
+    """Intermediates of several tracks of an input, written together by a single pass over it"""
+
+    def __init__(self) -> None:
+        self.members: List[Intermediate] = []
+        self.lock = threading.Lock()
+
+
+class Intermediate:
+    """
+    Temp file shared by every job of an input that can consume it.
+    Intermediates of a demux are built together, by whichever of them is needed first
+    """
+
+    def __init__(
+        self,
+        suffix: str,
+        scratch: Scratch,
+        size: int,
+        file_info: AudioInfo,
+        resample_rate: Optional[int] = None,
+        swap: bool = False,
+        track: Optional[int] = None,
+        demux: Optional[Demux] = None
+    ) -> None:
+        self.path: Optional[Path] = None
+        self.analysis: Optional[PcmAnalysis] = None
+        self.file_info = file_info  # of the track it's made of
+        self.resample_rate = resample_rate
+        self.swap = swap  # channels are reordered for DEE
+        self.track = track  # audio track of the input, None = ffmpeg's default
+        self._suffix = suffix
+        self._scratch = scratch
+        self._size = size  # estimated, 0 if unknown
+        self._reservation: Optional[Reservation] = None
+        self._consumers = 0
+        self._demux = demux
+        self._lock = demux.lock if demux else threading.Lock()
+        if demux:
+            demux.members.append(self)
+
+    def add_consumer(self) -> None:
+        with self._lock:
+            self._consumers += 1
+
+    def acquire(self, build: Build) -> Path:
+        """Returns intermediate path, building it first if no other consumer did"""
+        reservation: Optional[Reservation] = None
+        while True:
+            with self._lock:
+                if self.path is not None:
+                    if reservation:
+                        reservation.release()  # another consumer (or demux member) built it meanwhile
+                    return self.path
+
+                group = [(self, reservation)] if reservation else self._try_reserve(self._pending())
+                if group is not None:
+                    self._build(build, group)
+                    return cast(Path, self.path)
+
+            # Space is waited for without the lock, other members of a demux need it to release theirs.
+            # Files of unknown size can't be safely placed in RAM
+            reservation = self._scratch.reserve(self._size, disk_only=not self._size)
+
+    def prepare(self, build: Build) -> bool:
+        """
+        Builds intermediate ahead of its consumers, if it fits into scratch space right away.
+        Returns False if it doesn't, it's then built once a consumer acquires it
+        """
+        with self._lock:
+            if self.path is None:
+                group = self._try_reserve(self._pending())
+                if group is None and self._demux:
+                    group = self._try_reserve([self])  # the whole demux doesn't fit
+                if group is None:
+                    return False
+                self._build(build, group)
+
+            return True
+
+    def _pending(self) -> List['Intermediate']:
+        """Returns this intermediate along with others of its demux that are needed and not built yet"""
+        if not self._demux:
+            return [self]
+
+        return [self, *(
+            member for member in self._demux.members
+            if member is not self and member.path is None and member._consumers > 0
+        )]
+
+    def _try_reserve(
+        self,
+        members: List['Intermediate']
+    ) -> Optional[List[Tuple['Intermediate', Reservation]]]:
+        """Reserves space for all of given intermediates right away, or for none of them"""
+        group: List[Tuple[Intermediate, Reservation]] = []
+        for member in members:
+            reservation = self._scratch.try_reserve(member._size, disk_only=not member._size)
+            if not reservation:
+                for _, reserved in group:
+                    reserved.release()
+                return None
+            group.append((member, reservation))
+
+        return group
+
+    @staticmethod
+    def _build(build: Build, group: List[Tuple['Intermediate', Reservation]]) -> None:
+        paths = []
+        for member, reservation in group:
+            reservation.path = get_temp_file(suffix=member._suffix, directory=reservation.directory)
+            paths.append(reservation.path)
+        try:
+            build([(member, path) for (member, _), path in zip(group, paths)])
+        except BaseException:
+            for (_, reservation), path in zip(group, paths):
+                if path.exists():
+                    path.unlink()
+                reservation.release()
+            raise
+
+        for (member, reservation), path in zip(group, paths):
+            member.path, member._reservation = path, reservation
+
+    def release(self) -> None:
+        """Marks one consumer as finished, the file is removed after the last one"""
+        with self._lock:
+            self._consumers -= 1
+            if self._consumers > 0 or self.path is None:
+                return
+
+            if self.path.exists():
+                self.path.unlink()
+            if self._reservation:
+                self._reservation.release()
@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, cast
+
+from eat.utils.scratch import pid_alive
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    args TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    batch INTEGER NOT NULL,
+    input TEXT NOT NULL,
+    encoder TEXT NOT NULL,
+    output TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    stages TEXT NOT NULL,
+    temp TEXT NOT NULL,
+    track INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch, state);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+'''
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+KEEP_BATCHES = 50  # only the most recent batches are kept
+
+
+class QueuedJob(NamedTuple):
+    id: int
+    input_path: Path
+    encoder_name: str
+    output_path: Path
+    track: Optional[int]  # with --tracks
+
+
+class QueuedBatch(NamedTuple):
+    id: int
+    created: float
+    args: dict
+    jobs: List[QueuedJob]  # not done yet
+
+
+class JobQueue:
+    """
+    Persistent record of batch jobs and their state (pending, running, done, failed),
+    with stage timestamps and temp files owned by each job, so that a batch can be resumed
+    and leftovers of jobs killed along with eat can be removed on the next run
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._path = path
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+            # Databases created before tracks could be selected
+            if 'track' not in [row[1] for row in db.execute('PRAGMA table_info(jobs)')]:
+                db.execute('ALTER TABLE jobs ADD COLUMN track INTEGER')
+
+    def create_batch(self, args: dict) -> int:
+        """Records a new batch with args needed to resume it, returns its id"""
+        with self._connect() as db:
+            batch_id = db.execute(
+                'INSERT INTO batches (created, host, pid, args) VALUES (?, ?, ?, ?)',
+                (time.time(), socket.gethostname(), os.getpid(), json.dumps(args))
+            ).lastrowid
+            self._prune(db)
+
+        return cast(int, batch_id)
+
+    def add(
+        self,
+        batch_id: int,
+        input_path: Path,
+        encoder_name: str,
+        output_path: Path,
+        track: Optional[int] = None
+    ) -> int:
+        """Adds a pending job to a batch, returns its id"""
+        with self._connect() as db:
+            return cast(int, db.execute(
+                'INSERT INTO jobs (batch, input, encoder, output, state, stages, temp, track) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (batch_id, str(input_path.resolve()), encoder_name, str(output_path.resolve()),
+                 PENDING, json.dumps(dict(queued=time.time())), '[]', track)
+            ).lastrowid)
+
+    def start(self, job_ids: List[int]) -> None:
+        self._update(job_ids, state=RUNNING, stage='started')
+
+    def stage(self, job_ids: List[int], name: str) -> None:
+        """Records start time of a job stage"""
+        self._update(job_ids, stage=name)
+
+    def own(self, job_ids: List[int], path: Path) -> None:
+        """Records a temp file or directory (or an output being written) to be removed if jobs get killed"""
+        self._update(job_ids, temp=path)
+
+    def finish(self, job_ids: List[int], error: Optional[str] = None) -> None:
+        self._update(job_ids, state=FAILED if error else DONE, stage='finished', error=error)
+
+    def resumable(self) -> Optional[QueuedBatch]:
+        """Returns the latest batch of this host with jobs left, if its eat process is gone"""
+        with self._connect() as db:
+            rows = db.execute(
+                'SELECT id, created, pid, args FROM batches WHERE host = ? AND EXISTS '
+                '(SELECT 1 FROM jobs WHERE jobs.batch = batches.id AND state != ?) '
+                'ORDER BY id DESC',
+                (socket.gethostname(), DONE)
+            ).fetchall()
+            row = next((row for row in rows if not pid_alive(row[2])), None)
+            if not row:
+                return None
+
+            jobs = db.execute(
+                'SELECT id, input, encoder, output, track FROM jobs WHERE batch = ? AND state != ? '
+                'ORDER BY id',
+                (row[0], DONE)
+            ).fetchall()
+
+        return QueuedBatch(
+            id=row[0],
+            created=row[1],
+            args=json.loads(row[3]),
+            jobs=[QueuedJob(job[0], Path(job[1]), job[2], Path(job[3]), job[4]) for job in jobs]
+        )
+
+    def take_over(self, batch_id: int) -> None:
+        """Marks a resumed batch as owned by this process"""
+        with self._connect() as db:
+            db.execute('UPDATE batches SET pid = ? WHERE id = ?', (os.getpid(), batch_id))
+            db.execute(
+                'UPDATE jobs SET state = ?, error = NULL WHERE batch = ? AND state != ?',
+                (PENDING, batch_id, DONE)
+            )
+
+    def recover(self) -> None:
+        """
+        Removes temp files and partial outputs of jobs that were running when their eat process died
+        and puts them back to pending. Outputs are only removed if they were owned, i.e. their encode started
+        """
+        with self._connect() as db:
+            rows = db.execute(
+                'SELECT jobs.id, jobs.output, jobs.temp, batches.pid FROM jobs '
+                'JOIN batches ON batches.id = jobs.batch WHERE state = ? AND host = ?',
+                (RUNNING, socket.gethostname())
+            ).fetchall()
+
+        orphans = [row for row in rows if not pid_alive(row[3])]
+        for job_id, output, temp, _ in orphans:
+            for path in map(Path, json.loads(temp)):
+                remove(path)
+            self.logger.debug('Removed leftovers of interrupted job %s ("%s")', job_id, output)
+
+        if orphans:
+            with self._connect() as db:
+                db.executemany(
+                    "UPDATE jobs SET state = ?, error = 'interrupted', temp = '[]' WHERE id = ?",
+                    [(PENDING, row[0]) for row in orphans]
+                )
+
+    def _update(
+        self,
+        job_ids: List[int],
+        state: Optional[str] = None,
+        stage: Optional[str] = None,
+        temp: Optional[Path] = None,
+        error: Optional[str] = None
+    ) -> None:
+        if not job_ids:
+            return
+
+        with self._connect() as db:
+            for job_id in job_ids:
+                row = db.execute('SELECT stages, temp FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if not row:
+                    continue
+
+                stages: Dict[str, float] = json.loads(row[0])
+                temps: List[str] = json.loads(row[1])
+                if stage:
+                    stages[stage] = time.time()
+                if temp:
+                    temps.append(str(temp))
+                if state in (DONE, FAILED):
+                    temps = []  # removed by the job itself
+                db.execute(
+                    'UPDATE jobs SET state = COALESCE(?, state), error = COALESCE(?, error), '
+                    'stages = ?, temp = ? WHERE id = ?',
+                    (state, error, json.dumps(stages), json.dumps(temps), job_id)
+                )
+
+    @staticmethod
+    def _prune(db: sqlite3.Connection) -> None:
+        """Removes batches beyond the most recent ones"""
+        db.execute(
+            'DELETE FROM batches WHERE id NOT IN (SELECT id FROM batches ORDER BY id DESC LIMIT ?)',
+            (KEEP_BATCHES,)
+        )
+        db.execute('DELETE FROM jobs WHERE batch NOT IN (SELECT id FROM batches)')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self._path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+def remove(path: Path) -> None:
+    """Removes a file or directory, if it still exists"""
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    elif path.exists():
+        path.unlink()
+
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from eat.utils.scratch import pid_alive
+
+
+class Lease:
+    """Claim on a job, kept alive by heartbeats while it's held"""
+
+    def __init__(self, key: str, path: Path, on_lost: Callable[[], None]) -> None:
+        self.key = key
+        self.path = path
+        self.lost = False  # taken over by another node, which thought this one was dead
+        self.on_lost = on_lost
+
+
+class LeaseDir:
+    """
+    Job claims shared by processes on any number of machines through a directory (e.g. on NFS),
+    with no coordinator. A job is claimed by creating its lease file (`<key>.<generation>`),
+    which only one process can do. The holder touches it periodically, a lease left unchanged
+    for `timeout` seconds belongs to a dead node and is taken over by creating the next generation.
+    Staleness is measured by each node's own clock, so clocks of the nodes don't have to agree.
+    Finished jobs get a marker in done/ or failed/
+    """
+
+    def __init__(self, path: Path, timeout: float = 60.0) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._leases = path / 'leases'
+        self._done = path / 'done'
+        self._failed = path / 'failed'
+        for directory in (self._leases, self._done, self._failed):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self._timeout = timeout
+        self._host = socket.gethostname()
+        self.node = f'{self._host}_{os.getpid()}'
+        self._held: Dict[str, Lease] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+        # State of the directory as of the last refresh
+        self._finished: Set[str] = set()
+        self._generations: Dict[str, List[int]] = {}
+        self._observed: Dict[str, Tuple[int, float]] = {}  # lease file: mtime, unchanged since
+
+    def __enter__(self) -> 'LeaseDir':
+        self._heartbeat = threading.Thread(target=self._beat, name='eat-heartbeat', daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        self._stopping.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        for lease in [*self._held.values()]:
+            self.release(lease)
+
+    def refresh(self) -> None:
+        """Lists finished jobs and current leases"""
+        self._finished = {
+            entry.name for directory in (self._done, self._failed)
+            for entry in os.scandir(directory) if not entry.name.startswith('.')
+        }
+        self._generations = {}
+        for entry in os.scandir(self._leases):
+            key, _, generation = entry.name.rpartition('.')
+            if key and not entry.name.startswith('.') and generation.isdigit():
+                self._generations.setdefault(key, []).append(int(generation))
+
+    def finished(self, key: str) -> bool:
+        return key in self._finished
+
+    def failed(self, key: str) -> Optional[str]:
+        """Returns error of a failed job"""
+        try:
+            return str(json.loads((self._failed / key).read_text()).get('error') or 'unknown error')
+        except (OSError, ValueError):
+            return None
+
+    def claim(self, key: str, info: Dict[str, Any], on_lost: Callable[[], None]) -> Optional[Lease]:
+        """
+        Claims a job that isn't finished or held by a live node, returns None if that's not possible.
+        `on_lost` is called (from the heartbeat thread) if another node takes the job over
+        """
+        if key in self._finished:
+            return None
+
+        generations = sorted(self._generations.get(key, []))
+        generation, holder = 0, None
+        if generations:
+            current = self._leases / f'{key}.{generations[-1]}'
+            holder = self._expired(current)
+            if not holder:
+                return None
+            generation = generations[-1] + 1
+
+        path = self._leases / f'{key}.{generation}'
+        if not self._create(path, dict(info, node=self.node, claimed=time.time()), replace=False):
+            return None
+
+        # Finished (and released) by someone else since the last refresh
+        if (self._done / key).exists() or (self._failed / key).exists():
+            path.unlink()
+            return None
+
+        if holder:
+            self.logger.info('Taking over "%s" from %s, its lease expired', info.get('input', key), holder)
+        for old in generations:
+            try:
+                (self._leases / f'{key}.{old}').unlink()
+            except FileNotFoundError:
+                pass
+
+        lease = Lease(key, path, on_lost)
+        with self._lock:
+            self._held[key] = lease
+        return lease
+
+    def release(self, lease: Lease) -> None:
+        """Gives up a job, so that others can claim it right away"""
+        with self._lock:
+            self._held.pop(lease.key, None)
+        try:
+            lease.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def finish(self, lease: Lease, error: Optional[str] = None) -> None:
+        """Marks a job done (or failed), then releases it"""
+        directory = self._failed if error else self._done
+        data = dict(node=self.node, finished=time.time(), error=error)
+        self._create(directory / lease.key, data, replace=True)
+        self._finished.add(lease.key)
+        self.release(lease)
+
+    def _create(self, path: Path, data: Dict[str, Any], replace: bool) -> bool:
+        """
+        Creates a file with complete content at once, returns False if it exists and isn't replaced.
+        Content is written to a temp file which is then linked, as exclusive create isn't atomic on old NFS
+        """
+        temp = path.with_name(f'.{self.node}_{uuid.uuid4().hex}')
+        temp.write_text(json.dumps(data))
+        try:
+            if replace:
+                os.replace(temp, path)
+            else:
+                os.link(temp, path)
+        except FileExistsError:
+            return False
+        finally:
+            if not replace:
+                temp.unlink()
+
+        return True
+
+    def _expired(self, path: Path) -> Optional[str]:
+        """Returns holder of a lease if it's expired"""
+        try:
+            # Opening revalidates cached attributes on NFS (close-to-open consistency)
+            with path.open() as f:
+                mtime = os.fstat(f.fileno()).st_mtime_ns
+                info = json.loads(f.read() or '{}')
+        except FileNotFoundError:  # released or taken over meanwhile
+            return None
+        except ValueError:
+            info = {}
+
+        holder = str(info.get('node', 'unknown node'))
+        host, _, pid = holder.rpartition('_')
+        if host == self._host and pid.isdigit() and int(pid) != os.getpid() and not pid_alive(int(pid)):
+            return holder
+
+        now = time.monotonic()
+        state = self._observed.get(path.name)
+        if not state or state[0] != mtime:
+            self._observed[path.name] = (mtime, now)
+            return None
+
+        return holder if now - state[1] >= self._timeout else None
+
+    def _beat(self) -> None:
+        """Touches held leases, a lease that's gone was taken over"""
+        while not self._stopping.wait(self._timeout / 4):
+            with self._lock:
+                leases = [*self._held.values()]
+
+            for lease in leases:
+                try:
+                    os.utime(lease.path)
+                except OSError:
+                    with self._lock:
+                        if self._held.get(lease.key) is not lease:
+                            continue  # released meanwhile
+                        del self._held[lease.key]
+                    lease.lost = True
+                    self.logger.warning('Lease "%s" was taken over by another node', lease.path.name)
+                    lease.on_lost()
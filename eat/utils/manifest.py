@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outputs (
+    output TEXT PRIMARY KEY,
+    written TEXT NOT NULL,
+    written_size INTEGER NOT NULL,
+    written_mtime INTEGER NOT NULL,
+    input TEXT NOT NULL,
+    input_size INTEGER NOT NULL,
+    input_mtime INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    settings TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_input ON outputs (input);
+CREATE INDEX IF NOT EXISTS outputs_content ON outputs (content, settings);
+'''
+
+SAMPLES = 16  # blocks hashed per file, evenly spread (first and last included)
+SAMPLE_SIZE = 1 << 16
+
+
+class Manifest:
+    """
+    Record of outputs written in incremental mode, each output is stored
+    with a fingerprint of its input (size, mtime and a sampled content hash)
+    and the settings (encoder, params, eat version) it was encoded with
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._path = path
+        self._hashes: Dict[Tuple[str, int, int], str] = {}  # computed in this run
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    def fingerprint(self, file: Path) -> str:
+        """
+        Returns content fingerprint of an input file,
+        files with unchanged size and mtime reuse the recorded one without reading them
+        """
+        stat = file.stat()
+        key = (str(file.resolve()), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            with self._connect() as db:
+                row = db.execute(
+                    'SELECT content FROM outputs WHERE input = ? AND input_size = ? AND input_mtime = ?',
+                    key
+                ).fetchone()
+            self._hashes[key] = str(row[0]) if row else content_hash(file)
+
+        return self._hashes[key]
+
+    def knows(self, output: Path) -> bool:
+        """Checks whether an output was written in incremental mode before"""
+        with self._connect() as db:
+            return db.execute(
+                'SELECT 1 FROM outputs WHERE output = ?',
+                (str(output.resolve()),)
+            ).fetchone() is not None
+
+    def current(self, output: Path, content: str, settings: str) -> Optional[Path]:
+        """Returns file written for an output, if it's up to date with given input and settings"""
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT written, written_size, written_mtime FROM outputs '
+                'WHERE output = ? AND content = ? AND settings = ?',
+                (str(output.resolve()), content, settings)
+            ).fetchone()
+
+        return _unchanged(row)
+
+    def find(self, content: str, settings: str) -> Optional[Path]:
+        """Returns any unchanged output written from the same content with the same settings"""
+        with self._connect() as db:
+            rows = db.execute(
+                'SELECT written, written_size, written_mtime FROM outputs '
+                'WHERE content = ? AND settings = ?',
+                (content, settings)
+            ).fetchall()
+
+        for row in rows:
+            written = _unchanged(row)
+            if written:
+                return written
+
+        return None
+
+    def put(self, output: Path, written: Path, input_path: Path, content: str, settings: str) -> None:
+        """Records a written output"""
+        written_stat, input_stat = written.stat(), input_path.stat()
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (str(output.resolve()), str(written.resolve()),
+                 written_stat.st_size, written_stat.st_mtime_ns,
+                 str(input_path.resolve()), input_stat.st_size, input_stat.st_mtime_ns,
+                 content, settings)
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Connections can't be shared between threads, and opening one is cheap
+        db = sqlite3.connect(self._path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+def content_hash(file: Path) -> str:
+    """Returns a hash of file size and blocks sampled across the whole file"""
+    size = file.stat().st_size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with file.open(mode='rb') as f:
+        if size <= SAMPLES * SAMPLE_SIZE:
+            digest.update(f.read())
+        else:
+            step = (size - SAMPLE_SIZE) // (SAMPLES - 1)
+            for index in range(SAMPLES):
+                f.seek(index * step)
+                digest.update(f.read(SAMPLE_SIZE))
+
+    return digest.hexdigest()
+
+
+def _unchanged(row: Optional[tuple]) -> Optional[Path]:
+    """Returns path of a recorded output if it still exists unmodified"""
+    if not row:
+        return None
+
+    written = Path(row[0])
+    try:
+        stat = written.stat()
+    except OSError:
+        return None
+
+    return written if (stat.st_size, stat.st_mtime_ns) == (row[1], row[2]) else None
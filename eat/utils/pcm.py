@@ -0,0 +1,231 @@
+import errno
+import importlib.util
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Callable, List, Optional, Sequence, Tuple
+
+from eat.utils.header import WAVE_FORMAT_EXTENSIBLE, PcmData, read_pcm_data
+
+if TYPE_CHECKING:
+    import numpy
+
+# KSDATAFORMAT_SUBTYPE_PCM, without the leading format tag
+PCM_SUBFORMAT = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+# Channel masks ffmpeg writes for standard layouts, used for inputs that don't have one
+CHANNEL_MASKS = {
+    1: 0x4,
+    2: 0x3,
+    6: 0x60F,
+    8: 0x63F,
+}
+
+BLOCK_FRAMES = 1 << 16  # frames copied per block
+COPY_SIZE = 1 << 26  # bytes copied per kernel call
+ALIGNMENT = 4096  # filesystem block size assumed for extent sharing
+
+
+def rf64_header(data: PcmData, align: int = 0) -> bytes:
+    """
+    Returns an RF64 header (with ds64 and WAVE_FORMAT_EXTENSIBLE fmt chunks) for given PCM data,
+    if align is set, a JUNK chunk is added so that header size equals align modulo ALIGNMENT
+    """
+    fmt = struct.pack(
+        '<HHIIHHHHIH14s',
+        WAVE_FORMAT_EXTENSIBLE,
+        data.channels,
+        data.sample_rate,
+        data.sample_rate * data.block_align,
+        data.block_align,
+        data.bits,
+        22,  # extension size
+        data.bits,  # valid bits per sample
+        data.channel_mask or CHANNEL_MASKS.get(data.channels, 0),  # plain WAV has no mask
+        1,  # WAVE_FORMAT_PCM
+        PCM_SUBFORMAT
+    )
+    header_size = 12 + (8 + 28) + (8 + len(fmt)) + 8
+    junk = b''
+    if align:
+        padding = (align - header_size - 8) % ALIGNMENT
+        junk = b'JUNK' + struct.pack('<I', padding) + bytes(padding)
+        header_size += len(junk)
+
+    ds64 = struct.pack(
+        '<QQQI',
+        header_size - 8 + data.size,  # RIFF size
+        data.size,
+        data.size // data.block_align,  # sample count
+        0  # table length
+    )
+    return b''.join((
+        b'RF64', struct.pack('<I', 0xFFFFFFFF), b'WAVE',
+        b'ds64', struct.pack('<I', len(ds64)), ds64,
+        b'fmt ', struct.pack('<I', len(fmt)), fmt,
+        junk,
+        b'data', struct.pack('<I', 0xFFFFFFFF)
+    ))
+
+
+def reorder_pcm(
+    input_path: Path,
+    output_path: Path,
+    order: Sequence[int],
+    progress: Optional[Callable[[int, int], None]] = None
+) -> bool:
+    """
+    Copies integer PCM samples of a WAV/RF64/W64 file into a new RF64 file,
+    output channel n is taken from input channel order[n].
+    Input is memory-mapped and samples are moved in blocks with numpy, without decoding them.
+    Returns False if input isn't supported or numpy isn't installed (caller should use ffmpeg instead,
+    which is faster than reordering in pure Python)
+    """
+    if not importlib.util.find_spec('numpy'):
+        return False
+    data = read_pcm_data(input_path)
+    if not data or not data.codec or data.codec.startswith('pcm_f') \
+            or data.codec == 'pcm_u8' or sorted(order) != list(range(data.channels)):
+        return False
+
+    size = min(data.size, input_path.stat().st_size - data.offset)
+    size -= size % data.block_align
+    data.size = size
+
+    with input_path.open(mode='rb') as src, output_path.open(mode='wb') as dst:
+        dst.write(rf64_header(data))
+        if not size:
+            return True
+
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as src_map:
+            step = BLOCK_FRAMES * data.block_align
+            for start in range(0, size, step):
+                end = min(start + step, size)
+                dst.write(_reorder(src_map, data.offset + start, end - start, data, order))
+                if progress:
+                    progress(end, size)
+
+    return True
+
+
+def rewrap_pcm(
+    input_path: Path,
+    output_path: Path,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> bool:
+    """
+    Copies integer PCM samples of a WAV/RF64/W64 file into a new RF64 file unchanged.
+    Only the header is written here, samples are copied by the kernel (copy_file_range,
+    which lets copy-on-write filesystems share extents, or sendfile),
+    data is kept at the same offset within filesystem blocks to make that possible.
+    Returns False if input isn't supported (caller should use ffmpeg instead)
+    """
+    data = read_pcm_data(input_path)
+    if not data or not data.codec or data.codec.startswith('pcm_f') or data.codec == 'pcm_u8':
+        return False
+
+    size = min(data.size, input_path.stat().st_size - data.offset)
+    size -= size % data.block_align
+    data.size = size
+
+    with input_path.open(mode='rb') as src, output_path.open(mode='wb') as dst:
+        dst.write(rf64_header(data, align=data.offset % ALIGNMENT or ALIGNMENT))
+        dst.flush()
+        _copy_range(src, dst, data.offset, size, progress)
+
+    return True
+
+
+def _copy_range(
+    src: BinaryIO,
+    dst: BinaryIO,
+    offset: int,
+    size: int,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> None:
+    """Appends size bytes of src starting at offset to dst, using the fastest method available"""
+    copy = _copy_file_range if hasattr(os, 'copy_file_range') else _sendfile
+    done = 0
+    while done < size:
+        try:
+            copied = copy(src, dst, offset + done, min(COPY_SIZE, size - done))
+        except OSError as e:
+            # Not supported by kernel or filesystem (or across filesystems)
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            if copy is _copy_file_range:
+                copy = _sendfile
+            elif copy is _sendfile:
+                copy = _read_write
+            else:
+                raise
+            continue
+
+        if not copied:
+            raise OSError(errno.EIO, 'Unexpected end of file', src.name)
+        done += copied
+        if progress:
+            progress(done, size)
+
+
+def _copy_file_range(src: BinaryIO, dst: BinaryIO, offset: int, size: int) -> int:
+    return os.copy_file_range(src.fileno(), dst.fileno(), size, offset)
+
+
+def _sendfile(src: BinaryIO, dst: BinaryIO, offset: int, size: int) -> int:
+    return os.sendfile(dst.fileno(), src.fileno(), offset, size)
+
+
+def _read_write(src: BinaryIO, dst: BinaryIO, offset: int, size: int) -> int:
+    src.seek(offset)
+    return os.write(dst.fileno(), src.read(size))
+
+
+def _runs(order: Sequence[int]) -> List[Tuple[int, int, int]]:
+    """Groups channel order into (output channel, input channel, length) runs of adjacent channels"""
+    runs: List[Tuple[int, int, int]] = []
+    for channel, source in enumerate(order):
+        if runs and runs[-1][1] + runs[-1][2] == source:
+            runs[-1] = (runs[-1][0], runs[-1][1], runs[-1][2] + 1)
+        else:
+            runs.append((channel, source, 1))
+
+    return runs
+
+
+def _reorder(
+    src: mmap.mmap,
+    offset: int,
+    size: int,
+    data: PcmData,
+    order: Sequence[int]
+) -> bytes:
+    """Reorders a block by copying whole runs of adjacent channels as opaque fields"""
+    import numpy
+
+    width = data.bits // 8
+    runs = _runs(order)
+    names = [f'run{index}' for index in range(len(runs))]
+    formats = [f'V{length * width}' for _, _, length in runs]
+
+    def layout(offsets: List[int]) -> 'numpy.dtype':
+        return numpy.dtype({
+            'names': names,
+            'formats': formats,
+            'offsets': offsets,
+            'itemsize': data.block_align
+        })
+
+    block = numpy.frombuffer(
+        src,
+        dtype=layout([source * width for _, source, _ in runs]),
+        count=size // data.block_align,
+        offset=offset
+    )
+    out = numpy.empty(block.shape, dtype=layout([channel * width for channel, _, _ in runs]))
+    for name in names:
+        out[name] = block[name]
+
+    return out.tobytes()
+
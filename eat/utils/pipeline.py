@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from typing import Optional
+
+
+class Lookahead:
+    """Limits how many jobs are prepared ahead of their encodes"""
+
+    def __init__(self, size: int) -> None:
+        self._free = size
+        self._aborted = False
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Waits for a free slot, raises CancelledError if the run is aborted meanwhile"""
+        with self._condition:
+            while not self._free and not self._aborted:
+                self._condition.wait()
+            if self._aborted:
+                raise CancelledError
+            self._free -= 1
+
+    def release(self) -> None:
+        with self._condition:
+            self._free += 1
+            self._condition.notify()
+
+    def abort(self) -> None:
+        with self._condition:
+            self._aborted = True
+            self._condition.notify_all()
+
+
+class Pipeline:
+    """
+    Threads of the stages of a run other than encoding (which runs on the caller's executor):
+    probing inputs, preparing intermediates ahead of encodes and cleaning up after them
+    """
+
+    def __init__(self, probe_jobs: int, prepare_jobs: int, lookahead: int) -> None:
+        self.probe = ThreadPoolExecutor(max_workers=max(1, probe_jobs), thread_name_prefix='eat-probe')
+        self.prepare = ThreadPoolExecutor(max_workers=max(1, prepare_jobs), thread_name_prefix='eat-prepare')
+        self.clean_up = ThreadPoolExecutor(max_workers=1, thread_name_prefix='eat-clean-up')
+        self.lookahead: Optional[Lookahead] = Lookahead(lookahead) if lookahead > 0 else None
+
+    def abort(self) -> None:
+        """Stops preparations waiting for a lookahead slot"""
+        if self.lookahead:
+            self.lookahead.abort()
+
+    def shutdown(self) -> None:
+        """Waits for running stages"""
+        for stage in (self.probe, self.prepare, self.clean_up):
+            stage.shutdown()
@@ -1,65 +1,343 @@
+import asyncio
+import codecs
+import concurrent.futures
 import logging
-import subprocess
+import os
+import re
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import Callable, List, Optional, Tuple, Union, cast
+from typing import (
+    Any, AsyncIterator, Callable, Coroutine, Dict, Iterator, List, Optional, Set, Tuple, TypeVar,
+    Union
+)
+
+T = TypeVar('T')
+
+LineHandler = Callable[[str], None]
+
+READ_SIZE = 1 << 16
+LINE_SPLIT = re.compile(r'\r\n|\r|\n')  # progress lines are often terminated with \r only
 
 
 class ProcessingError(RuntimeError):
     pass
 
 
-class Processor:
-    """Utility wrapper around subprocess"""
+_limits: Dict[str, int] = {}
+_semaphores: Dict[str, asyncio.Semaphore] = {}  # created on the event loop, lazily
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_local = threading.local()
+
+
+def set_process_limit(name: str, limit: int) -> None:
+    """Limits the number of simultaneously running processes for a given binary name"""
+    if limit > 0:
+        _limits[name] = limit
+    else:
+        _limits.pop(name, None)
+    _semaphores.pop(name, None)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the event loop all child processes run on,
+    it's started in a background thread on first use and shared by all jobs
+    """
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='eat-processes', daemon=True).start()
+
+    return _loop
+
+
+class CancelScope:
+    """
+    Processes started by threads running in a scope (see cancel_scope),
+    cancelling it kills them and makes further process calls fail with CancelledError
+    """
 
     def __init__(self) -> None:
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._futures: Set[concurrent.futures.Future] = set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            futures = [*self._futures]
+
+        for future in futures:
+            future.cancel()
+
+    def add(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self._futures.add(future)
+            cancelled = self.cancelled
+        if cancelled:
+            future.cancel()
+
+    def discard(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+
+
+@contextmanager
+def cancel_scope(scope: Optional[CancelScope]) -> Iterator[None]:
+    """Runs process calls of this thread in a given scope"""
+    previous = getattr(_local, 'scope', None)
+    _local.scope = scope
+    try:
+        yield
+    finally:
+        _local.scope = previous
+
+
+class Processor:
+    """
+    Utility wrapper around asyncio subprocesses,
+    coroutines can be awaited on the shared loop (see get_loop),
+    call_* methods run them from any other thread and block until they finish
+    """
+
+    def __init__(self, name: Optional[str] = None) -> None:
         self.logger = logging.getLogger(__name__)
+        self._name = name  # binary name used for concurrency limits
 
     def call_process(
         self,
         params: List[Union[str, Path]],
-        success_codes: Tuple[int] = (0,)
+        success_codes: Tuple[int, ...] = (0,)
     ) -> None:
         """Calls process without surpressing the output"""
-        self.logger.debug('Starting "%s" with params:', params[0])
-        self.logger.debug([*map(str, params)])
-
-        process = subprocess.Popen(params)
-        ret_code = process.wait()
-
-        if ret_code not in success_codes:
-            raise ProcessingError('Process at "%s" exited with return code %s' % (
-                params[0],
-                ret_code
-            ))
+        self._run_sync(self.run_process(params, passthrough=True, success_codes=success_codes))
 
     def call_process_output(
         self,
         params: List[Union[str, Path]],
-        output_handler: Optional[Callable[[subprocess.Popen], None]] = None,
-        success_codes: Tuple[int] = (0,)
+        stdout_handler: Optional[LineHandler] = None,
+        stderr_handler: Optional[LineHandler] = None,
+        success_codes: Tuple[int, ...] = (0,)
     ) -> None:
         """
         Calls process surpressing the output,
-        optionally piping it to a provided handler function
+        lines of each stream are passed to its handler (or logged without one)
+        """
+        self._run_sync(self.run_process(
+            params,
+            stdout_handler=stdout_handler,
+            stderr_handler=stderr_handler,
+            success_codes=success_codes
+        ))
+
+    def call_processes(
+        self,
+        params: List[List[Union[str, Path]]],
+        stdout_handlers: List[Optional[LineHandler]],
+        success_codes: Tuple[int, ...] = (0,)
+    ) -> None:
+        """
+        Calls processes concurrently (within the binary's process limit), surpressing the output,
+        if one of them fails the others are killed
         """
+        async def run_all() -> None:
+            tasks = [
+                asyncio.ensure_future(self.run_process(
+                    process_params,
+                    stdout_handler=handler,
+                    success_codes=success_codes
+                ))
+                for process_params, handler in zip(params, stdout_handlers)
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+        self._run_sync(run_all())
+
+    def call_pipeline(
+        self,
+        source_params: List[Union[str, Path]],
+        params: List[Union[str, Path]],
+        source_name: str,
+        source_handler: Optional[LineHandler] = None,
+        success_codes: Tuple[int, ...] = (0,)
+    ) -> None:
+        """
+        Calls source process piping its stdout into a second process,
+        source_handler receives lines of source stderr for progress reporting,
+        second process output is only logged
+        """
+        self._run_sync(self.run_pipeline(
+            source_params,
+            params,
+            source_name,
+            source_handler=source_handler,
+            success_codes=success_codes
+        ))
+
+    async def run_process(
+        self,
+        params: List[Union[str, Path]],
+        stdout_handler: Optional[LineHandler] = None,
+        stderr_handler: Optional[LineHandler] = None,
+        passthrough: bool = False,
+        success_codes: Tuple[int, ...] = (0,)
+    ) -> None:
+        """Runs a process, reading its output without blocking the loop"""
         self.logger.debug('Starting "%s" with params:', params[0])
         self.logger.debug([*map(str, params)])
 
-        process = subprocess.Popen(
-            params,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            encoding='utf-8',
-            errors='ignore'
-        )
-        if output_handler:
-            output_handler(process)
-
-        ret_code = process.wait()
-
-        if ret_code not in success_codes:
+        pipe = None if passthrough else asyncio.subprocess.PIPE
+        async with self._slot():
+            process = await asyncio.create_subprocess_exec(*params, stdout=pipe, stderr=pipe)
+            try:
+                await asyncio.gather(
+                    self._read_lines(process.stdout, stdout_handler),
+                    self._read_lines(process.stderr, stderr_handler)
+                )
+                ret_code = await process.wait()
+            except BaseException:
+                _kill(process)
+                raise
+
+        self._check(params[0], ret_code, success_codes)
+
+    async def run_pipeline(
+        self,
+        source_params: List[Union[str, Path]],
+        params: List[Union[str, Path]],
+        source_name: str,
+        source_handler: Optional[LineHandler] = None,
+        success_codes: Tuple[int, ...] = (0,)
+    ) -> None:
+        """Runs source process piped into a second process, audio doesn't pass through Python"""
+        self.logger.debug('Starting "%s" | "%s" with params:', source_params[0], params[0])
+        self.logger.debug([*map(str, source_params)])
+        self.logger.debug([*map(str, params)])
+
+        # Slots are always taken in the same order, so pipelines can't deadlock
+        async with self._slot(source_name), self._slot():
+            read_fd, write_fd = os.pipe()
+            try:
+                source = await asyncio.create_subprocess_exec(
+                    *source_params,
+                    stdout=write_fd,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        *params,
+                        stdin=read_fd,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.STDOUT
+                    )
+                except BaseException:
+                    _kill(source)
+                    raise
+            finally:
+                # Only the child processes should hold the pipe, so they get SIGPIPE/EOF properly
+                os.close(read_fd)
+                os.close(write_fd)
+
+            try:
+                await asyncio.gather(
+                    self._read_lines(source.stderr, source_handler),
+                    self._read_lines(process.stdout, None)
+                )
+                source_code = await source.wait()
+                ret_code = await process.wait()
+            except BaseException:
+                _kill(source)
+                _kill(process)
+                raise
+
+        self._check(source_params[0], source_code, success_codes)
+        self._check(params[0], ret_code, success_codes)
+
+    @asynccontextmanager
+    async def _slot(self, name: Optional[str] = None) -> AsyncIterator[None]:
+        """Holds a process slot for a binary (default: own binary)"""
+        name = name or self._name
+        if name not in _limits:
+            yield
+            return
+
+        if name not in _semaphores:
+            _semaphores[name] = asyncio.Semaphore(_limits[name])
+        async with _semaphores[name]:
+            yield
+
+    async def _read_lines(
+        self,
+        stream: Optional[asyncio.StreamReader],
+        handler: Optional[LineHandler]
+    ) -> None:
+        """Passes stream lines to handler as they arrive, logs them if there's no handler"""
+        if stream is None:
+            return
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        buffer = ''
+        while True:
+            chunk = await stream.read(READ_SIZE)
+            buffer += decoder.decode(chunk, final=not chunk)
+            *lines, buffer = LINE_SPLIT.split(buffer)
+            if not chunk:
+                lines.append(buffer)
+            for line in lines:
+                if line:
+                    (handler or self._log_line)(line)
+            if not chunk:
+                return
+
+    def _log_line(self, line: str) -> None:
+        """Logs process output, errors are shown to the user"""
+        self.logger.debug(line.rstrip())
+        if 'error' in line.lower():
+            self.logger.error(line.rstrip())
+
+    @staticmethod
+    def _check(binary: Union[str, Path], code: int, success_codes: Tuple[int, ...]) -> None:
+        if code not in success_codes:
             raise ProcessingError('Process at "%s" exited with return code %s' % (
-                params[0],
-                ret_code
+                binary,
+                code
             ))
+
+    @staticmethod
+    def _run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+        """Runs a coroutine on the shared loop, blocking until it's done (or its scope is cancelled)"""
+        scope: Optional[CancelScope] = getattr(_local, 'scope', None)
+        if scope and scope.cancelled:
+            coroutine.close()
+            raise concurrent.futures.CancelledError
+
+        future = asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+        if scope:
+            scope.add(future)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            if scope:
+                scope.discard(future)
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,155 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from rich.progress import Progress, TaskID
+
+# Receives (task id, description, completed, total) of every task update
+ProgressCallback = Callable[[TaskID, str, float, Optional[float]], None]
+
+_lock = threading.Lock()
+_progress: Optional['TrackedProgress'] = None
+_users = 0
+_display = False  # bars are only drawn for the command line, not when eat is used as a library
+_local = threading.local()
+
+
+def set_display(enabled: bool) -> None:
+    """Enables drawing progress bars in the terminal"""
+    global _display
+    _display = enabled
+
+
+def is_displayed() -> bool:
+    return _display
+
+
+@contextmanager
+def report_progress(callback: Optional[ProgressCallback]) -> Iterator[None]:
+    """Forwards updates of progress tasks added by this thread to a callback"""
+    previous = getattr(_local, 'callback', None)
+    _local.callback = callback
+    try:
+        yield
+    finally:
+        _local.callback = previous
+
+
+@contextmanager
+def forward_progress(callback: Optional[ProgressCallback]) -> Iterator[None]:
+    """Forwards updates of progress tasks added by this thread to a callback, besides the current one"""
+    previous: Optional[ProgressCallback] = getattr(_local, 'callback', None)
+    if not previous or not callback:
+        with report_progress(previous or callback):
+            yield
+        return
+
+    first: ProgressCallback = previous
+    second: ProgressCallback = callback
+
+    def both(task_id: TaskID, description: str, completed: float, total: Optional[float]) -> None:
+        first(task_id, description, completed, total)
+        second(task_id, description, completed, total)
+
+    with report_progress(both):
+        yield
+
+
+class TrackedProgress(Progress):
+    """
+    Rich progress forwarding task updates to callbacks of threads that added them,
+    updates come from process output handlers running on another thread
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._callbacks: Dict[TaskID, ProgressCallback] = {}
+
+    def add_task(self, *args: Any, **kwargs: Any) -> TaskID:
+        task_id = super().add_task(*args, **kwargs)
+        callback = getattr(_local, 'callback', None)
+        if callback:
+            self._callbacks[task_id] = callback
+            self._report(task_id)
+
+        return task_id
+
+    def update(self, task_id: TaskID, *args: Any, **kwargs: Any) -> None:
+        super().update(task_id, *args, **kwargs)
+        self._report(task_id)
+
+    def remove_task(self, task_id: TaskID) -> None:
+        self._callbacks.pop(task_id, None)
+        super().remove_task(task_id)
+
+    def _report(self, task_id: TaskID) -> None:
+        callback = self._callbacks.get(task_id)
+        if callback:
+            with self._lock:
+                task = self._tasks[task_id]
+                description, completed, total = task.description, task.completed, task.total
+            callback(task_id, description, completed, total)
+
+
+@contextmanager
+def shared_progress() -> Iterator[Progress]:
+    """
+    Returns a process-wide Rich progress display,
+    Rich only allows one live display at a time, so concurrent jobs have to share it
+    """
+    global _progress, _users
+
+    with _lock:
+        if _progress is None:
+            _progress = TrackedProgress(disable=not _display)
+            _progress.start()
+        _users += 1
+        progress = _progress
+
+    try:
+        yield progress
+    finally:
+        with _lock:
+            _users -= 1
+            if not _users:
+                progress.stop()
+                _progress = None
+
+
+class Batch:
+    """Aggregate progress of all jobs in a run, shown above per-process bars"""
+
+    def __init__(self, progress: Progress) -> None:
+        self._progress = progress
+        self._task: TaskID = progress.add_task('Batch', total=0, visible=False)
+        self._lock = threading.Lock()
+        self._total = 0
+        self._done = 0
+
+    def add(self, jobs: int) -> None:
+        """Adds planned jobs to the batch"""
+        with self._lock:
+            self._total += jobs
+            self._update()
+
+    def done(self) -> None:
+        """Marks a single job as finished"""
+        with self._lock:
+            self._done += 1
+            self._update()
+
+    def _update(self) -> None:
+        self._progress.update(
+            task_id=self._task,
+            description=f'Batch ({self._done}/{self._total} jobs)',
+            total=self._total,
+            completed=self._done,
+            visible=self._total > 1  # a single job has its own bars already
+        )
+
+
+@contextmanager
+def batch_progress() -> Iterator[Batch]:
+    """Keeps the shared display running for a whole batch, with an aggregate bar on top"""
+    with shared_progress() as progress:
+        yield Batch(progress)
@@ -0,0 +1,121 @@
+import collections
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+AUTO = 0  # `-j auto`, concurrency is tuned while encoding
+CPU_COUNT = os.cpu_count() or 1
+
+OVERLOADED = 1.0  # load average per CPU above which fewer encodes run
+HEADROOM = 0.8  # load average per CPU below which more encodes are tried
+GAIN = 1.05  # throughput has to improve by this much for a higher concurrency to be kept
+SMOOTHING = 0.5  # weight of a new measurement in a level's average
+MIN_SAMPLE = 1.0  # seconds, shorter encodes say little about throughput
+
+
+def max_jobs(jobs: int) -> int:
+    """Returns number of job threads for a `-j` value"""
+    return CPU_COUNT if jobs == AUTO else max(1, jobs)
+
+
+class ConcurrencyTuner:
+    """
+    Limits how many encodes run at once, tuning the limit by hill climbing on measured throughput.
+    Each finished encode gives its real-time factor relative to the best one seen for its formats,
+    averaged per concurrency level it ran at; throughput of a level is that times the level.
+    The limit goes up while that pays off and there's CPU headroom, down when the system is overloaded
+    (by anything, not only eat) or a lower level did as well. Waiting encodes start in arrival order
+    """
+
+    def __init__(self, maximum: int = CPU_COUNT, initial: Optional[int] = None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.maximum = max(1, maximum)
+        self.limit = min(self.maximum, initial or max(1, CPU_COUNT // 2))
+        self._running = 0
+        self._waiting: Deque[int] = collections.deque()
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+        # Time integral of the number of running encodes, for the average concurrency of each encode
+        self._busy = 0.0
+        self._changed = time.monotonic()
+
+        self._best: Dict[str, float] = {}  # formats: best real-time factor
+        self._efficiency: Dict[int, float] = {}  # level: average relative real-time factor
+
+    @contextmanager
+    def slot(self, formats: str, duration: float) -> Iterator[None]:
+        """Runs an encode of `duration` seconds of audio once there's a free slot, measuring it"""
+        with self._condition:
+            ticket = next(self._tickets)
+            self._waiting.append(ticket)
+            while self._waiting[0] != ticket or self._running >= self.limit:
+                self._condition.wait()
+            self._waiting.popleft()
+            self._update_busy(1)
+            started, busy = time.monotonic(), self._busy
+            self._condition.notify_all()
+
+        finished = False
+        try:
+            yield
+            finished = True
+        finally:
+            with self._condition:
+                self._update_busy(-1)
+                elapsed = time.monotonic() - started
+                if finished and duration > 0 and elapsed >= MIN_SAMPLE:
+                    self._record(formats, duration / elapsed, round((self._busy - busy) / elapsed))
+                self._condition.notify_all()
+
+    def _update_busy(self, change: int) -> None:
+        now = time.monotonic()
+        self._busy += self._running * (now - self._changed)
+        self._changed = now
+        self._running += change
+
+    def _record(self, formats: str, speed: float, level: int) -> None:
+        """Records real-time factor of an encode that ran alongside `level - 1` others, retunes the limit"""
+        self._best[formats] = max(self._best.get(formats, 0.0), speed)
+        efficiency = speed / self._best[formats]
+        previous = self._efficiency.get(level)
+        self._efficiency[level] = efficiency if previous is None \
+            else previous + SMOOTHING * (efficiency - previous)
+
+        load = _load()
+        current, higher, lower = (self._throughput(self.limit + step) for step in (0, 1, -1))
+        limit = self.limit
+        if load is not None and load > OVERLOADED:
+            limit -= 1
+        elif current is None:
+            return  # nothing ran at the current limit yet
+        elif lower is not None and lower >= current:
+            limit -= 1
+        elif higher is None and (load is None or load < HEADROOM):
+            limit += 1
+        elif higher is not None and higher > current * GAIN and (load is None or load < OVERLOADED):
+            limit += 1
+
+        limit = min(self.maximum, max(1, limit))
+        if limit != self.limit:
+            self.logger.info(
+                'Running up to %d encodes at once (was %d, load %s)',
+                limit, self.limit, 'unknown' if load is None else '%.2f per CPU' % load
+            )
+            self.limit = limit
+
+    def _throughput(self, level: int) -> Optional[float]:
+        efficiency = self._efficiency.get(level)
+        return None if efficiency is None else efficiency * level
+
+
+def _load() -> Optional[float]:
+    """Returns 1 minute load average per CPU, None where it's not available"""
+    try:
+        return os.getloadavg()[0] / CPU_COUNT
+    except (AttributeError, OSError):
+        return None
@@ -0,0 +1,171 @@
+import atexit
+import logging
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from eat.utils.processor import ProcessingError
+
+SESSION_PREFIX = 'eat_'
+SESSION_PATTERN = re.compile(r'^eat_(?P<host>[^_]*)_(?P<pid>[0-9]+)_')
+
+
+class Reservation:
+    """Scratch space reserved for a single temp file"""
+
+    def __init__(self, scratch: 'Scratch', tier: Path, directory: Path, size: int) -> None:
+        self.tier = tier
+        self.directory = directory
+        self.size = size
+        self.path: Optional[Path] = None  # set once file is created, used to track written size
+        self._scratch = scratch
+
+    def release(self) -> None:
+        self._scratch._release(self)
+
+
+class Scratch:
+    """
+    Scratch storage manager, temp files are placed on a RAM-backed tier when they fit
+    and on disk otherwise. Space is reserved before files are written,
+    and all files live in a per-run session directory, removed on exit
+    or on the next run if eat didn't exit cleanly.
+    """
+
+    def __init__(
+        self,
+        disk_path: Path,
+        ram_path: Optional[Path] = None,
+        ram_usage: float = 0.5
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        # (path, usable fraction of free space), in order of preference
+        self._tiers: List[Tuple[Path, float]] = []
+        if ram_path and Path(ram_path).is_dir():
+            self._tiers.append((Path(ram_path), ram_usage))
+        self._tiers.append((Path(disk_path), 1.0))
+
+        self._reservations: List[Reservation] = []
+        self._sessions: Dict[Path, Path] = {}
+        self._condition = threading.Condition()
+
+        for tier, _ in self._tiers:
+            self._clean_stale(tier)
+        atexit.register(self.cleanup)
+
+    def job_dir(self) -> Path:
+        """Returns a new directory for a single job's temp files"""
+        with self._condition:
+            session = self._session(self._tiers[-1][0])
+        return Path(tempfile.mkdtemp(prefix='job_', dir=session))
+
+    def reserve(self, size: int, disk_only: bool = False) -> Reservation:
+        """
+        Reserves space on the fastest tier that fits it,
+        waits for other reservations to be released if none does
+        """
+        tiers = self._tiers[-1:] if disk_only else self._tiers
+        with self._condition:
+            while True:
+                reservation = self.try_reserve(size, disk_only)
+                if reservation:
+                    return reservation
+
+                if not self._reservations:
+                    raise ProcessingError('Not enough scratch space for a %s MiB temp file in %s' % (
+                        size >> 20,
+                        ', '.join(str(tier) for tier, _ in tiers)
+                    ))
+
+                self.logger.debug('Waiting for %s MiB of scratch space', size >> 20)
+                self._condition.wait()
+
+    def try_reserve(self, size: int, disk_only: bool = False) -> Optional[Reservation]:
+        """Reserves space on the fastest tier that fits it, returns None if none does right now"""
+        tiers = self._tiers[-1:] if disk_only else self._tiers
+        with self._condition:
+            for tier, usage in tiers:
+                if self._available(tier, usage) >= size:
+                    reservation = Reservation(self, tier, self._session(tier), size)
+                    self._reservations.append(reservation)
+                    self.logger.debug('Reserved %s MiB in "%s"', size >> 20, tier)
+                    return reservation
+
+        return None
+
+    def cleanup(self) -> None:
+        """Removes all session directories"""
+        with self._condition:
+            for session in self._sessions.values():
+                shutil.rmtree(session, ignore_errors=True)
+            self._sessions.clear()
+
+    def _release(self, reservation: Reservation) -> None:
+        with self._condition:
+            if reservation in self._reservations:
+                self._reservations.remove(reservation)
+                self._condition.notify_all()
+
+    def _available(self, tier: Path, usage: float) -> int:
+        """Returns free space on a tier minus the part of reservations not written yet"""
+        stat = os.statvfs(tier)
+        pending = 0
+        for reservation in self._reservations:
+            if reservation.tier != tier:
+                continue
+            written = 0
+            if reservation.path and reservation.path.exists():
+                written = reservation.path.stat().st_size
+            pending += max(0, reservation.size - written)
+
+        return int(stat.f_bavail * stat.f_frsize * usage) - pending
+
+    def _session(self, tier: Path) -> Path:
+        """Returns this run's session directory on a given tier"""
+        if tier not in self._sessions:
+            self._sessions[tier] = Path(tempfile.mkdtemp(
+                prefix=f'{SESSION_PREFIX}{socket.gethostname()}_{os.getpid()}_',
+                dir=tier
+            ))
+
+        return self._sessions[tier]
+
+    def _clean_stale(self, tier: Path) -> None:
+        """Removes session directories left behind by dead eat processes on this host"""
+        if not tier.is_dir():
+            return
+
+        for path in tier.glob(f'{SESSION_PREFIX}*'):
+            match = SESSION_PATTERN.match(path.name)
+            if not match or match['host'] != socket.gethostname() or not path.is_dir():
+                continue
+            if pid_alive(int(match['pid'])):
+                continue
+
+            self.logger.debug('Removing stale scratch directory "%s"', path)
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def estimate_pcm_size(duration: float, sample_rate: int, channels: int, bitdepth: int) -> int:
+    """Returns estimated PCM file size in bytes (duration in microseconds)"""
+    if duration <= 0:
+        return 0
+
+    header = 4096  # RF64 header with ds64 and junk chunks is well under that
+    return int(duration / 1000000 * sample_rate * channels * ((bitdepth + 7) // 8)) + header
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, but belongs to another user
+        return True
+
+    return True
@@ -0,0 +1,12 @@
+import signal
+from types import FrameType
+from typing import Optional
+
+
+def interrupt_on_sigterm() -> None:
+    """Makes SIGTERM (e.g. from a service manager) stop eat the same way as Ctrl+C"""
+    signal.signal(signal.SIGTERM, _interrupt)
+
+
+def _interrupt(signum: int, frame: Optional[FrameType]) -> None:
+    raise KeyboardInterrupt
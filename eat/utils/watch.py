@@ -0,0 +1,115 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+class Watcher:
+    """
+    Yields files appearing in a folder (and given subfolders) once their size and mtime
+    stop changing for `settle` seconds. inotify is used to notice changes as they happen,
+    with periodic rescans as a fallback where it's not available
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        subfolders: List[str],
+        settle: float = 5.0,
+        poll_interval: float = 2.0
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self._path = path
+        self._subfolders = subfolders
+        self._settle = settle
+        self._poll_interval = poll_interval
+        self._candidates: Dict[Path, Tuple[int, int, float]] = {}  # size, mtime, unchanged since
+        self._taken: Set[Path] = set()
+        self._inotify = self._init_inotify()
+
+    def __iter__(self) -> Iterator[Path]:
+        while True:
+            now = time.monotonic()
+            for file in self._scan():
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:  # removed or renamed since the scan
+                    continue
+                state = self._candidates.get(file)
+                if not state or state[:2] != (stat.st_size, stat.st_mtime_ns):
+                    self._candidates[file] = (stat.st_size, stat.st_mtime_ns, now)
+                elif now - state[2] >= self._settle:
+                    del self._candidates[file]
+                    self._taken.add(file)
+                    yield file
+
+            timeout = min(self._settle, self._poll_interval) if self._candidates else self._poll_interval
+            self._wait(timeout)
+
+    def release(self, file: Path) -> None:
+        """Allows a file to be picked up again (once it's moved away and something new takes its place)"""
+        self._taken.discard(file)
+
+    def _scan(self) -> List[Path]:
+        """Returns files that weren't picked up yet, pending ones are kept until they're gone"""
+        files = []
+        for folder in (self._path, *(self._path / name for name in self._subfolders)):
+            if not folder.is_dir():
+                continue
+            for file in folder.iterdir():
+                if file.name.startswith('.') or file in self._taken or not file.is_file():
+                    continue
+                files.append(file)
+
+        for file in [*self._candidates]:
+            if file not in files:
+                del self._candidates[file]
+
+        return files
+
+    def _wait(self, timeout: float) -> None:
+        """Waits for a filesystem event (or just sleeps without inotify)"""
+        if self._inotify is None:
+            time.sleep(timeout)
+            return
+
+        readable, _, _ = select.select([self._inotify], [], [], timeout)
+        if readable:
+            # Events are only a wake-up call, the folder is rescanned anyway
+            while True:
+                try:
+                    if not os.read(self._inotify, 1 << 16):
+                        break
+                except BlockingIOError:
+                    break
+
+    def _init_inotify(self) -> Optional[int]:
+        """Returns inotify fd watching all folders, or None if it's not available"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):  # not Linux
+            fd = -1
+        if fd < 0:
+            self.logger.debug('inotify not available, polling every %s s', self._poll_interval)
+            return None
+
+        for folder in (self._path, *(self._path / name for name in self._subfolders)):
+            folder.mkdir(parents=True, exist_ok=True)
+            if libc.inotify_add_watch(fd, str(folder).encode(), WATCH_MASK) < 0:
+                self.logger.debug('inotify watch failed for "%s", polling instead', folder)
+                os.close(fd)
+                return None
+
+        return int(fd)
@@ -1,6 +1,13 @@
+import re
+from pathlib import Path
+
 import setuptools
 
-from eat.__main__ import __version__
+# Read without importing eat, its dependencies may not be installed yet
+__version__ = re.search(
+    r"__version__ = '([^']+)'",
+    (Path(__file__).parent / 'eat' / '__init__.py').read_text()
+).group(1)
 
 setuptools.setup(
     name='eat',
@@ -22,6 +29,9 @@ setuptools.setup(
         'toml',
         'xmltodict',
     ],
+    extras_require={
+        'analysis': ['numpy'],
+    },
     classifiers=[
         'Environment :: Console',
         'Operating System :: POSIX',
@@ -0,0 +1,33 @@
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+Generate = Callable[..., Path]
+
+
+@pytest.fixture
+def generate(tmp_path: Path) -> Generate:
+    """Returns a function writing a sine test file with ffmpeg, tests using it are skipped without ffmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        pytest.skip('ffmpeg not found')
+
+    def generate(
+        name: str,
+        *params: str,
+        seconds: float = 2,
+        sample_rate: int = 48000,
+        channels: int = 2
+    ) -> Path:
+        output = tmp_path / name
+        subprocess.run([
+            ffmpeg, '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', f'sine=frequency=1000:sample_rate={sample_rate}:duration={seconds}',
+            '-ac', str(channels), *params, str(output)
+        ], check=True)
+        return output
+
+    return generate
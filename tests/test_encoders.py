@@ -0,0 +1,63 @@
+import argparse
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from eat.api import Session
+from eat.encoders import get_encoder_class
+from eat.encoders._base import OutputSettings
+from eat.job import Job
+from eat.utils.analysis import PcmAnalysis
+from eat.utils.ffprobe import AudioInfo
+
+SILENT_BACKS = PcmAnalysis(24, 24, [1.0] * 6 + [0.0] * 2, [0.0] * 8)
+PADDED = PcmAnalysis(24, 16, [1.0] * 2, [0.0] * 2)
+
+
+@pytest.mark.parametrize('name, options, settings', [
+    ('ddp', dict(channels=6), OutputSettings(bitrate=1024, channels=6)),
+    ('ddp', dict(channels=8, bitrate=1000), OutputSettings(bitrate=1008, channels=8)),
+    ('ddp', dict(channels=8, analysis=SILENT_BACKS), OutputSettings(bitrate=1024, channels=6)),
+    ('dd', dict(channels=8), OutputSettings(bitrate=640, channels=6)),
+    ('thd', dict(channels=8, bitdepth=24), OutputSettings(bit_depth=24)),
+    ('flac', dict(channels=2, bitdepth=24), OutputSettings(bit_depth=24)),
+    ('flac', dict(channels=2, bitdepth=24, analysis=PADDED), OutputSettings(bit_depth=16)),
+    ('flac', dict(channels=2, bitdepth=24, resample_fmt=16), OutputSettings(bit_depth=16)),
+    ('opus', dict(channels=2), OutputSettings(bitrate=160)),
+    ('aac', dict(channels=2, bitrate=91), OutputSettings()),
+    ('copy', dict(channels=2, muxer='flac'), OutputSettings(channels=2, bit_depth=24)),
+])
+def test_output_settings(tmp_path: Path, name: str, options: Dict[str, Any], settings: OutputSettings) -> None:
+    encoder = get_encoder_class(name)(Path(name))
+    encoder.configure(**dict(dict(
+        input_path=tmp_path / 'a.wav',
+        output_path=tmp_path / 'a.out',
+        bitdepth=24,
+        sample_rate=None,
+        resample_fmt=None,
+        duration=None,
+        bitrate=None,
+        temp_dir=tmp_path
+    ), **options))
+
+    assert encoder.output_settings == settings
+
+
+@pytest.mark.parametrize('name, settings, params', [
+    ('ddp', OutputSettings(bitrate=1024, channels=6), dict(bitrate=1024, channels=6, bit_depth=None)),
+    ('flac', OutputSettings(bit_depth=16), dict(bitrate=None, channels=8, bit_depth=16)),
+    ('copy', OutputSettings(channels=8, bit_depth=24), dict(bitrate=None, channels=8, bit_depth=None)),
+])
+def test_reported_params(name: str, settings: OutputSettings, params: Dict[str, Any]) -> None:
+    """Results list settings the encoders used, rather than requested ones"""
+    info = AudioInfo({
+        'streams': [{'codec_name': 'pcm_s24le', 'sample_rate': '48000', 'channels': 8, 'bits_per_sample': 24}],
+        'format': {'format_name': 'wav'}
+    })
+    job = Job(Path('a.wav'), 'ddp' if name == 'copy' else name, Path('a.out'), info)
+    job.output_settings = settings
+    job.stages = dict(started=0, finished=1)
+    args = argparse.Namespace(bitrate=None, channels=8, sample_rate=None, bit_depth=24)
+
+    assert Session._output(job, args).params == dict(params, sample_rate=48000)
@@ -0,0 +1,95 @@
+import hashlib
+import shutil
+import subprocess
+import threading
+from concurrent.futures import CancelledError
+from pathlib import Path
+
+import pytest
+
+from eat.encoders import flac
+from eat.utils.flac import StreamInfo, pcm_md5
+from eat.utils.header import read_pcm_data
+
+from conftest import Generate
+
+
+def encode(source: Path, output: Path, segments: int) -> flac.Encoder:
+    temp_dir = output.parent / f'temp_{output.stem}'
+    temp_dir.mkdir()
+    encoder = flac.Encoder(Path(str(shutil.which('ffmpeg'))))
+    encoder(
+        input_path=source,
+        output_path=output,
+        duration=None,
+        bitdepth=None,
+        sample_rate=None,
+        resample_fmt=None,
+        temp_dir=temp_dir,
+        segments=segments
+    )
+    return encoder
+
+
+def decoded_md5(file: Path, sample_format: str) -> str:
+    """Returns MD5 of decoded samples, failing on any CRC mismatch"""
+    return hashlib.md5(subprocess.run(
+        [str(shutil.which('ffmpeg')), '-v', 'error', '-err_detect', 'crccheck+explode', '-xerror',
+         '-i', str(file), '-f', sample_format, '-'],
+        check=True, capture_output=True
+    ).stdout).hexdigest()
+
+
+@pytest.mark.parametrize('channels, codec, sample_format', [
+    (2, 'pcm_s16le', 's16le'),
+    (6, 'pcm_s24le', 's24le'),
+])
+def test_segments_decode_identical(
+    generate: Generate,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    channels: int,
+    codec: str,
+    sample_format: str
+) -> None:
+    """Segmented encode decodes to exactly the input samples, like a single encode"""
+    monkeypatch.setattr(flac, 'MIN_SEGMENT', 1)
+    source = generate('source.wav', '-c:a', codec, seconds=13.3, channels=channels)
+    data = read_pcm_data(source)
+    assert data is not None
+    with source.open(mode='rb') as f:
+        f.seek(data.offset)
+        source_md5 = hashlib.md5(f.read(data.size)).hexdigest()
+
+    single = tmp_path / 'single.flac'
+    joined = tmp_path / 'joined.flac'
+    encode(source, single, segments=1)
+    encoder = encode(source, joined, segments=3)
+    assert len(encoder._to_remove) == 3  # 13.3 s at 48 kHz makes 3 segments of the block size LCM
+
+    assert decoded_md5(joined, sample_format) == decoded_md5(single, sample_format) == source_md5
+    with joined.open(mode='rb') as f:
+        f.seek(8)
+        info = StreamInfo(f.read(34))
+    assert info.md5.hex() == source_md5
+    assert info.samples == data.size // data.block_align
+
+
+def test_old_ffmpeg_single_process(generate: Generate, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(flac, 'MIN_SEGMENT', 1)
+    monkeypatch.setattr(flac, 'ffmpeg_version', lambda _: (5, 0))
+    source = generate('source.wav', '-c:a', 'pcm_s16le', seconds=13.3)
+    output = tmp_path / 'output.flac'
+    encoder = encode(source, output, segments=3)
+    assert not encoder._to_remove
+    assert decoded_md5(output, 's16le')
+
+
+def test_md5_cancelled(generate: Generate) -> None:
+    source = generate('source.wav', '-c:a', 'pcm_s16le', seconds=1)
+    data = read_pcm_data(source)
+    assert data is not None
+    cancelled = threading.Event()
+    cancelled.set()
+    with pytest.raises(CancelledError):
+        pcm_md5(source, data, cancelled)
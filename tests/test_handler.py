@@ -0,0 +1,49 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Tuple
+
+from eat.encoders.ddp import Encoder as DdpEncoder
+from eat.handler import Handler
+from eat.job import Job
+from eat.utils.jobqueue import JobQueue
+
+
+def configured(tmp_path: Path, channels: int) -> Tuple[Handler, Job, DdpEncoder]:
+    """Returns a handler with a job queue, a queued job and its DD+ encoder, configured but not started"""
+    handler = Handler.__new__(Handler)
+    handler.queue = JobQueue(tmp_path / 'jobs.sqlite')
+    job = Job.__new__(Job)
+    job.queue_id = handler.queue.add(handler.queue.create_batch({}), tmp_path / 'a.wav', 'ddp', tmp_path / 'a.ec3')
+    encoder = DdpEncoder(Path('dee'))
+    encoder.configure(
+        input_path=tmp_path / 'a.rf64',
+        output_path=tmp_path / 'a.ec3',
+        bitrate=None,
+        channels=channels,
+        temp_dir=tmp_path
+    )
+    return handler, job, encoder
+
+
+def test_dee_output_is_owned(tmp_path: Path) -> None:
+    """7.1 DD+ at the default bitrate is written with the Blu-ray extension"""
+    handler, job, encoder = configured(tmp_path, channels=8)
+    handler._own_output(job, encoder)
+
+    assert job.written == tmp_path / 'a.eb3'
+    with sqlite3.connect(tmp_path / 'jobs.sqlite') as db:
+        assert json.loads(db.execute('SELECT temp FROM jobs').fetchone()[0]) == [str(tmp_path / 'a.eb3')]
+
+
+def test_linked_output_unlinked_once_written(tmp_path: Path) -> None:
+    """An output linked to an identical one (incremental mode) isn't written through"""
+    identical = tmp_path / 'b.ec3'
+    identical.write_bytes(b'ec3')
+    os.link(identical, tmp_path / 'a.ec3')
+    handler, job, encoder = configured(tmp_path, channels=6)
+    handler._own_output(job, encoder)
+
+    assert not (tmp_path / 'a.ec3').exists()
+    assert identical.read_bytes() == b'ec3' and identical.stat().st_nlink == 1
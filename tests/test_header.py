@@ -0,0 +1,156 @@
+import json
+import shutil
+import struct
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from eat.utils.ffprobe import AudioInfo
+from eat.utils.header import read_header, read_pcm_data
+
+from conftest import Generate
+
+# name, ffmpeg output params, sample rate, channels, expected codec, bit depth
+CORPUS = [
+    ('s16.wav', ['-c:a', 'pcm_s16le'], 44100, 2, 'pcm_s16le', 16),
+    ('s24_51.wav', ['-c:a', 'pcm_s24le'], 48000, 6, 'pcm_s24le', 24),
+    ('s24_71.wav', ['-c:a', 'pcm_s24le'], 96000, 8, 'pcm_s24le', 24),
+    ('f32.wav', ['-c:a', 'pcm_f32le'], 48000, 1, 'pcm_f32le', 32),
+    ('tagged.wav', ['-c:a', 'pcm_s16le', '-metadata', 'title=test'], 48000, 2, 'pcm_s16le', 16),
+    ('bext.wav', ['-c:a', 'pcm_s24le', '-write_bext', '1'], 48000, 2, 'pcm_s24le', 24),
+    ('always.rf64', ['-c:a', 'pcm_s24le', '-rf64', 'always', '-f', 'wav'], 48000, 6, 'pcm_s24le', 24),
+    ('s16.w64', ['-c:a', 'pcm_s16le'], 48000, 2, 'pcm_s16le', 16),
+    ('s24.w64', ['-c:a', 'pcm_s24le'], 44100, 6, 'pcm_s24le', 24),
+    ('s16.flac', ['-c:a', 'flac'], 44100, 2, 'flac', 16),
+    ('s24.flac', ['-c:a', 'flac', '-sample_fmt', 's32'], 96000, 6, 'flac', 24),
+    ('id3.flac', ['-c:a', 'flac', '-write_id3v2', '1', '-metadata', 'title=test'], 48000, 2, 'flac', 16),
+]
+
+
+def ffprobe(file: Path) -> Optional[AudioInfo]:
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None
+    output = subprocess.run(
+        [ffprobe, '-v', 'quiet', '-select_streams', 'a', '-print_format', 'json',
+         '-show_format', '-show_streams', str(file)],
+        check=True, capture_output=True
+    ).stdout
+    return AudioInfo(json.loads(output))
+
+
+def assert_matches_ffprobe(file: Path, info: AudioInfo) -> None:
+    probed = ffprobe(file)
+    if probed is None:
+        return
+    assert (info.codec, info.sample_rate, info.channels, info.bitdepth) \
+        == (probed.codec, probed.sample_rate, probed.channels, probed.bitdepth)
+    assert info.duration == pytest.approx(probed.duration, abs=1000)
+
+
+@pytest.mark.parametrize('name, params, sample_rate, channels, codec, bitdepth', CORPUS)
+def test_generated(
+    generate: Generate,
+    name: str,
+    params: list,
+    sample_rate: int,
+    channels: int,
+    codec: str,
+    bitdepth: int
+) -> None:
+    file = generate(name, *params, seconds=1.5, sample_rate=sample_rate, channels=channels)
+    log = read_header(file)
+    assert log is not None
+    info = AudioInfo(log)
+    assert (info.codec, info.sample_rate, info.channels, info.bitdepth) == (codec, sample_rate, channels, bitdepth)
+    assert info.duration == pytest.approx(1500000, abs=1000)
+    assert_matches_ffprobe(file, info)
+
+
+def test_streamed_wav(generate: Generate, tmp_path: Path) -> None:
+    """WAV written to a pipe has no sizes, data runs to the end of the file"""
+    file = generate('source.wav', '-c:a', 'pcm_s16le', seconds=1)
+    streamed = tmp_path / 'streamed.wav'
+    streamed.write_bytes(subprocess.run(
+        [str(shutil.which('ffmpeg')), '-v', 'error', '-i', str(file), '-c', 'copy', '-f', 'wav', '-'],
+        check=True, capture_output=True
+    ).stdout)
+
+    log = read_header(streamed)
+    assert log is not None
+    info = AudioInfo(log)
+    assert info.duration == pytest.approx(1000000, abs=1000)
+    assert_matches_ffprobe(streamed, info)
+
+
+def wav(*chunks: bytes) -> bytes:
+    body = b'WAVE' + b''.join(chunks)
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+def chunk(chunk_id: bytes, data: bytes) -> bytes:
+    return chunk_id + struct.pack('<I', len(data)) + data + b'\0' * (len(data) & 1)
+
+
+def test_odd_layout(tmp_path: Path) -> None:
+    """Odd sized chunks before fmt (padded to words), data chunk before a trailing LIST"""
+    channels, sample_rate, samples = 3, 32000, 3200
+    fmt = struct.pack('<HHIIHH', 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16)
+    file = tmp_path / 'odd.wav'
+    file.write_bytes(wav(
+        chunk(b'junk', b'\1' * 7),
+        chunk(b'cue ', b'\2' * 13),
+        chunk(b'fmt ', fmt),
+        chunk(b'data', b'\0' * samples * channels * 2),
+        chunk(b'LIST', b'INFOINAM' + struct.pack('<I', 5) + b'test\0\0'),
+    ))
+
+    log = read_header(file)
+    assert log is not None
+    info = AudioInfo(log)
+    assert (info.codec, info.sample_rate, info.channels, info.bitdepth) == ('pcm_s16le', sample_rate, channels, 16)
+    assert info.duration == pytest.approx(100000)
+    data = read_pcm_data(file)
+    assert data is not None and data.offset == 12 + 16 + 22 + 24 + 8
+    assert_matches_ffprobe(file, info)
+
+
+def test_extensible_mask(tmp_path: Path) -> None:
+    fmt = struct.pack('<HHIIHHHHI', 0xFFFE, 6, 48000, 48000 * 18, 18, 24, 22, 24, 0x3F) \
+        + b'\1\0\0\0\0\0\x10\0\x80\0\0\xaa\0\x38\x9b\x71'
+    file = tmp_path / 'back.wav'
+    file.write_bytes(wav(chunk(b'fmt ', fmt), chunk(b'data', b'\0' * 18 * 480)))
+
+    data = read_pcm_data(file)
+    assert data is not None
+    assert (data.codec, data.channels, data.channel_mask) == ('pcm_s24le', 6, 0x3F)
+
+
+@pytest.mark.parametrize('content', [
+    b'fLaC',
+    b'fLaC\0\0\0\x22',
+    b'fLaC\0\0\0\x22' + b'\0' * 10,
+    b'ID3\x04\0\0\0\0\0\x7f',
+    b'RIFF\0\0\0\0WAVE',
+    b'RIFF\0\0\0\0WAVEfmt \x10\0\0\0\1\0',
+    b'RF64\xff\xff\xff\xffWAVEds64\x1c\0\0\0',
+    b'riff\x2e\x91\xcf\x11\xa5\xd6\x28\xdb\x04\xc1\x00\x00',
+    b'',
+])
+def test_truncated(tmp_path: Path, content: bytes) -> None:
+    """Truncated headers are left to ffprobe instead of failing"""
+    file = tmp_path / 'truncated'
+    file.write_bytes(content)
+    assert read_header(file) is None
+    assert read_pcm_data(file) is None
+
+
+def test_truncated_data(generate: Generate, tmp_path: Path) -> None:
+    """Cut off sample data (e.g. a copy in progress) is read as far as it goes"""
+    file = generate('full.flac', '-c:a', 'flac', seconds=1)
+    cut = tmp_path / 'cut.flac'
+    cut.write_bytes(file.read_bytes()[:42])
+    log = read_header(cut)
+    assert log is not None and AudioInfo(log).duration == pytest.approx(1000000, abs=1000)
@@ -0,0 +1,67 @@
+import threading
+from pathlib import Path
+from typing import List, Tuple
+
+from eat.utils.ffprobe import AudioInfo
+from eat.utils.intermediate import Demux, Intermediate
+from eat.utils.scratch import Scratch
+
+INFO = AudioInfo({
+    'streams': [{'codec_name': 'flac', 'sample_rate': '48000', 'channels': 6, 'duration': '60'}],
+    'format': {'format_name': 'matroska'}
+})
+
+
+def write(targets: List[Tuple[Intermediate, Path]]) -> None:
+    for _, path in targets:
+        path.write_bytes(b'RF64')
+
+
+def test_demux_tracks_not_fitting_together(tmp_path: Path) -> None:
+    """A track waiting for scratch space doesn't block its sibling from releasing it"""
+    scratch = Scratch(disk_path=tmp_path)
+    size = int(scratch._available(tmp_path, 1.0) * 0.6)
+    demux = Demux()
+    first, second = (Intermediate('.wav', scratch, size, INFO, track=track, demux=demux) for track in (0, 1))
+    first.add_consumer()
+    second.add_consumer()
+
+    first_path = first.acquire(write)
+    assert second.path is None  # both don't fit, so only the first one was built
+
+    acquired: List[Path] = []
+    waiting = threading.Thread(target=lambda: acquired.append(second.acquire(write)), daemon=True)
+    waiting.start()
+    waiting.join(timeout=0.5)
+    assert waiting.is_alive()  # waits for the first one's space
+
+    released = threading.Thread(target=first.release, daemon=True)
+    released.start()
+    released.join(timeout=5)
+    assert not released.is_alive()
+    waiting.join(timeout=5)
+    assert not waiting.is_alive()
+
+    assert not first_path.exists()
+    assert acquired and acquired[0].exists()
+    second.release()
+    assert not acquired[0].exists()
+
+
+def test_demux_tracks_built_together(tmp_path: Path) -> None:
+    scratch = Scratch(disk_path=tmp_path)
+    demux = Demux()
+    first, second = (Intermediate('.wav', scratch, 1 << 20, INFO, track=track, demux=demux) for track in (0, 1))
+    first.add_consumer()
+    second.add_consumer()
+
+    builds: List[int] = []
+
+    def build(targets: List[Tuple[Intermediate, Path]]) -> None:
+        builds.append(len(targets))
+        write(targets)
+
+    first.acquire(build)
+    assert builds == [2] and second.path is not None
+    assert second.acquire(write) == second.path
+    assert builds == [2]
@@ -0,0 +1,43 @@
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+from eat.utils.jobqueue import PENDING, JobQueue
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def kill_batch(queue_path: Path, batch_id: int) -> None:
+    """Makes a batch look like its eat process died"""
+    with sqlite3.connect(queue_path) as db:
+        db.execute('UPDATE batches SET pid = ? WHERE id = ?', (dead_pid(), batch_id))
+
+
+def test_recover_removes_only_owned_files(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / 'jobs.sqlite')
+    batch_id = queue.create_batch({})
+    planned = tmp_path / 'existing.ec3'  # the user's file, its encode never started
+    planned.write_bytes(b'old')
+    staging = queue.add(batch_id, tmp_path / 'a.wav', 'ddp', planned)
+    written = tmp_path / 'b.eb3'
+    written.write_bytes(b'partial')
+    encoding = queue.add(batch_id, tmp_path / 'b.wav', 'ddp', tmp_path / 'b.ec3')
+    intermediate = tmp_path / 'a.rf64'
+    intermediate.write_bytes(b'RF64')
+
+    queue.start([staging, encoding])
+    queue.own([staging], intermediate)
+    queue.own([encoding], written)
+    kill_batch(tmp_path / 'jobs.sqlite', batch_id)
+    queue.recover()
+
+    assert planned.read_bytes() == b'old'
+    assert not intermediate.exists() and not written.exists()
+    with sqlite3.connect(tmp_path / 'jobs.sqlite') as db:
+        assert db.execute('SELECT state, temp FROM jobs').fetchall() == [(PENDING, '[]')] * 2
+
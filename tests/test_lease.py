@@ -0,0 +1,105 @@
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from eat.utils.lease import LeaseDir
+
+TIMEOUT = 0.5
+JOBS = [f'job{i}' for i in range(6)]
+
+
+def worker(path: Path, keys: List[str], work: float, hang: Optional[str] = None) -> None:
+    """Claims and does jobs like a cluster node, every finished job is appended to done.log"""
+    with LeaseDir(path, timeout=TIMEOUT) as leases:
+        while True:
+            leases.refresh()
+            pending = [key for key in keys if not leases.finished(key)]
+            if not pending:
+                return
+
+            for key in pending:
+                lease = leases.claim(key, dict(input=key), lambda: None)
+                if not lease:
+                    continue
+                if key == hang:
+                    (path / 'hanging').touch()
+                    time.sleep(3600)  # killed here, while holding the job
+
+                time.sleep(work)
+                with (path / 'done.log').open('a') as log:
+                    log.write(f'{key} {leases.node}\n')
+                leases.finish(lease)
+
+            time.sleep(0.05)
+
+
+def done(path: Path) -> List[str]:
+    return sorted(line.split()[0] for line in (path / 'done.log').read_text().splitlines())
+
+
+def test_jobs_done_once_with_killed_worker(tmp_path: Path) -> None:
+    # Spawned workers don't inherit threads of pytest, or its plugins
+    context = multiprocessing.get_context('spawn')
+    hanging = context.Process(target=worker, args=(tmp_path, JOBS, 0, JOBS[0]))
+    hanging.start()
+    deadline = time.monotonic() + 30
+    while not (tmp_path / 'hanging').exists():
+        assert time.monotonic() < deadline and hanging.is_alive()
+        time.sleep(0.01)
+
+    # Jobs take longer than the lease timeout, only heartbeats keep them from being taken over
+    # by workers left idle in the last round
+    workers = [context.Process(target=worker, args=(tmp_path, JOBS, TIMEOUT * 4)) for _ in range(4)]
+    for process in workers:
+        process.start()
+    assert hanging.pid is not None
+    os.kill(hanging.pid, signal.SIGKILL)
+    hanging.join()
+
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    assert done(tmp_path) == sorted(JOBS)
+    assert not [*(tmp_path / 'leases').iterdir()]
+
+
+def test_lease_of_other_host_expires(tmp_path: Path) -> None:
+    leases = LeaseDir(tmp_path, timeout=TIMEOUT)
+    (tmp_path / 'leases' / 'job.0').write_text(json.dumps(dict(node='elsewhere_1')))
+
+    leases.refresh()
+    assert not leases.claim('job', {}, lambda: None)  # first seen now, by this node's clock
+    time.sleep(TIMEOUT)
+    lease = leases.claim('job', {}, lambda: None)
+    assert lease and lease.path.name == 'job.1'
+    assert not (tmp_path / 'leases' / 'job.0').exists()
+
+
+def test_lease_kept_alive_by_heartbeat(tmp_path: Path) -> None:
+    with LeaseDir(tmp_path, timeout=TIMEOUT) as holder:
+        holder.refresh()
+        assert holder.claim('job', {}, lambda: None)
+
+        other = LeaseDir(tmp_path, timeout=TIMEOUT)
+        for _ in range(4):
+            other.refresh()
+            assert not other.claim('job', {}, lambda: None)
+            time.sleep(TIMEOUT / 2)
+
+
+def test_lost_lease_cancels(tmp_path: Path) -> None:
+    lost = threading.Event()
+    with LeaseDir(tmp_path, timeout=0.1) as leases:
+        leases.refresh()
+        lease = leases.claim('job', {}, lost.set)
+        assert lease
+        lease.path.unlink()  # taken over by a node that thought this one was dead
+
+        assert lost.wait(timeout=5)
+        assert lease.lost
@@ -0,0 +1,63 @@
+import importlib.util
+import struct
+from pathlib import Path
+
+import pytest
+
+from eat.utils.header import read_pcm_data
+from eat.utils.pcm import reorder_pcm, rewrap_pcm
+
+from test_header import chunk, wav
+
+SUBFORMAT = b'\1\0\0\0\0\0\x10\0\x80\0\0\xaa\0\x38\x9b\x71'
+
+
+@pytest.mark.parametrize('fmt, mask', [
+    (struct.pack('<HHIIHHHHI', 0xFFFE, 6, 48000, 48000 * 12, 12, 16, 22, 16, 0x3F) + SUBFORMAT, 0x3F),  # 5.1(back)
+    (struct.pack('<HHIIHHHHI', 0xFFFE, 6, 48000, 48000 * 12, 12, 16, 22, 16, 0x0) + SUBFORMAT, 0x60F),
+    (struct.pack('<HHIIHH', 1, 6, 48000, 48000 * 12, 12, 16), 0x60F),
+    (struct.pack('<HHIIHH', 1, 3, 48000, 48000 * 6, 6, 16), 0),
+])
+def test_rewrap_keeps_channel_mask(tmp_path: Path, fmt: bytes, mask: int) -> None:
+    source = tmp_path / 'source.wav'
+    samples = bytes(range(256)) * 45
+    source.write_bytes(wav(chunk(b'fmt ', fmt), chunk(b'data', samples)))
+    output = tmp_path / 'output.rf64'
+    assert rewrap_pcm(source, output)
+
+    data = read_pcm_data(output)
+    assert data is not None
+    assert data.channel_mask == mask
+    assert output.read_bytes()[data.offset:data.offset + data.size] == samples
+
+
+def test_reorder(tmp_path: Path) -> None:
+    pytest.importorskip('numpy')
+    source = tmp_path / 'source.wav'
+    frames = [bytes(range(frame * 24, frame * 24 + 24)) for frame in range(10)]  # 8 channels of 24 bit
+    source.write_bytes(wav(
+        chunk(b'fmt ', struct.pack('<HHIIHH', 1, 8, 48000, 48000 * 24, 24, 24)),
+        chunk(b'data', b''.join(frames))
+    ))
+    output = tmp_path / 'output.rf64'
+    order = (0, 1, 2, 3, 6, 7, 4, 5)
+    assert reorder_pcm(source, output, order)
+
+    data = read_pcm_data(output)
+    assert data is not None
+    assert output.read_bytes()[data.offset:data.offset + data.size] == b''.join(
+        b''.join(frame[channel * 3:channel * 3 + 3] for channel in order) for frame in frames
+    )
+
+
+def test_reorder_left_to_ffmpeg_without_numpy(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None if name == 'numpy' else find_spec(name))
+    source = tmp_path / 'source.wav'
+    source.write_bytes(wav(
+        chunk(b'fmt ', struct.pack('<HHIIHH', 1, 2, 48000, 48000 * 4, 4, 16)),
+        chunk(b'data', bytes(8))
+    ))
+
+    assert not reorder_pcm(source, tmp_path / 'output.rf64', (1, 0))
+    assert not (tmp_path / 'output.rf64').exists()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import shutil
+import signal
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, cast
+
+import pytest
+
+import eat.api
+import eat.server
+from eat.api import Session
+from eat.config import Config
+from eat.server import Server, ServerJob
+from eat.utils.processor import CancelScope
+
+from conftest import Generate
+
+STUBS = Path(__file__).resolve().parent.parent / 'benchmarks' / 'stubs'
+
+
+class StubHandler:
+    """Stands in for the encoders: reports half the progress, then waits until released or cancelled"""
+
+    def __init__(self, args: argparse.Namespace, interactive: bool = True) -> None:
+        self.args = args
+        self.release = threading.Event()
+
+    def with_args(self, args: argparse.Namespace) -> 'StubHandler':
+        handler = StubHandler(args)
+        handler.release = self.release
+        return handler
+
+    def run(self, inputs: List[Path], *_: Any, on_progress: Any = None,
+            scope: Optional[CancelScope] = None) -> Tuple[List[Any], List[Path]]:
+        on_progress(1, f'Encoding "{inputs[0].name}" with stub', 50, 100)
+        # Killed processes fail their calls the same way
+        encode: Future = Future()
+        assert scope
+        scope.add(encode)
+
+        def finish() -> None:
+            self.release.wait()
+            if encode.set_running_or_notify_cancel():
+                encode.set_result(None)
+
+        threading.Thread(target=finish, daemon=True).start()
+        encode.result()
+        return [], []
+
+
+class Client:
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+    def request(self, method: str, path: str, data: Any = None) -> Tuple[int, Dict[str, Any]]:
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.url + path, body, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def wait(self, job_id: int, state: str) -> Dict[str, Any]:
+        return self.poll(job_id, lambda job: job['state'] == state and bool(job['tasks']))
+
+    def poll(self, job_id: int, condition: Callable[[Dict[str, Any]], bool], timeout: float = 10) -> Dict[str, Any]:
+        deadline = time.monotonic() + timeout
+        while True:
+            status, job = self.request('GET', f'/jobs/{job_id}')
+            assert status == 200
+            if condition(job):
+                return job
+            assert time.monotonic() < deadline, job
+            time.sleep(0.02)
+
+
+@contextmanager
+def serve(session: Session, monkeypatch: pytest.MonkeyPatch) -> Iterator[Client]:
+    """Runs a server of a session on an ephemeral port, until the block is left"""
+    monkeypatch.setattr(signal, 'signal', lambda *_: None)  # only possible on the main thread
+    servers: List[eat.server._HTTPServer] = []
+
+    class HTTPServer(eat.server._HTTPServer):
+        def server_activate(self) -> None:
+            super().server_activate()
+            servers.append(self)
+
+    monkeypatch.setattr(eat.server, '_HTTPServer', HTTPServer)
+    thread = threading.Thread(target=Server(session, port=0).run)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not servers:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    host, port = cast(Tuple[str, int], servers[0].server_address[:2])
+    try:
+        yield Client(f'http://{host}:{port}')
+    finally:
+        servers[0].shutdown()
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[Tuple[Client, threading.Event]]:
+    monkeypatch.setattr(eat.api, 'Handler', StubHandler)
+    session = Session(jobs=2)
+    release = session._handler.release  # type: ignore
+    with serve(session, monkeypatch) as client:
+        try:
+            yield client, release
+        finally:
+            release.set()  # the server waits for running jobs
+
+
+def test_submit_poll_cancel(server: Tuple[Client, threading.Event], tmp_path: Path) -> None:
+    client, _ = server
+    status, job = client.request('POST', '/jobs', dict(input=str(tmp_path / 'a.wav'), formats=['flac']))
+    assert status == 201 and job['input'] == str(tmp_path / 'a.wav') and job['formats'] == ['flac']
+
+    job = client.wait(job['id'], 'running')
+    assert job['tasks'] == [dict(description='Encoding "a.wav" with stub', completed=50, total=100)]
+    assert client.request('GET', '/jobs')[1]['jobs'] == [job]
+
+    status, _ = client.request('DELETE', f'/jobs/{job["id"]}')
+    assert status == 202
+    client.wait(job['id'], 'cancelled')
+    status, body = client.request('DELETE', f'/jobs/{job["id"]}')
+    assert status == 409 and body['job']['state'] == 'cancelled'
+
+
+def test_submit_poll_done(
+    server: Tuple[Client, threading.Event],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client, release = server
+    # The session ends event streams before the server's own done callback runs
+    finished = Server._finished
+
+    def slow_finished(self: Server, job: ServerJob) -> None:
+        time.sleep(0.5)
+        finished(self, job)
+
+    monkeypatch.setattr(Server, '_finished', slow_finished)
+    _, job = client.request('POST', '/jobs', dict(input=str(tmp_path / 'a.wav'), formats='flac'))
+    client.wait(job['id'], 'running')
+
+    with urllib.request.urlopen(f'{client.url}/jobs/{job["id"]}/events', timeout=10) as response:
+        release.set()
+        events = response.read().decode().split('\n\n')
+    assert events[0].startswith('event: progress\n') and events[1].startswith('event: done\n')
+    final = json.loads(events[1].partition('data: ')[2])
+    assert final['outputs'] == [] and final['skipped'] == ['flac'] and final['finished']
+    assert client.wait(job['id'], 'done') == final
+
+
+@pytest.mark.parametrize('request_body, error', [
+    (dict(formats=['flac']), 'Request has to be a JSON object with an "input" path'),
+    (dict(input='a.wav', speed=2), 'Unknown option "speed"'),
+    (dict(input='a.wav', bitrate='high'), '"bitrate" has to be a number'),
+])
+def test_invalid_request(server: Tuple[Client, threading.Event], request_body: Any, error: str) -> None:
+    client, _ = server
+    assert client.request('POST', '/jobs', request_body) == (400, dict(error=error))
+    assert client.request('GET', '/jobs/1')[0] == 404
+
+
+@pytest.fixture
+def stub_home(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Points eat at a config in a temp HOME, with the stub encoders of the benchmarks and real ffmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        pytest.skip('ffmpeg not found')
+
+    config_dir = tmp_path / 'home' / '.eat'
+    config_dir.mkdir(parents=True)
+    (tmp_path / 'tmp').mkdir()
+    (config_dir / 'config.toml').write_text('\n'.join((
+        "temp_path = '%s'" % (tmp_path / 'tmp'),
+        '[binaries]',
+        "ffmpeg = '%s'" % ffmpeg,
+        "ffprobe = '%s'" % (shutil.which('ffprobe') or 'ffprobe'),  # WAV headers are read without it
+        "dee = '%s'" % (STUBS / 'dee'),
+        "qaac = '%s'" % (STUBS / 'qaac'),
+        ''
+    )))
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+    # Resolved when eat.config is imported
+    monkeypatch.setattr(Config, '_config_dir', config_dir)
+    monkeypatch.setattr(Config, '_config_path', config_dir / 'config.toml')
+    monkeypatch.setenv('EAT_STUB_SPEED', '1')  # encodes take as long as the audio
+    return tmp_path
+
+
+def stub_processes() -> List[str]:
+    """Returns command lines of running stub encoders"""
+    running = []
+    for cmdline in Path('/proc').glob('[0-9]*/cmdline'):
+        try:
+            command = cmdline.read_bytes().replace(b'\0', b' ').decode()
+        except OSError:  # exited meanwhile
+            continue
+        if str(STUBS) in command:
+            running.append(command)
+
+    return running
+
+
+def test_stub_encoders(stub_home: Path, generate: Generate, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Jobs are planned and encoded by the stub DEE, cancelling kills it and removes its partial output"""
+    long = generate('long.wav', '-c:a', 'pcm_s24le', seconds=60, channels=6)
+    short = generate('short.wav', '-c:a', 'pcm_s24le', seconds=1, channels=6)
+
+    with serve(Session(jobs=2), monkeypatch) as client:
+        _, cancelled = client.request('POST', '/jobs', dict(input=str(long), formats=['ddp']))
+        _, done = client.request('POST', '/jobs', dict(input=str(short), formats=['ddp'], bitrate=1000))
+
+        job = client.wait(done['id'], 'done')
+        assert job['outputs'] == [dict(
+            format='ddp',
+            path=str(short.with_suffix('.ec3')),
+            params=dict(bitrate=1008, channels=6, sample_rate=48000, bit_depth=None),
+            timings=job['outputs'][0]['timings']
+        )]
+        assert short.with_suffix('.ec3').stat().st_size == 1008 * 1000 // 8
+
+        client.poll(cancelled['id'], lambda job: any(
+            task['completed'] for task in job['tasks'] if 'DEE' in task['description']
+        ))
+        assert long.with_suffix('.ec3').exists() and stub_processes()
+        assert client.request('DELETE', f'/jobs/{cancelled["id"]}')[0] == 202
+        client.wait(cancelled['id'], 'cancelled')
+        assert not long.with_suffix('.ec3').exists()
+        assert not stub_processes()
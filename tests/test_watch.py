@@ -0,0 +1,69 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import pytest
+
+from eat.daemon import Daemon
+from eat.utils.watch import Watcher
+
+
+def test_file_gone_after_scan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Watcher, '_init_inotify', lambda self: None)
+    watcher = Watcher(tmp_path, [], settle=0, poll_interval=0.01)
+    (tmp_path / 'a.wav').write_bytes(b'a')
+    scan = watcher._scan
+    monkeypatch.setattr(watcher, '_scan', lambda: [tmp_path / 'gone.wav', *scan()])
+
+    assert next(iter(watcher)) == tmp_path / 'a.wav'
+
+
+class Handler:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+    def run(self, *_: Any) -> Any:
+        raise self.error
+
+
+class Released(List[Path]):
+    def release(self, file: Path) -> None:
+        self.append(file)
+
+
+def daemon(tmp_path: Path, error: BaseException) -> Tuple[Daemon, Released]:
+    """Returns a daemon with a stub handler, along with files its watcher was told to release"""
+    daemon = Daemon.__new__(Daemon)
+    daemon.logger = logging.getLogger('test')
+    daemon.watch_dir = tmp_path
+    daemon._done_dir = tmp_path / 'done'
+    daemon._failed_dir = tmp_path / 'failed'
+    daemon._patterns = {}
+    daemon._handlers = {'default': Handler(error)}  # type: ignore[dict-item]
+    daemon._stopping = threading.Event()
+    released = Released()
+    daemon._watcher = released  # type: ignore[assignment]
+    return daemon, released
+
+
+def test_exit_is_a_failure(tmp_path: Path) -> None:
+    """Handlers exit on e.g. a missing binary, the file still goes to failed/"""
+    file = tmp_path / 'a.wav'
+    file.write_bytes(b'a')
+    watcher, released = daemon(tmp_path, SystemExit())
+    watcher._process(file, None, None)  # type: ignore[arg-type]
+
+    assert (tmp_path / 'failed' / 'a.wav').exists()
+    assert released == [file]
+
+
+def test_unmovable_file_stays_taken(tmp_path: Path) -> None:
+    file = tmp_path / 'a.wav'
+    file.write_bytes(b'a')
+    watcher, released = daemon(tmp_path, RuntimeError('broken'))
+    (tmp_path / 'failed').write_bytes(b'')  # not a folder, so nothing can be moved there
+    watcher._process(file, None, None)  # type: ignore[arg-type]
+
+    assert file.exists()
+    assert released == []